@@ -0,0 +1,53 @@
+from django.contrib import admin
+
+from .models import BackfillProgress, OutboxMessage, Task
+
+
+class TaskAdmin(admin.ModelAdmin):
+
+    list_display = ('pk',
+                    'name',
+                    'status',
+                    'priority',
+                    'attempts',
+                    'run_at',
+                    'duration',)
+
+    list_filter = ('status', 'name',)
+
+    empty_value_display = '-пусто-'
+
+
+admin.site.register(Task, TaskAdmin)
+
+
+class OutboxMessageAdmin(admin.ModelAdmin):
+
+    list_display = ('pk',
+                    'subject',
+                    'status',
+                    'attempts',
+                    'created',
+                    'sent',)
+
+    list_filter = ('status',)
+
+    empty_value_display = '-пусто-'
+
+
+admin.site.register(OutboxMessage, OutboxMessageAdmin)
+
+
+class BackfillProgressAdmin(admin.ModelAdmin):
+
+    list_display = ('name',
+                    'database',
+                    'processed',
+                    'last_pk',
+                    'updated',
+                    'finished',)
+
+    empty_value_display = '-пусто-'
+
+
+admin.site.register(BackfillProgress, BackfillProgressAdmin)
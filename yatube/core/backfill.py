@@ -0,0 +1,182 @@
+"""Заполнение данных в работающей базе пачками по диапазонам pk.
+
+Вместо одного UPDATE на всю таблицу строки обходятся по возрастанию pk
+пачками, каждая — в своей короткой транзакции, так что таблица надолго
+не блокируется. После каждой пачки последний pk пишется в
+core_backfillprogress: прерванный проход продолжается с того же места.
+Темп ограничивается числом строк в секунду, в отчёт идут пройденные
+строки, темп и оставшееся время.
+
+Заполнение описывается подклассом Backfill в модуле backfills.py
+приложения и запускается manage.py backfill <имя> или из миграции через
+RunBackfill (миграция должна зависеть от core 0003 и быть atomic = False).
+"""
+import time
+from collections import namedtuple
+
+from django.apps import apps as global_apps
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, migrations, router
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+
+from .db import immediate
+
+BACKFILL_BATCH_SIZE = getattr(settings, 'BACKFILL_BATCH_SIZE', 500)
+BACKFILL_RATE = getattr(settings, 'BACKFILL_RATE', 2000)
+# Строк в секунду; None — без ограничения
+
+Status = namedtuple('Status', 'processed total rate eta')
+# eta — секунд до конца или None, пока темп неизвестен
+
+_registry = {}
+
+
+class Backfill:
+    """Описание заполнения: что обходить и что делать с пачкой.
+
+    process получает queryset одной пачки модели из переданных apps:
+    в миграции это историческая модель, поэтому без её методов. Пачка,
+    прерванная сбоем, пройдёт ещё раз: process должен это выдерживать.
+    """
+    name = None
+    model = None
+    # 'app_label.ModelName'
+    batch_size = BACKFILL_BATCH_SIZE
+    rate = BACKFILL_RATE
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.name:
+            _registry[cls.name] = cls
+
+    def __init__(self, apps=global_apps, using=DEFAULT_DB_ALIAS):
+        self.apps = apps
+        self.using = using
+
+    def queryset(self, queryset):
+        """Сужает все строки модели до тех, что нужно пройти."""
+        return queryset
+
+    def process(self, queryset):
+        raise NotImplementedError
+
+    def finish(self):
+        """После последней пачки прохода."""
+
+
+def get(name):
+    autodiscover_modules('backfills')
+    return _registry[name]
+
+
+def registered():
+    autodiscover_modules('backfills')
+    return sorted(_registry)
+
+
+def _progress(backfill):
+    from .models import BackfillProgress
+    return BackfillProgress.objects.using(DEFAULT_DB_ALIAS).get_or_create(
+        name=backfill.name, database=backfill.using)[0]
+
+
+def _next_range(queryset, after, batch_size):
+    """Первый и последний pk следующей пачки и её размер."""
+    if after is not None:
+        queryset = queryset.filter(pk__gt=after)
+    pks = list(queryset.order_by('pk').values_list('pk', flat=True)
+               [:batch_size])
+    if not pks:
+        return None
+    return pks[0], pks[-1], len(pks)
+
+
+def _status(processed, total, done_now, elapsed):
+    rate = done_now / elapsed if elapsed > 0 else 0
+    eta = (total - processed) / rate if rate else None
+    return Status(processed, total, rate, eta)
+
+
+def run(backfill, restart=False, batch_size=None, rate=None, report=None):
+    """Проходит таблицу с последней отметки; возвращает итоговый Status."""
+    batch_size = batch_size or backfill.batch_size
+    rate = backfill.rate if rate is None else rate
+    progress = _progress(backfill)
+    if restart:
+        progress.last_pk, progress.processed, progress.finished = '', 0, None
+    if progress.finished is not None:
+        return Status(progress.processed, progress.processed, 0, 0)
+    model = backfill.apps.get_model(backfill.model)
+    queryset = backfill.queryset(model._default_manager.db_manager(
+        backfill.using).all())
+    after = (model._meta.pk.to_python(progress.last_pk)
+             if progress.last_pk else None)
+    remaining = (queryset.filter(pk__gt=after) if after is not None
+                 else queryset).count()
+    total = progress.processed + remaining
+    started, done_now = time.monotonic(), 0
+    while True:
+        batch_started = time.monotonic()
+        batch = _next_range(queryset, after, batch_size)
+        if batch is None:
+            backfill.finish()
+            progress.finished = timezone.now()
+            progress.save()
+            break
+        first, after, count = batch
+        with immediate(using=backfill.using):
+            backfill.process(queryset.filter(pk__gte=first, pk__lte=after))
+        progress.last_pk = str(after)
+        progress.processed += count
+        progress.save()
+        done_now += count
+        if report:
+            report(_status(progress.processed, total, done_now,
+                           time.monotonic() - started))
+        if rate:
+            pause = count / rate - (time.monotonic() - batch_started)
+            if pause > 0:
+                time.sleep(pause)
+    return _status(progress.processed, progress.processed, done_now,
+                   time.monotonic() - started)
+
+
+class RunBackfill(migrations.RunPython):
+    """Операция миграции: заполнение по имени зарегистрированного Backfill.
+
+    С исторической моделью и на той базе, которую мигрируют. Откат ничего
+    не делает и сбрасывает отметку, чтобы повторная миграция прошла заново.
+    """
+
+    def __init__(self, name, **kwargs):
+        self.name = name
+        kwargs.setdefault('atomic', False)
+        super().__init__(self.forwards, self.backwards, **kwargs)
+
+    def deconstruct(self):
+        return self.__class__.__name__, [self.name], {}
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        # Базу выбирает роутер по модели заполнения (см. forwards), а не
+        # по app_label, как RunPython
+        from_state.clear_delayed_apps_cache()
+        self.code(from_state.apps, schema_editor)
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        self.reverse_code(from_state.apps, schema_editor)
+
+    def forwards(self, apps, schema_editor):
+        alias = schema_editor.connection.alias
+        backfill = get(self.name)(apps, alias)
+        if router.allow_migrate_model(alias,
+                                      apps.get_model(backfill.model)):
+            run(backfill)
+
+    def backwards(self, apps, schema_editor):
+        from .models import BackfillProgress
+        BackfillProgress.objects.using(DEFAULT_DB_ALIAS).filter(
+            name=self.name,
+            database=schema_editor.connection.alias).delete()
@@ -0,0 +1,109 @@
+"""Сжатие ответов brotli или gzip, в том числе потоковых.
+
+Маленькие, уже сжатые и нетекстовые ответы пропускаются. Ответы, в
+которые выдан CSRF-токен, тоже не сжимаются: секрет рядом с
+отражённым вводом в сжатом теле — ровно то, на чём строится атака
+BREACH, и никакая добавка к длине ответа от неё не защищает.
+"""
+import gzip
+import re
+import zlib
+
+import brotli
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+COMPRESS_MIN_SIZE = getattr(settings, 'COMPRESS_MIN_SIZE', 512)
+# Меньшие ответы сжимать дороже, чем отправить как есть
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# Для динамических ответов: заметно быстрее максимума при почти том же
+# размере, см. manage.py benchmark_compression
+COMPRESSIBLE_TYPES = re.compile(
+    r'^(text/|application/(json|javascript|xml)|image/svg\+xml)')
+
+
+def choose_encoding(request):
+    accepted = {}
+    for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = 1.0
+        match = re.search(r'q=([0-9.]+)', params)
+        if match:
+            try:
+                quality = float(match.group(1))
+            except ValueError:
+                quality = 0
+        accepted[coding.strip().lower()] = quality
+    for coding in ('br', 'gzip'):
+        if accepted.get(coding, 0) > 0:
+            return coding
+    return None
+
+
+def compress(data, coding):
+    if coding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+
+def compress_stream(chunks, coding):
+    """Сжимает поток по кускам, сбрасывая буфер после каждого."""
+    if coding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        for chunk in chunks:
+            data = compressor.process(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+        return
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED,
+                                  16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class CompressionMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        coding = self.should_compress(request, response)
+        if coding is None:
+            return response
+        if response.streaming:
+            response.streaming_content = compress_stream(
+                response.streaming_content, coding)
+            del response['Content-Length']
+        else:
+            compressed = compress(response.content, coding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+        if response.has_header('ETag'):
+            response['ETag'] = re.sub(r'^(W/)?', 'W/', response['ETag'])
+        response['Content-Encoding'] = coding
+        return response
+
+    def should_compress(self, request, response):
+        """Кодировка или None, если не сжимать."""
+        if response.status_code != 200 or response.has_header(
+                'Content-Encoding'):
+            return None
+        content_type = response.get('Content-Type', '')
+        if not COMPRESSIBLE_TYPES.match(content_type):
+            return None
+        if (not response.streaming
+                and len(response.content) < COMPRESS_MIN_SIZE):
+            return None
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if request.META.get('CSRF_COOKIE_USED'):
+            # Против BREACH: тело с CSRF-токеном уходит несжатым
+            return None
+        return choose_encoding(request)
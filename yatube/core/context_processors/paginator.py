@@ -1,8 +1,17 @@
+import base64
+import json
+import math
 
+from django.core.exceptions import ValidationError
 from django.core.paginator import Paginator
+from django.db.models import Q
 
 NUMB_POSTS = 10
 # Кол-во постов на странице
+NUMB_COMMENTS = 20
+# Кол-во комментариев в одной порции
+CURSOR_INT_LIMIT = 2 ** 63
+# Целые курсора должны влезать в INTEGER SQLite и BIGINT
 
 
 def paginator(request, post_list):
@@ -11,3 +20,101 @@ def paginator(request, post_list):
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     return (page_obj)
+
+
+def encode_cursor(values):
+    """Упаковывает значения ключа последней записи в строку курсора."""
+    values = [value.isoformat() if hasattr(value, 'isoformat') else value
+              for value in values]
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _cursor_value(value):
+    if isinstance(value, int):
+        return -CURSOR_INT_LIMIT <= value < CURSOR_INT_LIMIT
+    if isinstance(value, float):
+        return math.isfinite(value)
+    return value is None or isinstance(value, str)
+
+
+def decode_cursor(cursor):
+    """Распаковывает курсор, для битого курсора возвращает None."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw.decode())
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(values, list) or not all(map(_cursor_value, values)):
+        return None
+    return values
+
+
+def _field_value(obj, name):
+    if isinstance(obj, dict):
+        return obj[name]
+    return getattr(obj, name)
+
+
+def _after(ordering, values):
+    """Условие «строго после курсора» для лексикографического порядка."""
+    condition = Q()
+    for position, field in enumerate(ordering):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        step = Q(**{f'{name}__{lookup}': values[position]})
+        for prev_field, prev_value in zip(ordering[:position], values):
+            step &= Q(**{prev_field.lstrip('-'): prev_value})
+        condition |= step
+    return condition
+
+
+class KeysetPage:
+    """Порция записей, полученная по курсору вместо номера страницы."""
+
+    def __init__(self, object_list, next_cursor, cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.cursor = cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+
+def keyset_paginator(queryset, cursor=None, per_page=NUMB_COMMENTS,
+                     ordering=('-created', '-id')):
+    """Отдаёт порцию записей после курсора без OFFSET и COUNT(*).
+
+    Последнее поле ordering должно быть уникальным, чтобы порядок
+    был однозначным.
+    """
+    values = decode_cursor(cursor)
+    queryset = queryset.order_by(*ordering)
+    if values is not None and len(values) == len(ordering):
+        try:
+            queryset = queryset.filter(_after(ordering, values))
+        except (ValueError, TypeError, ValidationError):
+            cursor = None
+    else:
+        cursor = None
+    object_list = list(queryset[:per_page + 1])
+    next_cursor = None
+    if len(object_list) > per_page:
+        object_list = object_list[:per_page]
+        last = object_list[-1]
+        next_cursor = encode_cursor(
+            [_field_value(last, field.lstrip('-')) for field in ordering]
+        )
+    return KeysetPage(object_list, next_cursor, cursor)
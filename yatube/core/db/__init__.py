@@ -0,0 +1,24 @@
+"""Обёртки над транзакциями для бэкендов из core.db."""
+from contextlib import contextmanager
+
+from django.db import transaction
+
+
+@contextmanager
+def immediate(using=None):
+    """atomic(), который на core.db.sqlite3 начинается с BEGIN IMMEDIATE.
+
+    Для транзакций, которые сначала читают, а потом пишут: блокировка на
+    запись берётся сразу и ждёт busy_timeout, а не падает с «database is
+    locked» при повышении посреди транзакции. Вложенный в уже открытую
+    транзакцию и на других бэкендах — обычный atomic().
+    """
+    connection = transaction.get_connection(using)
+    previous = getattr(connection, 'begin_immediate', False)
+    connection.begin_immediate = True
+    try:
+        with transaction.atomic(using=using):
+            connection.begin_immediate = previous
+            yield
+    finally:
+        connection.begin_immediate = previous
@@ -0,0 +1,232 @@
+"""Пул соединений с базой для многопоточных WSGI-серверов.
+
+Без пула каждый поток сервера открывает своё соединение, и на коротких
+запросах вроде подписки его установка занимает больше самого запроса.
+PooledDatabaseWrapper подмешивается в DatabaseWrapper бэкенда и
+включается ключом pool в DATABASES[...]['OPTIONS']:
+
+    'CONN_MAX_AGE': 0,
+    'OPTIONS': {'pool': {'size': 10, 'timeout': 10}},
+
+Тогда close() в конце запроса возвращает соединение в общий на процесс
+пул, а следующее открытие берёт свободное оттуда. Открытых соединений не
+больше size; когда все заняты, поток ждёт освобождения до timeout
+секунд. Пролежавшее без дела дольше check_after проверяется SELECT 1,
+прожившее дольше max_lifetime закрывается. Время ожидания и прочие
+счётчики — stats() и /admin/db-pool/.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+from django.db import OperationalError
+
+POOL_DEFAULTS = {
+    'size': 10,
+    'timeout': 10,
+    # Секунд ждать свободного соединения
+    'max_lifetime': 600,
+    'check_after': 30,
+    # Секунд простоя, после которых соединение проверяется перед выдачей
+}
+
+_pools = {}
+_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """Свободные соединения одной базы и счётчики их выдачи."""
+
+    def __init__(self, size, timeout, max_lifetime, check_after):
+        self.size = size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.check_after = check_after
+        self.idle = deque()
+        # (соединение, когда вернули); берётся последнее вернувшееся
+        self.born = {}
+        self.open = 0
+        self.condition = threading.Condition()
+        self.counters = dict.fromkeys(
+            ('checkouts', 'created', 'closed', 'failed_checks', 'timeouts',
+             'wait_total', 'wait_max'), 0)
+
+    def acquire(self, connect, check):
+        """Свободное соединение или новое от connect(); ждёт до timeout."""
+        started = time.monotonic()
+        with self.condition:
+            while not self.idle and self.open >= self.size:
+                remaining = started + self.timeout - time.monotonic()
+                if remaining <= 0:
+                    self.counters['timeouts'] += 1
+                    raise OperationalError(
+                        f'Нет свободного соединения за {self.timeout} с '
+                        f'(в пуле {self.size})')
+                self.condition.wait(remaining)
+            entry = self.idle.pop() if self.idle else None
+            if entry is None:
+                self.open += 1
+            waited = time.monotonic() - started
+            self.counters['checkouts'] += 1
+            self.counters['wait_total'] += waited
+            self.counters['wait_max'] = max(self.counters['wait_max'], waited)
+        if entry is not None and self.usable(*entry, check):
+            return entry[0]
+        try:
+            connection = connect()
+        except Exception:
+            self.forget()
+            raise
+        with self.condition:
+            self.born[connection] = time.monotonic()
+            self.counters['created'] += 1
+        return connection
+
+    def usable(self, connection, returned, check):
+        """Живо ли соединение; негодное закрывается, его место остаётся."""
+        now = time.monotonic()
+        if now - self.born[connection] > self.max_lifetime:
+            self.close(connection)
+            return False
+        if now - returned > self.check_after:
+            try:
+                check(connection)
+            except Exception:
+                with self.condition:
+                    self.counters['failed_checks'] += 1
+                self.close(connection)
+                return False
+        return True
+
+    def release(self, connection, reusable=True):
+        with self.condition:
+            born = self.born.get(connection)
+        if born is None:
+            # Выдано не этим пулом (например, до форка)
+            self.close(connection)
+            return
+        if not reusable or time.monotonic() - born > self.max_lifetime:
+            self.close(connection)
+            self.forget()
+            return
+        with self.condition:
+            self.idle.append((connection, time.monotonic()))
+            self.condition.notify()
+
+    def close(self, connection):
+        with self.condition:
+            self.born.pop(connection, None)
+            self.counters['closed'] += 1
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def forget(self):
+        """Освобождает место закрытого или так и не открытого соединения."""
+        with self.condition:
+            self.open -= 1
+            self.condition.notify()
+
+    def close_idle(self):
+        while True:
+            with self.condition:
+                if not self.idle:
+                    return
+                connection, _ = self.idle.popleft()
+            self.close(connection)
+            self.forget()
+
+    def stats(self):
+        with self.condition:
+            counters = dict(self.counters)
+            counters.update(size=self.size, open=self.open,
+                            idle=len(self.idle))
+        counters['wait_avg'] = (counters['wait_total'] / counters['checkouts']
+                                if counters['checkouts'] else 0)
+        return counters
+
+
+def get_pool(alias, name, options):
+    with _lock:
+        if (alias, name) not in _pools:
+            _pools[alias, name] = ConnectionPool(
+                **dict(POOL_DEFAULTS, **options))
+        return _pools[alias, name]
+
+
+def stats():
+    """Счётчики пулов этого процесса по алиасам баз."""
+    with _lock:
+        pools = dict(_pools)
+    return {alias: pool.stats() for (alias, _), pool in pools.items()}
+
+
+def _close_idle_pools():
+    with _lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close_idle()
+
+
+def _forget_pools():
+    # Соединения родителя ребёнку не принадлежат: не закрывать, а забыть
+    _pools.clear()
+
+
+# Мастер, форкающий воркеры (yatube.preload), не отдаёт им свои
+# соединения: свободные закрываются до форка, а пулы ребёнок заводит свои
+os.register_at_fork(before=_close_idle_pools,
+                    after_in_child=_forget_pools)
+
+
+class PooledDatabaseWrapper:
+    """Примесь к DatabaseWrapper бэкенда: соединения берутся из пула."""
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pool', None)
+        return params
+
+    @property
+    def pool(self):
+        options = self.settings_dict['OPTIONS'].get('pool')
+        if options is None:
+            return None
+        return get_pool(self.alias, self.settings_dict['NAME'], options)
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return self.open_connection(conn_params)
+        return pool.acquire(lambda: self.open_connection(conn_params),
+                            self.check_connection)
+
+    def open_connection(self, conn_params):
+        """Новое физическое соединение; настраивать его бэкенду здесь.
+
+        Соединение из пула сюда не попадает: настройки у него уже есть.
+        """
+        return super().get_new_connection(conn_params)
+
+    def check_connection(self, connection):
+        cursor = connection.cursor()
+        try:
+            cursor.execute('SELECT 1')
+        finally:
+            cursor.close()
+
+    def _close(self):
+        pool = self.pool
+        if pool is None or self.connection is None:
+            return super()._close()
+        # Закрытое внутри atomic соединение Django ещё держит до выхода из
+        # блока, поэтому отдать его другому потоку нельзя
+        reusable = not self.in_atomic_block
+        if reusable:
+            try:
+                self.connection.rollback()
+            except Exception:
+                reusable = False
+        pool.release(self.connection, reusable)
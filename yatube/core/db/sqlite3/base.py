@@ -0,0 +1,54 @@
+"""SQLite для нескольких одновременных читателей и писателя.
+
+Каждое новое физическое соединение получает PRAGMAS (WAL,
+synchronous=NORMAL, mmap, кэш страниц, busy_timeout), соединение из пула
+их уже не повторяет; свои значения задаются в
+DATABASES[...]['OPTIONS']['pragmas']. Обычные транзакции, в том числе
+только читающие, открываются BEGIN DEFERRED и не мешают писателю;
+читающие, а затем пишущие, оборачиваются в core.db.immediate() и
+открываются BEGIN IMMEDIATE. OPTIONS['immediate_transactions'] включает
+BEGIN IMMEDIATE для всех транзакций. Соединения переиспользуются через
+CONN_MAX_AGE или, для многопоточного сервера, через пул
+(OPTIONS['pool'], см. core.db.pool).
+"""
+from django.db.backends.sqlite3 import base
+
+from ..pool import PooledDatabaseWrapper
+
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    # В WAL NORMAL не теряет целостность, только последние коммиты
+    # при отключении питания
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -20000,
+    # Отрицательное значение — в КиБ, то есть около 20 МБ
+    'busy_timeout': 5000,
+    'temp_store': 'MEMORY',
+}
+
+
+class DatabaseWrapper(PooledDatabaseWrapper, base.DatabaseWrapper):
+    begin_immediate = False
+    # Выставляет core.db.immediate() на время входа в atomic()
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pragmas', None)
+        params.pop('immediate_transactions', None)
+        return params
+
+    def open_connection(self, conn_params):
+        connection = super().open_connection(conn_params)
+        pragmas = dict(PRAGMAS,
+                       **self.settings_dict['OPTIONS'].get('pragmas', {}))
+        for name, value in pragmas.items():
+            connection.execute(f'PRAGMA {name} = {value}')
+        return connection
+
+    def _start_transaction_under_autocommit(self):
+        if self.begin_immediate or self.settings_dict['OPTIONS'].get(
+                'immediate_transactions', False):
+            self.cursor().execute('BEGIN IMMEDIATE')
+        else:
+            super()._start_transaction_under_autocommit()
@@ -0,0 +1,190 @@
+"""Общие для всех закэшированные страницы с персональными фрагментами.
+
+Тело страницы не зависит от пользователя: всё персональное (шапка с
+именем, кнопки автора, форма с CSRF-токеном) выводится тегом
+{% fragment %} как <esi:include src="/fragments/<имя>/?...">. Такие тела
+shared_page кэширует одним ключом на адрес для анонимов и для
+вошедших, а FragmentMiddleware на каждом ответе подставляет вместо
+include результат функции фрагмента для текущего запроса.
+
+Если перед сайтом стоит кэш с ESI (Varnish и т. п.) и FRAGMENTS_ESI
+включён, include оставляются ему: он собирает страницу сам, запрашивая
+фрагменты по их адресам.
+"""
+import inspect
+import re
+import uuid
+from functools import wraps
+from html import unescape
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404, HttpResponse, HttpResponseBadRequest
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
+from django.utils.html import escape
+
+PAGE_CACHE_TIMEOUT = getattr(settings, 'PAGE_CACHE_TIMEOUT', 60)
+VERSION_KEY = 'pages:version'
+INCLUDE = re.compile(rb'<esi:include src="([^"]+)"\s*/>')
+
+_registry = {}
+
+
+def fragment(name, **params):
+    """Регистрирует функцию фрагмента: (request, **параметры) -> HTML.
+
+    params — все допустимые параметры и их типы (int, str). Параметры без
+    значения по умолчанию в сигнатуре функции обязательны.
+    """
+    def register(func):
+        signature = inspect.signature(func).parameters
+        required = {key for key in params
+                    if signature[key].default is inspect.Parameter.empty}
+        _registry[name] = (func, params, required)
+        return func
+    return register
+
+
+def clean_params(name, params):
+    """Параметры из адреса, приведённые к типам фрагмента.
+
+    Неизвестный фрагмент — Http404; лишние, недостающие и неприводимые
+    параметры — ValueError.
+    """
+    if name not in _registry:
+        raise Http404
+    _, types, required = _registry[name]
+    unknown, missing = set(params) - set(types), required - set(params)
+    if unknown or missing:
+        raise ValueError(f'Параметры фрагмента {name}: лишние '
+                         f'{sorted(unknown)}, недостающие {sorted(missing)}')
+    return {key: types[key](value) for key, value in params.items()}
+
+
+def include_tag(name, **params):
+    src = reverse('fragment', args=(name,))
+    if params:
+        src += '?' + urlencode(params)
+    return f'<esi:include src="{escape(src)}"/>'
+
+
+def render_fragment(request, name, params):
+    return _registry[name][0](request, **clean_params(name, params))
+
+
+def fragment_view(request, name):
+    """Фрагмент отдельным ответом: для ESI-кэша перед сайтом."""
+    try:
+        params = clean_params(name, request.GET.dict())
+    except ValueError:
+        return HttpResponseBadRequest()
+    response = HttpResponse(_registry[name][0](request, **params))
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def _expand(request, match):
+    parts = urlsplit(unescape(match.group(1).decode()))
+    name = parts.path.rstrip('/').rsplit('/', 1)[-1]
+    return render_fragment(request, name,
+                           dict(parse_qsl(parts.query))).encode()
+
+
+def expand(request, content):
+    """Подставляет фрагменты текущего запроса вместо всех include."""
+    return INCLUDE.sub(lambda match: _expand(request, match), content)
+
+
+def _expand_stream(request, chunks):
+    for chunk in chunks:
+        yield expand(request, chunk)
+
+
+def _version_keys(scopes):
+    return [VERSION_KEY] + [f'{VERSION_KEY}:{scope}' for scope in scopes]
+
+
+def page_version(*scopes):
+    """Общая версия всех страниц и версии областей scopes."""
+    keys = _version_keys(scopes)
+    versions = cache.get_many(keys)
+    return '.'.join(
+        versions.get(key) or cache.get_or_set(key, uuid.uuid4().hex, None)
+        for key in keys)
+
+
+def invalidate_pages(*scopes):
+    """Устаревают страницы областей scopes, без них — все страницы."""
+    keys = _version_keys(scopes)[1:] if scopes else [VERSION_KEY]
+    cache.set_many({key: uuid.uuid4().hex for key in keys}, None)
+
+
+def shared_page(*scopes):
+    """Кэширует тело страницы, одно для всех пользователей.
+
+    scopes — области данных страницы, в них подставляются аргументы
+    вьюхи: @shared_page('group:{slug}'). Запись сбрасывает только
+    страницы своих областей через invalidate_pages.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            version = page_version(*(scope.format(**kwargs)
+                                     for scope in scopes))
+            return _cached_page(f'page:{version}:{request.get_full_path()}',
+                                view, request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _cached_page(key, view, request, *args, **kwargs):
+    cached = cache.get(key)
+    if cached is not None:
+        content, content_type = cached
+        return HttpResponse(content, content_type=content_type)
+    response = view(request, *args, **kwargs)
+    if response.status_code == 200 and not response.streaming:
+        cache.set(key, (response.content, response['Content-Type']),
+                  PAGE_CACHE_TIMEOUT)
+    return response
+
+
+def edge_assembles(request):
+    return (getattr(settings, 'FRAGMENTS_ESI', False)
+            and 'ESI/1.0' in request.META.get('HTTP_SURROGATE_CAPABILITY',
+                                              ''))
+
+
+class FragmentMiddleware:
+    """Собирает страницу из общего тела и фрагментов текущего запроса."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not response.get('Content-Type', '').startswith('text/html'):
+            return response
+        if edge_assembles(request):
+            response['Surrogate-Control'] = 'content="ESI/1.0"'
+            return response
+        if response.streaming:
+            response.streaming_content = _expand_stream(
+                request, response.streaming_content)
+        elif b'<esi:include' in response.content:
+            response.content = expand(request, response.content)
+            if response.has_header('Content-Length'):
+                response['Content-Length'] = str(len(response.content))
+        return response
+
+
+@fragment('header', view=str)
+def header(request, view=''):
+    """Шапка: меню зависит от того, вошёл ли пользователь."""
+    return render_to_string('includes/header.html', {'view_name': view},
+                            request)
@@ -0,0 +1,150 @@
+"""Исходящая почта через outbox.
+
+OutboxBackend вместо отправки сохраняет письма в core_outboxmessage и
+ставит фоновую задачу send_outbox; та отправляет их пачками через одно
+соединение настоящего бэкенда (settings.OUTBOX_EMAIL_BACKEND) и повторяет
+неудачные с нарастающей паузой.
+"""
+import json
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboxMessage
+from .tasks import task
+
+OUTBOX_BATCH_SIZE = getattr(settings, 'OUTBOX_BATCH_SIZE', 50)
+OUTBOX_MAX_ATTEMPTS = getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 5)
+OUTBOX_RETRY_DELAY = getattr(settings, 'OUTBOX_RETRY_DELAY', 30)
+# Пауза перед повтором: OUTBOX_RETRY_DELAY * 2 ** (попытка - 1) секунд
+OUTBOX_LEASE = 5 * 60
+
+
+def delivery_connection():
+    return get_connection(getattr(
+        settings, 'OUTBOX_EMAIL_BACKEND',
+        'django.core.mail.backends.smtp.EmailBackend'))
+
+
+def to_outbox(message):
+    return OutboxMessage(
+        subject=message.subject,
+        body=message.body,
+        from_email=message.from_email,
+        recipients=json.dumps({
+            'to': message.to,
+            'cc': message.cc,
+            'bcc': message.bcc,
+            'reply_to': message.reply_to,
+        }),
+        headers=json.dumps(message.extra_headers),
+        alternatives=json.dumps(getattr(message, 'alternatives', [])),
+    )
+
+
+def from_outbox(row):
+    recipients = json.loads(row.recipients)
+    message = EmailMultiAlternatives(
+        subject=row.subject,
+        body=row.body,
+        from_email=row.from_email,
+        headers=json.loads(row.headers),
+        **recipients,
+    )
+    for content, mimetype in json.loads(row.alternatives):
+        message.attach_alternative(content, mimetype)
+    return message
+
+
+class OutboxBackend(BaseEmailBackend):
+    """Кладёт письма в outbox и сразу возвращает управление."""
+
+    def send_messages(self, email_messages):
+        queued, direct = [], []
+        for message in email_messages:
+            # Вложения не сериализуются, такие письма уходят сразу
+            (direct if message.attachments else queued).append(message)
+        if direct:
+            delivery_connection().send_messages(direct)
+        if queued:
+            # Письма без задачи отправки так бы и остались в outbox
+            with transaction.atomic():
+                OutboxMessage.objects.bulk_create(
+                    to_outbox(message) for message in queued)
+                send_outbox.delay()
+        return len(email_messages)
+
+
+def lease_batch(batch_size=OUTBOX_BATCH_SIZE):
+    """Забирает пачку писем под уникальную метку одним UPDATE.
+
+    Метка действует OUTBOX_LEASE секунд: письма упавшего отправителя
+    потом заберёт следующий.
+    """
+    lease = uuid.uuid4().hex
+    now = timezone.now()
+    ready = OutboxMessage.objects.filter(
+        status__in=(OutboxMessage.QUEUED, OutboxMessage.SENDING),
+        next_attempt__lte=now,
+    )
+    ids = list(ready.order_by('id').values_list('id', flat=True)
+               [:batch_size])
+    ready.filter(id__in=ids).update(
+        lease=lease,
+        status=OutboxMessage.SENDING,
+        next_attempt=now + timedelta(seconds=OUTBOX_LEASE),
+    )
+    return list(OutboxMessage.objects.filter(lease=lease).order_by('id'))
+
+
+def deliver_batch(batch_size=OUTBOX_BATCH_SIZE):
+    """Отправляет одну пачку через одно соединение, возвращает размер."""
+    batch = lease_batch(batch_size)
+    if not batch:
+        return 0
+    connection = delivery_connection()
+    connection.open()
+    now = timezone.now()
+    try:
+        for row in batch:
+            row.attempts += 1
+            try:
+                connection.send_messages([from_outbox(row)])
+            except Exception as error:
+                row.last_error = repr(error)
+                if row.attempts < OUTBOX_MAX_ATTEMPTS:
+                    row.status = OutboxMessage.QUEUED
+                    row.next_attempt = now + timedelta(
+                        seconds=OUTBOX_RETRY_DELAY * 2 ** (row.attempts - 1))
+                else:
+                    row.status = OutboxMessage.FAILED
+            else:
+                row.status = OutboxMessage.SENT
+                row.sent = now
+    finally:
+        connection.close()
+        OutboxMessage.objects.bulk_update(
+            batch,
+            ['status', 'attempts', 'next_attempt', 'last_error', 'sent'],
+        )
+    return len(batch)
+
+
+def deliver_pending(batch_size=OUTBOX_BATCH_SIZE):
+    """Отправляет все готовые письма пачками, возвращает их число."""
+    total = 0
+    while True:
+        count = deliver_batch(batch_size)
+        if not count:
+            return total
+        total += count
+
+
+@task(priority=10)
+def send_outbox():
+    deliver_pending()
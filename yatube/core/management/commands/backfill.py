@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import backfill
+
+
+class Command(BaseCommand):
+    help = ('Заполняет данные пачками по диапазонам pk с ограничением '
+            'темпа; прерванный проход продолжается с места остановки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', nargs='?',
+                            help='Имя заполнения; без него — список.')
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--batch-size', type=int,
+                            help='Строк в пачке (одна транзакция).')
+        parser.add_argument('--rate', type=float,
+                            help='Строк в секунду, 0 — без ограничения.')
+        parser.add_argument('--restart', action='store_true',
+                            help='Начать заново, забыв отметку.')
+
+    def handle(self, *args, **options):
+        if not options['name']:
+            for name in backfill.registered():
+                self.stdout.write(name)
+            return
+        try:
+            backfill_class = backfill.get(options['name'])
+        except KeyError:
+            raise CommandError(f'Нет заполнения {options["name"]}')
+        status = backfill.run(
+            backfill_class(using=options['database']),
+            restart=options['restart'],
+            batch_size=options['batch_size'],
+            rate=options['rate'],
+            report=self.report,
+        )
+        self.stdout.write(f'Готово: {status.processed} строк')
+
+    def report(self, status):
+        eta = '?' if status.eta is None else f'{status.eta:.0f} с'
+        self.stdout.write(
+            f'{status.processed}/{status.total} строк, '
+            f'{status.rate:.0f} строк/с, осталось {eta}')
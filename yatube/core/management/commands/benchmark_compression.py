@@ -0,0 +1,38 @@
+import gzip
+import time
+
+import brotli
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+CODECS = (
+    ('gzip', 1), ('gzip', 6), ('gzip', 9),
+    ('br', 1), ('br', 5), ('br', 11),
+)
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает затраты CPU и экономию байт при сжатии страниц.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='*', default=['/'])
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        client = Client()
+        for url in options['urls']:
+            body = client.get(url).content
+            self.stdout.write(f'{url}: {len(body)} байт')
+            for coding, level in CODECS:
+                started = time.perf_counter()
+                for _ in range(options['repeat']):
+                    size = len(self.compress(body, coding, level))
+                spent = (time.perf_counter() - started) / options['repeat']
+                self.stdout.write(
+                    f'  {coding:<4} {level:>2}: {size:>7} байт '
+                    f'({size / len(body):.1%}), {spent * 1000:.2f} мс')
+
+    def compress(self, body, coding, level):
+        if coding == 'br':
+            return brotli.compress(body, quality=level)
+        return gzip.compress(body, compresslevel=level)
@@ -0,0 +1,118 @@
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Воркер без прогрева: отдельный интерпретатор грузит yatube.wsgi сам
+COLD = '''
+import json, os, sys
+from core.preload import get
+from yatube.wsgi import application
+status, first_byte = get(application, sys.argv[1])
+print(json.dumps({'pid': os.getpid(), 'status': status,
+                  'first_byte': first_byte}), flush=True)
+sys.stdin.read()
+'''
+# Мастер грузит yatube.preload и форкает воркеры, как gunicorn --preload
+PRELOADED = '''
+import json, os, sys, time
+from core.preload import get
+from yatube.preload import application
+print(json.dumps({'ready': time.time()}), flush=True)
+for _ in range(int(sys.argv[2])):
+    if os.fork() == 0:
+        started = time.time()
+        status, first_byte = get(application, sys.argv[1])
+        # Одним write: строки воркеров не перемешаются в общем канале
+        os.write(1, json.dumps({'pid': os.getpid(), 'status': status,
+                                'started': started,
+                                'first_byte': first_byte}).encode() + b'\\n')
+        sys.stdin.read()
+        os._exit(0)
+for _ in range(int(sys.argv[2])):
+    os.wait()
+'''
+MEMORY_FIELDS = ('Pss', 'Shared_Clean', 'Shared_Dirty')
+
+
+def memory(pid):
+    """Поля smaps_rollup процесса в килобайтах; None не на Linux."""
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as rollup:
+            lines = rollup.read().splitlines()
+    except OSError:
+        return None
+    fields = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        if name in MEMORY_FIELDS:
+            fields[name] = int(value.split()[0])
+    return fields
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает запуск воркеров без прогрева (yatube.wsgi) и '
+            'форком прогретого мастера (yatube.preload): время до первого '
+            'байта ответа и общую copy-on-write память.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--url', default='/')
+
+    def handle(self, *args, **options):
+        workers, url = options['workers'], options['url']
+        started = time.time()
+        processes = [self.spawn(COLD, url, workers) for _ in range(workers)]
+        reports = [json.loads(process.stdout.readline())
+                   for process in processes]
+        self.report('yatube.wsgi', [
+            dict(report, started=started) for report in reports])
+        self.stop(processes)
+
+        started = time.time()
+        master = self.spawn(PRELOADED, url, workers)
+        ready = json.loads(master.stdout.readline())['ready']
+        reports = [json.loads(master.stdout.readline())
+                   for _ in range(workers)]
+        self.stdout.write(
+            f'yatube.preload: мастер прогрет за '
+            f'{(ready - started) * 1000:.0f} мс')
+        self.report('yatube.preload', reports)
+        self.stop([master])
+
+    def spawn(self, script, url, workers):
+        return subprocess.Popen(
+            [sys.executable, '-c', script, url, str(workers)],
+            cwd=settings.BASE_DIR, stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE, text=True)
+
+    def stop(self, processes):
+        for process in processes:
+            process.stdin.close()
+        for process in processes:
+            process.wait()
+
+    def report(self, title, reports):
+        """Пока воркеры живы: время до первого байта и их память."""
+        waits = [report['first_byte'] - report['started']
+                 for report in reports]
+        statuses = sorted({report['status'] for report in reports})
+        self.stdout.write(
+            f'{title}: {len(reports)} воркеров, ответ {statuses}, первый '
+            f'байт через {statistics.mean(waits) * 1000:.0f} мс в среднем, '
+            f'{max(waits) * 1000:.0f} мс максимум')
+        usage = [memory(report['pid']) for report in reports]
+        if None in usage:
+            self.stdout.write('  память: нужен /proc/<pid>/smaps_rollup')
+            return
+        pss = sum(fields['Pss'] for fields in usage)
+        shared = sum(fields['Shared_Clean'] + fields['Shared_Dirty']
+                     for fields in usage)
+        self.stdout.write(
+            f'  память: PSS всех воркеров {pss / 1024:.1f} МБ, '
+            f'общих страниц в среднем {shared / len(usage) / 1024:.1f} МБ '
+            f'на воркер')
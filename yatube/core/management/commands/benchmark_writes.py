@@ -0,0 +1,117 @@
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from core.db import pool
+from posts.models import Post
+
+User = get_user_model()
+
+PREFIX = 'benchmark-writer-'
+# Пишущие вьюхи без лимитов на время замера
+UNLIMITED = {group: None for group in ('post_create', 'add_comment',
+                                       'profile_follow')}
+# Всё — во временную базу: без реплик и шардов с живыми данными
+ISOLATED = {'RATELIMITS': UNLIMITED, 'DATABASE_REPLICAS': [],
+            'POST_SHARDS': [DEFAULT_DB_ALIAS]}
+
+
+class Command(BaseCommand):
+    help = ('Нагружает пишущие вьюхи из нескольких потоков во временной '
+            'копии схемы базы и печатает пропускную способность, задержки '
+            'и ошибки блокировки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=100,
+                            help='Запросов на поток.')
+
+    def handle(self, *args, **options):
+        # Тот же бэкенд и настройки, но свежая база в отдельном файле:
+        # живая база не получает ни строк, ни блокировок от замера
+        directory = tempfile.mkdtemp(prefix='benchmark-writes-')
+        test_settings = connection.settings_dict.get('TEST', {})
+        connection.settings_dict['TEST'] = dict(
+            test_settings, NAME=os.path.join(directory, 'db.sqlite3'))
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(**ISOLATED):
+                self.benchmark(options)
+        finally:
+            if connection.pool is not None:
+                connection.close()
+                connection.pool.close_idle()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            connection.settings_dict['TEST'] = test_settings
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def benchmark(self, options):
+        users = [User.objects.create_user(username=f'{PREFIX}{number}')
+                 for number in range(options['threads'])]
+        post = Post.objects.create(author=users[0], text='Замер записи')
+        latencies, errors = [], []
+        started = time.perf_counter()
+        threads = [
+            threading.Thread(target=self.worker, args=(
+                user, users[0], post, options['requests'], latencies,
+                errors))
+            for user in users
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        latencies.sort()
+        self.stdout.write(
+            f'{len(latencies)} запросов за {elapsed:.2f} с '
+            f'({len(latencies) / elapsed:.0f} в секунду)')
+        self.stdout.write(
+            f'медиана {statistics.median(latencies) * 1000:.1f} мс, '
+            f'95% {latencies[int(len(latencies) * 0.95)] * 1000:.1f} мс, '
+            f'ошибок {len(errors)}')
+        for message in sorted(set(errors)):
+            self.stdout.write(f'  {errors.count(message)} x {message}')
+        for alias, counters in pool.stats().items():
+            self.stdout.write(
+                f'пул {alias}: {counters["created"]} соединений на '
+                f'{counters["checkouts"]} выдач, ожидание в среднем '
+                f'{counters["wait_avg"] * 1000:.1f} мс, максимум '
+                f'{counters["wait_max"] * 1000:.1f} мс, '
+                f'отказов {counters["timeouts"]}')
+
+    def worker(self, user, author, post, count, latencies, errors):
+        client = Client()
+        client.force_login(user)
+        requests = (
+            ('post', reverse('posts:add_comment', args=(post.id,)),
+             {'text': 'Комментарий'}),
+            ('post', reverse('posts:create_post'), {'text': 'Пост'}),
+            ('get', reverse('posts:profile_follow', args=(author.username,)),
+             None),
+            ('get', reverse('posts:profile_unfollow',
+                            args=(author.username,)), None),
+        )
+        try:
+            for number in range(count):
+                method, url, data = requests[number % len(requests)]
+                started = time.perf_counter()
+                try:
+                    response = getattr(client, method)(url, data)
+                    if response.status_code >= 500:
+                        errors.append(f'HTTP {response.status_code}')
+                except OperationalError as error:
+                    errors.append(str(error))
+                latencies.append(time.perf_counter() - started)
+        finally:
+            connection.close()
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from core import tasks
+
+
+class Command(BaseCommand):
+    help = 'Запускает воркер очереди фоновых задач.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int,
+                            default=tasks.TASK_WORKERS,
+                            help='Размер пула потоков.')
+        parser.add_argument('--once', action='store_true',
+                            help='Выйти, когда готовых задач не останется.')
+        parser.add_argument('--stats', action='store_true',
+                            help='Только показать сводку по задачам.')
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            for row in tasks.metrics():
+                self.stdout.write(
+                    '{name} {status}: {count}, среднее {avg}, '
+                    'максимум {max}'.format(
+                        name=row['name'], status=row['status'],
+                        count=row['count'],
+                        avg=_seconds(row['avg_duration']),
+                        max=_seconds(row['max_duration']),
+                    ))
+            return
+        processed = tasks.run_worker(workers=options['workers'],
+                                     once=options['once'])
+        self.stdout.write(f'Задач выполнено: {processed}')
+
+
+def _seconds(value):
+    return '-' if value is None else f'{value:.3f} с'
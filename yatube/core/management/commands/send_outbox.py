@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from core import mail
+
+
+class Command(BaseCommand):
+    help = 'Отправляет накопленные в outbox письма.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            default=mail.OUTBOX_BATCH_SIZE,
+                            help='Сколько писем отправлять за соединение.')
+
+    def handle(self, *args, **options):
+        count = mail.deliver_pending(options['batch_size'])
+        self.stdout.write(f'Писем обработано: {count}')
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+class Command(BaseCommand):
+    help = ('Обслуживание SQLite: ANALYZE, PRAGMA optimize, '
+            'инкрементальный VACUUM и сброс WAL. Запускать по расписанию.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument(
+            '--pages', type=int, default=1000,
+            help='Сколько свободных страниц возвращать за запуск.',
+        )
+        parser.add_argument(
+            '--enable-incremental-vacuum', action='store_true',
+            help='Однократно перевести базу в auto_vacuum=INCREMENTAL '
+                 '(полный VACUUM, база блокируется).',
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'sqlite':
+            raise CommandError('Команда только для SQLite')
+        with connection.cursor() as cursor:
+            if options['enable_incremental_vacuum']:
+                cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+                cursor.execute('VACUUM')
+            cursor.execute('ANALYZE')
+            cursor.execute('PRAGMA optimize')
+            cursor.execute('PRAGMA auto_vacuum')
+            if cursor.fetchone()[0] == AUTO_VACUUM_INCREMENTAL:
+                cursor.execute('PRAGMA freelist_count')
+                before = cursor.fetchone()[0]
+                cursor.execute(
+                    f'PRAGMA incremental_vacuum({options["pages"]})')
+                cursor.fetchall()
+                cursor.execute('PRAGMA freelist_count')
+                freed = before - cursor.fetchone()[0]
+                self.stdout.write(f'Освобождено страниц: {freed}')
+            else:
+                self.stdout.write('auto_vacuum выключен, см. '
+                                  '--enable-incremental-vacuum')
+            cursor.execute('PRAGMA journal_mode')
+            if cursor.fetchone()[0] != 'wal':
+                self.stdout.write('WAL выключен, сбрасывать нечего')
+                return
+            cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            busy, log, checkpointed = cursor.fetchone()
+            self.stdout.write(f'WAL: {checkpointed} из {log} страниц '
+                              f'перенесено в базу')
@@ -0,0 +1,166 @@
+"""Отдача загруженных файлов из MEDIA_ROOT.
+
+Поддерживаются сильные ETag и If-None-Match, If-Modified-Since и один
+диапазон байт (Range, If-Range). С MEDIA_SENDFILE отдачу тела берёт на
+себя фронтовой прокси: 'x-sendfile' (Apache, lighttpd) получает путь к
+файлу, 'x-accel-redirect' (nginx) — внутренний адрес с
+MEDIA_ACCEL_PREFIX. Иначе файл уходит через FileResponse: WSGI-сервер с
+wsgi.file_wrapper (gunicorn, uWSGI) шлёт его os.sendfile без
+копирования, ровно Content-Length байт с текущей позиции.
+"""
+import mimetypes
+import os
+import re
+import stat
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (FileResponse, Http404, HttpResponse,
+                         HttpResponseNotModified)
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_http_date_safe
+
+MEDIA_SENDFILE = getattr(settings, 'MEDIA_SENDFILE', None)
+MEDIA_ACCEL_PREFIX = getattr(settings, 'MEDIA_ACCEL_PREFIX',
+                             '/protected-media/')
+MEDIA_CACHE_CONTROL = getattr(settings, 'MEDIA_CACHE_CONTROL',
+                              'public, max-age=86400')
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def file_etag(info):
+    """Меняется при любой перезаписи файла: inode, размер, mtime в нс."""
+    return f'"{info.st_ino:x}-{info.st_size:x}-{info.st_mtime_ns:x}"'
+
+
+def not_modified(request, etag, mtime):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        # Для GET сравнение слабое: W/"x" совпадает с "x"
+        return '*' in tags or etag in (re.sub(r'^W/', '', tag)
+                                       for tag in tags)
+    since = parse_http_date_safe(
+        request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return since is not None and int(mtime) <= since
+
+
+def parse_range(header, size):
+    """(начало, конец) включительно, None без диапазона, False — вне файла.
+
+    Несколько диапазонов сразу не поддерживаются: отдаётся файл целиком.
+    """
+    match = RANGE_RE.match(header.replace(' ', ''))
+    if not match or not any(match.groups()):
+        return None
+    first, last = match.groups()
+    if not first:
+        # bytes=-N: последние N байт
+        length = int(last)
+        if not length:
+            return False
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        return False
+    return start, end
+
+
+def requested_range(request, etag, size):
+    """Диапазон из Range, если If-Range не говорит, что файл сменился."""
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if 'HTTP_RANGE' not in request.META or if_range not in (None, etag):
+        return None
+    return parse_range(request.META['HTTP_RANGE'], size)
+
+
+def file_headers(full_path, info, etag):
+    content_type, encoding = mimetypes.guess_type(full_path)
+    headers = {
+        'Content-Type': content_type or 'application/octet-stream',
+        'ETag': etag,
+        'Last-Modified': http_date(info.st_mtime),
+        'Cache-Control': MEDIA_CACHE_CONTROL,
+        'Accept-Ranges': 'bytes',
+    }
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    return headers
+
+
+class RangeFile:
+    """Файл, из которого читается не больше length байт от позиции."""
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def handoff(path, full_path, headers):
+    """Пустой ответ, тело которого отдаст фронтовой прокси.
+
+    Диапазоны и условные запросы дальше обработает сам прокси.
+    """
+    response = HttpResponse()
+    if MEDIA_SENDFILE == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = MEDIA_ACCEL_PREFIX + path
+    else:
+        response['X-Sendfile'] = full_path
+    for name, value in headers.items():
+        response[name] = value
+    # Длину ответа выставит прокси
+    del response['Content-Length']
+    return response
+
+
+def serve_media(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        info = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404
+    if not stat.S_ISREG(info.st_mode):
+        raise Http404
+    etag = file_etag(info)
+    if not_modified(request, etag, info.st_mtime):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+    headers = file_headers(full_path, info, etag)
+    if MEDIA_SENDFILE:
+        return handoff(path, full_path, headers)
+    size = info.st_size
+    byte_range = requested_range(request, etag, size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    start, end = byte_range or (0, size - 1)
+    length = end - start + 1
+    if request.method == 'HEAD':
+        response = HttpResponse(status=206 if byte_range else 200)
+    else:
+        response = FileResponse(RangeFile(open(full_path, 'rb'), start,
+                                          length),
+                                status=206 if byte_range else 200)
+    for name, value in headers.items():
+        response[name] = value
+    response['Content-Length'] = str(length)
+    if byte_range:
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
@@ -0,0 +1,30 @@
+# Generated by Django 2.2.16 on 2026-10-19 11:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_outboxmessage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BackfillProgress',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='Заполнение')),
+                ('database', models.CharField(max_length=50, verbose_name='База')),
+                ('last_pk', models.CharField(blank=True, max_length=100, verbose_name='Последний pk')),
+                ('processed', models.BigIntegerField(default=0, verbose_name='Пройдено строк')),
+                ('started', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('finished', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='backfillprogress',
+            constraint=models.UniqueConstraint(fields=('name', 'database'), name='backfill_name_database_unique'),
+        ),
+    ]
@@ -0,0 +1,100 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Task(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField('Функция', max_length=200)
+    payload = models.TextField('Аргументы', default='{}')
+    priority = models.SmallIntegerField(
+        'Приоритет', default=0,
+        help_text='Задачи с большим приоритетом выполняются раньше'
+    )
+    status = models.CharField(max_length=10, choices=STATUSES,
+                              default=QUEUED)
+    run_at = models.DateTimeField('Не раньше', default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+    duration = models.FloatField('Время выполнения, с', null=True,
+                                 blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', '-priority', 'run_at'],
+                         name='task_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} [{self.status}]'
+
+
+class OutboxMessage(models.Model):
+    QUEUED = 'queued'
+    SENDING = 'sending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'В очереди'),
+        (SENDING, 'Отправляется'),
+        (SENT, 'Отправлено'),
+        (FAILED, 'Ошибка'),
+    )
+
+    subject = models.TextField('Тема')
+    body = models.TextField('Текст')
+    from_email = models.CharField('Отправитель', max_length=254)
+    # Адресаты, заголовки и альтернативы хранятся как JSON
+    recipients = models.TextField('Адресаты')
+    headers = models.TextField(default='{}')
+    alternatives = models.TextField(default='[]')
+    status = models.CharField(max_length=10, choices=STATUSES,
+                              default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt = models.DateTimeField(default=timezone.now)
+    lease = models.CharField(max_length=32, blank=True)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    sent = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt'],
+                         name='outbox_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.subject} [{self.status}]'
+
+
+class BackfillProgress(models.Model):
+    """Отметка прохода core.backfill: до какого pk дошли в какой базе."""
+    name = models.CharField('Заполнение', max_length=100)
+    database = models.CharField('База', max_length=50)
+    last_pk = models.CharField('Последний pk', max_length=100, blank=True)
+    processed = models.BigIntegerField('Пройдено строк', default=0)
+    started = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+    finished = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['name', 'database'],
+                                    name='backfill_name_database_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.name}@{self.database}: {self.processed}'
@@ -0,0 +1,164 @@
+"""Прогрев приложения в мастер-процессе до форка воркеров.
+
+warm_up импортирует модули всех приложений, компилирует все шаблоны (при
+кэширующем загрузчике, то есть без DEBUG, они так и остаются в памяти),
+разбирает URL-схему и загружает переводы; адреса из PRELOAD_URLS ещё и
+запрашиваются через приложение. freeze закрывает соединения с базами —
+их нельзя делить между процессами — и переносит всё накопленное в
+постоянное поколение сборщика мусора: сборщик воркеров эти объекты не
+обходит и не пачкает их страницы, и они остаются общими copy-on-write.
+
+Точка входа — yatube/preload.py, замер — manage.py benchmark_startup.
+"""
+import gc
+import io
+import os
+import pkgutil
+import sys
+import time
+from importlib import import_module
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.hashers import get_hashers
+from django.db import connections
+from django.template import engines
+from django.urls import URLResolver, get_resolver
+from django.utils import translation
+
+SKIP_MODULES = {'tests', 'migrations', 'management'}
+# Не нужны воркерам: тесты, миграции и команды manage.py
+
+
+def import_modules():
+    """Импортирует модули всех приложений; возвращает их имена."""
+    imported = []
+    for config in apps.get_app_configs():
+        packages = getattr(config.module, '__path__', [])
+        for module in pkgutil.walk_packages(packages, config.name + '.',
+                                            onerror=lambda name: None):
+            if SKIP_MODULES.intersection(module.name.split('.')):
+                continue
+            try:
+                import_module(module.name)
+            except ImportError:
+                # Модули необязательных зависимостей
+                continue
+            imported.append(module.name)
+    for model in apps.get_models():
+        model._meta.get_fields()
+    return imported
+
+
+def template_dirs(engine):
+    for loader in engine.template_loaders:
+        for inner in getattr(loader, 'loaders', [loader]):
+            if hasattr(inner, 'get_dirs'):
+                yield from inner.get_dirs()
+
+
+def compile_templates():
+    """Компилирует все шаблоны Django; возвращает их имена."""
+    compiled = []
+    for backend in engines.all():
+        engine = getattr(backend, 'engine', None)
+        if engine is None:
+            continue
+        names = set()
+        for directory in template_dirs(engine):
+            for root, _, files in os.walk(directory):
+                names.update(
+                    os.path.relpath(os.path.join(root, name),
+                                    directory).replace(os.sep, '/')
+                    for name in files)
+        for name in sorted(names):
+            try:
+                backend.get_template(name)
+            except Exception:
+                # Не шаблон или шаблон для другого движка
+                continue
+            compiled.append(name)
+    return compiled
+
+
+def resolve_urls(resolver=None):
+    """Строит таблицы reverse всех URLResolver; возвращает число адресов."""
+    resolver = resolver or get_resolver()
+    resolver.reverse_dict
+    count = 0
+    for pattern in resolver.url_patterns:
+        if isinstance(pattern, URLResolver):
+            count += resolve_urls(pattern)
+        else:
+            pattern.pattern.regex
+            count += 1
+    return count
+
+
+def environ(path):
+    host = next((host.lstrip('.') for host in settings.ALLOWED_HOSTS
+                 if host != '*'), 'localhost')
+    return {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'SCRIPT_NAME': '',
+        'QUERY_STRING': '',
+        'SERVER_NAME': host,
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': host,
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': False,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+
+
+def get(application, path):
+    """GET через WSGI-приложение: (код ответа, time.time() первого байта)."""
+    statuses = []
+    result = application(environ(path),
+                         lambda status, headers, *args: statuses.append(
+                             status))
+    first_byte = None
+    try:
+        for chunk in result:
+            if chunk and first_byte is None:
+                first_byte = time.time()
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return int(statuses[0].split()[0]), first_byte or time.time()
+
+
+def warm_up(application=None):
+    """Прогревает всё, что иначе строилось бы в каждом воркере заново."""
+    started = time.monotonic()
+    stats = {
+        'modules': len(import_modules()),
+        'templates': len(compile_templates()),
+        'urls': resolve_urls(),
+    }
+    with translation.override(settings.LANGUAGE_CODE):
+        translation.gettext('')
+    get_hashers()
+    if application is not None:
+        # Настройка читается здесь: модуль импортируют до django.setup()
+        for path in getattr(settings, 'PRELOAD_URLS', []):
+            get(application, path)
+    stats['seconds'] = time.monotonic() - started
+    return stats
+
+
+def freeze():
+    """Последний шаг мастера перед форком.
+
+    Сборщик, если его выключили на время загрузки, снова включается:
+    замороженные объекты он всё равно больше не обходит.
+    """
+    connections.close_all()
+    gc.freeze()
+    gc.enable()
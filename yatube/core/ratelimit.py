@@ -0,0 +1,103 @@
+"""Ограничение частоты запросов на счётчиках в общем кэше.
+
+Окно скользящее: счётчик текущего окна складывается с долей счётчика
+предыдущего. Ключ — пользователь, для анонимов — IP. Лимиты задаются
+в декораторе и переопределяются в settings.RATELIMITS по имени группы.
+"""
+import math
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.shortcuts import render
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+
+_groups = set()
+
+
+def parse_rate(rate):
+    """'10/m' -> (10, 60); None или '' отключают лимит."""
+    if not rate:
+        return None
+    count, period = rate.split('/')
+    return int(count), PERIODS[period]
+
+
+def client_key(request):
+    if request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    address = request.META.get('REMOTE_ADDR', '')
+    if getattr(settings, 'RATELIMIT_TRUST_X_FORWARDED_FOR', False):
+        forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+        if forwarded:
+            address = forwarded.split(',')[0].strip()
+    return f'ip:{address}'
+
+
+def _incr(key, timeout):
+    cache.add(key, 0, timeout)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Ключ истёк между add и incr
+        cache.add(key, 1, timeout)
+        return 1
+
+
+def hit(group, key, limit, period):
+    """Учитывает запрос; возвращает 0 или сколько секунд ждать."""
+    now = time.time()
+    window = int(now // period)
+    elapsed = now - window * period
+    prefix = f'ratelimit:{group}:{key}'
+    current = _incr(f'{prefix}:{window}', period * 2)
+    previous = cache.get(f'{prefix}:{window - 1}', 0)
+    weight = (period - elapsed) / period
+    if previous * weight + current <= limit:
+        return 0
+    if current > limit or not previous:
+        return max(1, math.ceil(period - elapsed))
+    # Когда вклад прошлого окна упадёт настолько, что запрос пройдёт
+    wait = period - elapsed - (limit - current) * period / previous
+    return max(1, math.ceil(wait))
+
+
+def _count(group, outcome):
+    _incr(f'ratelimit:stats:{group}:{outcome}', None)
+
+
+def stats():
+    """Счётчики пропущенных и отклонённых запросов по группам."""
+    keys = {group: (f'ratelimit:stats:{group}:allowed',
+                    f'ratelimit:stats:{group}:blocked')
+            for group in sorted(_groups)}
+    values = cache.get_many([key for pair in keys.values() for key in pair])
+    return {group: {'allowed': values.get(allowed, 0),
+                    'blocked': values.get(blocked, 0)}
+            for group, (allowed, blocked) in keys.items()}
+
+
+def ratelimit(group, rate, methods=None):
+    """Декоратор вьюхи: сверх лимита отвечает 429 с Retry-After."""
+    _groups.add(group)
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            limit = parse_rate(
+                getattr(settings, 'RATELIMITS', {}).get(group, rate))
+            if limit is None or (methods and request.method not in methods):
+                return view(request, *args, **kwargs)
+            retry_after = hit(group, client_key(request), *limit)
+            if retry_after:
+                _count(group, 'blocked')
+                response = render(request, 'core/429.html',
+                                  {'retry_after': retry_after}, status=429)
+                response['Retry-After'] = str(retry_after)
+                return response
+            _count(group, 'allowed')
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,141 @@
+"""Чтение лент и страниц постов с реплик, запись — в основную базу.
+
+Вьюхи, помеченные @replica_reads, читают со случайной живой реплики из
+settings.DATABASE_REPLICAS. Всё остальное, а также любые запросы
+клиента, который недавно что-то записал, идёт в default: после записи
+ReplicaMiddleware ставит cookie на REPLICA_PIN_SECONDS, и пока она жива,
+клиент видит свои изменения, даже если реплики отстают. Закрепляют
+только записи самого клиента: сессии и всё, что пишется внутри
+side_effect_writes (счётчики трендов, last_login), не в счёт. Реплика, не
+ответившая на проверку или упавшая посреди запроса, на REPLICA_RETRY
+секунд исключается, а запрос повторяется на основной базе.
+"""
+import random
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import request_finished
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+REPLICA_PIN_SECONDS = getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+REPLICA_CHECK_INTERVAL = 10
+REPLICA_RETRY = 30
+PIN_COOKIE = 'primary_pin'
+SIDE_EFFECT_MODELS = {'sessions.session'}
+# Пишутся почти на каждом запросе и клиенту не видны
+
+_state = threading.local()
+
+
+def _reset(**kwargs):
+    _state.replica = None
+    _state.wrote = False
+
+
+request_finished.connect(_reset)
+
+
+def note_write(model):
+    """Закрепляет клиента за default, если запись — его собственная."""
+    if (not getattr(_state, 'side_effects', 0)
+            and model._meta.label_lower not in SIDE_EFFECT_MODELS):
+        _state.wrote = True
+
+
+@contextmanager
+def side_effect_writes():
+    """Записи внутри блока не закрепляют клиента за default."""
+    _state.side_effects = getattr(_state, 'side_effects', 0) + 1
+    try:
+        yield
+    finally:
+        _state.side_effects -= 1
+
+
+def replica_is_healthy(alias):
+    """SELECT 1 не чаще раза в REPLICA_CHECK_INTERVAL; отказ — в кэш."""
+    if cache.get(f'replica:down:{alias}'):
+        return False
+    if cache.get(f'replica:checked:{alias}'):
+        return True
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except DatabaseError:
+        mark_down(alias)
+        return False
+    cache.set(f'replica:checked:{alias}', True, REPLICA_CHECK_INTERVAL)
+    return True
+
+
+def mark_down(alias):
+    cache.set(f'replica:down:{alias}', True, REPLICA_RETRY)
+
+
+def choose_replica():
+    healthy = [alias for alias in getattr(settings, 'DATABASE_REPLICAS', [])
+               if replica_is_healthy(alias)]
+    return random.choice(healthy) if healthy else None
+
+
+class PrimaryReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        return getattr(_state, 'replica', None) or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        note_write(model)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии default, объекты из них совместимы
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def replica_reads(view):
+    """Читать с реплики, если клиент не писал в последние секунды."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        pinned = request.method not in ('GET', 'HEAD') or PIN_COOKIE in (
+            request.COOKIES)
+        previous = getattr(_state, 'replica', None)
+        _state.replica = None if pinned else choose_replica()
+        try:
+            return _read_with_fallback(view, request, *args, **kwargs)
+        finally:
+            # Вне запроса (команда, тест, вложенный вызов) выбор не должен
+            # пережить вьюху
+            _state.replica = previous
+    return wrapper
+
+
+def _read_with_fallback(view, request, *args, **kwargs):
+    if _state.replica is None:
+        return view(request, *args, **kwargs)
+    try:
+        return view(request, *args, **kwargs)
+    except DatabaseError:
+        mark_down(_state.replica)
+        _state.replica = None
+        return view(request, *args, **kwargs)
+
+
+class ReplicaMiddleware:
+    """Сбрасывает выбор реплики и закрепляет писавших за default."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _reset()
+        response = self.get_response(request)
+        if _state.wrote:
+            response.set_cookie(PIN_COOKIE, '1', max_age=REPLICA_PIN_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
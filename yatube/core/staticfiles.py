@@ -0,0 +1,189 @@
+"""Статика с хэшами в именах, заранее сжатая gzip и brotli.
+
+CompressedManifestStorage при collectstatic добавляет хэш содержимого
+в имена файлов и рядом с текстовыми файлами кладёт .gz и .br копии.
+StaticFilesMiddleware отдаёт их с диска до сессий, авторизации и вьюх:
+хэшированные имена — с immutable на год, сжатую копию — по
+Accept-Encoding. Индекс файлов перестраивается, когда collectstatic
+переписывает манифест.
+"""
+import gzip
+import mimetypes
+import os
+import re
+
+import brotli
+from django.conf import settings
+from django.contrib.staticfiles.storage import (ManifestStaticFilesStorage,
+                                                staticfiles_storage)
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils.http import http_date, parse_http_date_safe
+
+COMPRESSIBLE = ('.css', '.js', '.svg', '.html', '.txt', '.json', '.xml',
+                '.ico', '.map')
+MIN_COMPRESS_SIZE = 256
+# Меньшие файлы сжатие не окупают
+IMMUTABLE = 'public, max-age=31536000, immutable'
+SHORT_CACHE = 'public, max-age=60'
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def compress_file(path):
+    """Пишет path.gz и path.br, если они меньше оригинала."""
+    with open(path, 'rb') as source:
+        data = source.read()
+    if len(data) < MIN_COMPRESS_SIZE:
+        return []
+    written = []
+    variants = (
+        ('.gz', gzip.compress(data, compresslevel=9, mtime=0)),
+        ('.br', brotli.compress(data, quality=11)),
+    )
+    for suffix, compressed in variants:
+        if len(compressed) < len(data):
+            with open(path + suffix, 'wb') as target:
+                target.write(compressed)
+            written.append(path + suffix)
+    return written
+
+
+class CompressedManifestStorage(ManifestStaticFilesStorage):
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # Без collectstatic (тесты, локальный запуск) — исходное имя
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        names = set()
+        for name, hashed_name, processed in super().post_process(
+                paths, dry_run=dry_run, **options):
+            if hashed_name and not isinstance(processed, Exception):
+                names.update((name, hashed_name))
+            yield name, hashed_name, processed
+        if dry_run:
+            return
+        for name in sorted(names):
+            if name.lower().endswith(COMPRESSIBLE):
+                compress_file(self.path(name))
+
+
+def accepted_encodings(request):
+    accepted = set()
+    for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, _, params = part.strip().partition(';')
+        if re.search(r'q=0(\.0*)?\s*$', params):
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+class StaticFilesMiddleware:
+    """Отдаёт собранную статику из STATIC_ROOT в обход остального стека."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefix = settings.STATIC_URL
+        self.root = settings.STATIC_ROOT
+        self.files = None
+        self.stamp = None
+
+    def manifest_stamp(self):
+        """mtime манифеста, а без него — самого STATIC_ROOT."""
+        name = getattr(staticfiles_storage, 'manifest_name', '')
+        for path in (os.path.join(self.root, name), self.root):
+            try:
+                return os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+        return None
+
+    def hashed_names(self):
+        # Манифест перечитывается: hashed_files хранилища загружены
+        # при старте процесса и не знают о новом collectstatic
+        if hasattr(staticfiles_storage, 'load_manifest'):
+            return set(staticfiles_storage.load_manifest().values())
+        return set(getattr(staticfiles_storage, 'hashed_files', {})
+                   .values())
+
+    def index(self):
+        """Один проход по STATIC_ROOT: url-путь -> файл и его копии."""
+        files = {}
+        hashed = self.hashed_names()
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(directory, name)
+                relative = os.path.relpath(path, self.root).replace(os.sep,
+                                                                    '/')
+                if relative.endswith(('.gz', '.br')):
+                    continue
+                stat = os.stat(path)
+                files[self.prefix + relative] = {
+                    'path': path,
+                    'mtime': int(stat.st_mtime),
+                    'etag': '"%x-%x"' % (int(stat.st_mtime), stat.st_size),
+                    'immutable': relative in hashed,
+                    'variants': {
+                        coding: path + suffix
+                        for coding, suffix in ENCODINGS
+                        if os.path.exists(path + suffix)
+                    },
+                }
+        return files
+
+    def __call__(self, request):
+        if (self.root and request.method in ('GET', 'HEAD')
+                and request.path_info.startswith(self.prefix)):
+            stamp = self.manifest_stamp()
+            if self.files is None or stamp != self.stamp:
+                self.stamp = stamp
+                self.files = self.index() if stamp is not None else {}
+            entry = self.files.get(request.path_info)
+            if entry is not None:
+                return self.serve(request, entry)
+        return self.get_response(request)
+
+    @staticmethod
+    def not_modified(request, entry, etag):
+        etags = request.META.get('HTTP_IF_NONE_MATCH')
+        if etags is not None:
+            # If-None-Match главнее If-Modified-Since (RFC 7232, 3.3)
+            etags = [value.strip().replace('W/', '', 1)
+                     for value in etags.split(',')]
+            return '*' in etags or etag in etags
+        since = parse_http_date_safe(
+            request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        return since is not None and entry['mtime'] <= since
+
+    @staticmethod
+    def set_headers(response, entry, etag):
+        """Валидаторы и кэширование — общие для 200 и 304."""
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(entry['mtime'])
+        response['Cache-Control'] = (IMMUTABLE if entry['immutable']
+                                     else SHORT_CACHE)
+        if entry['variants']:
+            response['Vary'] = 'Accept-Encoding'
+        return response
+
+    def serve(self, request, entry):
+        path, encoding, etag = entry['path'], None, entry['etag']
+        accepted = accepted_encodings(request)
+        for coding, _ in ENCODINGS:
+            if coding in accepted and coding in entry['variants']:
+                path, encoding = entry['variants'][coding], coding
+                # У сжатой копии другие байты — и другой ETag
+                etag = '%s-%s"' % (etag[:-1], coding)
+                break
+        if self.not_modified(request, entry, etag):
+            return self.set_headers(HttpResponseNotModified(), entry, etag)
+        content_type = (mimetypes.guess_type(entry['path'])[0]
+                        or 'application/octet-stream')
+        response = FileResponse(open(path, 'rb'))
+        # FileResponse угадал бы тип по .gz/.br, а нужен тип оригинала
+        response['Content-Type'] = content_type
+        if encoding:
+            response['Content-Encoding'] = encoding
+        return self.set_headers(response, entry, etag)
@@ -0,0 +1,47 @@
+"""Потоковая отрисовка страниц-лент.
+
+Страница рендерится один раз с маркером на месте списка: всё до маркера
+(base.html, шапка) уходит клиенту сразу, затем каждый элемент рендерится
+отдельным шаблоном по мере того, как его отдаёт итератор queryset,
+и в конце — остаток страницы. Памяти на запрос нужно на один элемент.
+"""
+from django.http import StreamingHttpResponse
+from django.template import loader
+from django.utils.safestring import mark_safe
+
+STREAM_MARKER = '<!-- stream-items -->'
+
+
+def _with_forloop(items):
+    """(элемент, forloop) с заглядыванием на один вперёд."""
+    iterator = iter(items)
+    try:
+        current = next(iterator)
+    except StopIteration:
+        return
+    first = True
+    for following in iterator:
+        yield current, {'first': first, 'last': False}
+        current, first = following, False
+    yield current, {'first': first, 'last': True}
+
+
+def stream_render(request, template_name, context, items, item_template,
+                  item_name, item_context=None):
+    page = loader.render_to_string(
+        template_name, dict(context, stream_marker=mark_safe(STREAM_MARKER)),
+        request)
+    head, tail = page.split(STREAM_MARKER, 1)
+    template = loader.get_template(item_template)
+    if hasattr(items, 'iterator'):
+        items = items.iterator()
+
+    def chunks():
+        yield head
+        for item, forloop in _with_forloop(items):
+            # Без request: контекст-процессоры на каждый элемент не нужны
+            yield template.render(dict(item_context or {}, forloop=forloop,
+                                       **{item_name: item}))
+        yield tail
+
+    return StreamingHttpResponse(chunks())
@@ -0,0 +1,159 @@
+"""Локальная очередь фоновых задач в таблице core_task.
+
+Функция регистрируется декоратором @task и ставится в очередь через
+.delay() или .schedule(); воркер (manage.py run_tasks) забирает задачи
+пулом потоков, повторяет упавшие с нарастающей паузой и пишет время
+выполнения в строку задачи.
+"""
+import json
+import logging
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Avg, Count, Max
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+TASK_WORKERS = getattr(settings, 'TASK_WORKERS', 4)
+TASK_POLL_INTERVAL = getattr(settings, 'TASK_POLL_INTERVAL', 1.0)
+TASK_RETRY_DELAY = getattr(settings, 'TASK_RETRY_DELAY', 10)
+# Пауза перед повтором: TASK_RETRY_DELAY * 2 ** (попытка - 1) секунд
+TASK_TIMEOUT = getattr(settings, 'TASK_TIMEOUT', 15 * 60)
+# Задачи, которые выполняются дольше, считаются брошенными воркером
+
+_registry = {}
+
+
+class TaskFunction:
+    """Обёртка зарегистрированной функции с методами постановки."""
+
+    def __init__(self, func, priority, max_attempts):
+        self.func = func
+        self.name = f'{func.__module__}.{func.__qualname__}'
+        self.priority = priority
+        self.max_attempts = max_attempts
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def schedule(self, delay, *args, priority=None, **kwargs):
+        """Ставит задачу на выполнение не раньше чем через delay секунд."""
+        return Task.objects.create(
+            name=self.name,
+            payload=json.dumps({'args': args, 'kwargs': kwargs}),
+            priority=self.priority if priority is None else priority,
+            max_attempts=self.max_attempts,
+            run_at=timezone.now() + timedelta(seconds=delay),
+        )
+
+    def delay(self, *args, **kwargs):
+        return self.schedule(0, *args, **kwargs)
+
+
+def task(func=None, *, priority=0, max_attempts=3):
+    """Регистрирует функцию как фоновую задачу."""
+    def register(func):
+        wrapper = TaskFunction(func, priority, max_attempts)
+        _registry[wrapper.name] = wrapper
+        return wrapper
+    return register(func) if func is not None else register
+
+
+def resolve(name):
+    if name not in _registry:
+        # Модуль с задачей импортируется и регистрирует её сам
+        import_string(name)
+    return _registry[name]
+
+
+def claim(limit):
+    """Забирает до limit готовых задач; гонку решает условный UPDATE."""
+    now = timezone.now()
+    candidates = (Task.objects
+                  .filter(status=Task.QUEUED, run_at__lte=now)
+                  .order_by('-priority', 'run_at', 'id')
+                  .values_list('id', flat=True)[:limit])
+    claimed = []
+    for task_id in candidates:
+        taken = Task.objects.filter(pk=task_id, status=Task.QUEUED).update(
+            status=Task.RUNNING, started=now)
+        if taken:
+            claimed.append(task_id)
+    return claimed
+
+
+def execute(task_id):
+    """Выполняет одну задачу в текущем потоке и записывает итог."""
+    task_row = Task.objects.get(pk=task_id)
+    task_row.attempts += 1
+    started = time.monotonic()
+    try:
+        payload = json.loads(task_row.payload)
+        resolve(task_row.name).func(*payload.get('args', ()),
+                                    **payload.get('kwargs', {}))
+    except Exception:
+        task_row.last_error = traceback.format_exc()
+        if task_row.attempts < task_row.max_attempts:
+            task_row.status = Task.QUEUED
+            task_row.run_at = timezone.now() + timedelta(
+                seconds=TASK_RETRY_DELAY * 2 ** (task_row.attempts - 1))
+        else:
+            task_row.status = Task.FAILED
+        logger.warning('Задача %s упала (попытка %s)',
+                       task_row.name, task_row.attempts)
+    else:
+        task_row.status = Task.DONE
+    task_row.duration = time.monotonic() - started
+    task_row.finished = timezone.now()
+    task_row.save()
+    return task_row.status
+
+
+def _execute_in_thread(task_id):
+    try:
+        return execute(task_id)
+    finally:
+        connection.close()
+
+
+def requeue_stale(timeout=TASK_TIMEOUT):
+    """Возвращает в очередь задачи, брошенные упавшим воркером."""
+    border = timezone.now() - timedelta(seconds=timeout)
+    return Task.objects.filter(status=Task.RUNNING,
+                               started__lt=border).update(status=Task.QUEUED)
+
+
+def run_worker(workers=TASK_WORKERS, once=False,
+               poll_interval=TASK_POLL_INTERVAL):
+    """Цикл воркера; с once=True выходит, когда готовых задач не осталось."""
+    requeue_stale()
+    processed = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        running = set()
+        while True:
+            running = {future for future in running if not future.done()}
+            claimed = claim(workers - len(running))
+            for task_id in claimed:
+                running.add(pool.submit(_execute_in_thread, task_id))
+            processed += len(claimed)
+            if claimed:
+                continue
+            if once and not running:
+                return processed
+            time.sleep(poll_interval if not running else 0.05)
+
+
+def metrics():
+    """Сводка по задачам: число по статусам, среднее и худшее время."""
+    return list(Task.objects.values('name', 'status')
+                .annotate(count=Count('id'), avg_duration=Avg('duration'),
+                          max_duration=Max('duration'))
+                .order_by('name', 'status'))
@@ -0,0 +1,12 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from core.fragments import include_tag
+
+register = template.Library()
+
+
+@register.simple_tag
+def fragment(name, **params):
+    """Место персонального фрагмента в общем теле страницы."""
+    return mark_safe(include_tag(name, **params))
@@ -1,5 +1,79 @@
-from django.test import TestCase
+import gc
+import gzip
+import os
+import shutil
+import tempfile
+import threading
+import time
+from io import StringIO
+from unittest import mock
+
+import brotli
+from django.apps import apps as django_apps
+from django.contrib.auth import get_user_model
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core import mail
+from django.core.cache import cache
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.mail import send_mail
+from django.core.management import call_command
+from django.db import (OperationalError, connection, connections,
+                       transaction)
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import (RequestFactory, TestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+from django.utils import timezone
 from http import HTTPStatus
+from types import SimpleNamespace
+
+from core import preload
+from core.backfill import Backfill, RunBackfill, run
+from core.compression import CompressionMiddleware
+from core.db import immediate, pool
+from core.db.sqlite3.base import DatabaseWrapper
+from core.media import parse_range
+from core.mail import deliver_pending
+from core.models import BackfillProgress, OutboxMessage, Task
+from core.ratelimit import hit, stats
+from core.replicas import (PIN_COOKIE, PrimaryReplicaRouter, ReplicaMiddleware,
+                           choose_replica, replica_reads, side_effect_writes)
+from core.tasks import claim, execute, run_worker, task
+from posts.models import Post
+from posts.sharding import ShardRouter
+
+User = get_user_model()
+
+calls = []
+
+
+@task
+def remember(value):
+    calls.append(value)
+
+
+@task(max_attempts=2)
+def explode():
+    raise RuntimeError('boom')
+
+
+class MarkPosts(Backfill):
+    name = 'test_mark_posts'
+    model = 'posts.Post'
+    batch_size = 2
+    rate = 0
+    fail_after = None
+
+    def queryset(self, queryset):
+        return queryset.exclude(text__startswith='~')
+
+    def process(self, queryset):
+        if MarkPosts.fail_after is not None:
+            if not MarkPosts.fail_after:
+                raise RuntimeError('boom')
+            MarkPosts.fail_after -= 1
+        for post in queryset:
+            queryset.filter(pk=post.pk).update(text='~' + post.text)
 
 
 class ViewTestClass(TestCase):
@@ -7,3 +81,547 @@ class ViewTestClass(TestCase):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class TaskQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_priority_and_delay(self):
+        """Higher priority goes first, delayed tasks wait."""
+        low = remember.delay('low')
+        high = remember.delay('high', priority=10)
+        remember.schedule(60, 'later')
+        self.assertEqual(claim(10), [high.id, low.id])
+
+    def test_retry_then_fail(self):
+        """A failing task is retried with backoff, then marked failed."""
+        task_row = explode.delay()
+        claim(1)
+        with self.assertLogs('core.tasks', 'WARNING'):
+            self.assertEqual(execute(task_row.id), Task.QUEUED)
+        task_row.refresh_from_db()
+        self.assertGreater(task_row.run_at, timezone.now())
+        self.assertIn('boom', task_row.last_error)
+        Task.objects.filter(pk=task_row.pk).update(run_at=timezone.now())
+        claim(1)
+        with self.assertLogs('core.tasks', 'WARNING'):
+            self.assertEqual(execute(task_row.id), Task.FAILED)
+        task_row.refresh_from_db()
+        self.assertEqual(task_row.attempts, 2)
+        self.assertIsNotNone(task_row.duration)
+
+
+class TaskWorkerTests(TransactionTestCase):
+    def test_worker_runs_queued_tasks(self):
+        calls.clear()
+        for value in range(5):
+            remember.delay(value)
+        self.assertEqual(run_worker(workers=2, once=True), 5)
+        self.assertEqual(sorted(calls), list(range(5)))
+        self.assertEqual(Task.objects.filter(status=Task.DONE).count(), 5)
+
+
+@override_settings(
+    EMAIL_BACKEND='core.mail.OutboxBackend',
+    OUTBOX_EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+)
+class OutboxTests(TestCase):
+    def setUp(self):
+        User.objects.create_user(username='TestUser',
+                                 email='user@example.com',
+                                 password='test-pass-123')
+
+    def test_password_reset_only_queues(self):
+        """The reset form returns once the message is in the outbox."""
+        response = self.client.post(reverse('password_reset'),
+                                    {'email': 'user@example.com'})
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(OutboxMessage.objects.count(), 1)
+        self.assertTrue(Task.objects.filter(
+            name='core.mail.send_outbox').exists())
+
+    def test_messages_and_task_are_queued_together(self):
+        """If the task cannot be queued, no message is left behind."""
+        with mock.patch('core.mail.send_outbox.delay',
+                        side_effect=OperationalError('locked')):
+            with self.assertRaises(OperationalError):
+                send_mail('Тема', 'Текст', 'from@example.com',
+                          ['a@example.com'])
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    def test_batch_delivery_with_retry(self):
+        send_mail('Тема', 'Текст', 'from@example.com', ['a@example.com'])
+        send_mail('Тема', 'Текст', 'from@example.com', ['b@example.com'])
+        path = 'django.core.mail.backends.locmem.EmailBackend.send_messages'
+        with mock.patch(path, side_effect=[OSError('down'), 1]):
+            self.assertEqual(deliver_pending(), 2)
+        retried = OutboxMessage.objects.get(status=OutboxMessage.QUEUED)
+        self.assertEqual(retried.attempts, 1)
+        self.assertEqual(
+            OutboxMessage.objects.filter(status=OutboxMessage.SENT).count(),
+            1)
+        OutboxMessage.objects.update(next_attempt=timezone.now())
+        self.assertEqual(deliver_pending(), 1)
+        self.assertEqual(mail.outbox[0].to, ['a@example.com'])
+
+
+@override_settings(RATELIMITS={'add_comment': '2/m'})
+class RateLimitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='TestUser')
+        self.post = Post.objects.create(author=self.user, text='Пост')
+        self.client.force_login(self.user)
+
+    def test_limit_returns_429(self):
+        url = reverse('posts:add_comment', kwargs={'post_id': self.post.id})
+        for _ in range(2):
+            response = self.client.post(url, {'text': 'Комментарий'})
+            self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        response = self.client.post(url, {'text': 'Комментарий'})
+        self.assertEqual(response.status_code, HTTPStatus.TOO_MANY_REQUESTS)
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertEqual(stats()['add_comment'],
+                         {'allowed': 2, 'blocked': 1})
+
+    def test_previous_window_is_weighted(self):
+        """Half of the previous window still counts halfway through."""
+        with mock.patch('core.ratelimit.time.time', return_value=90):
+            for _ in range(4):
+                hit('test', 'key', 4, 60)
+        with mock.patch('core.ratelimit.time.time', return_value=150):
+            self.assertEqual(hit('test', 'key', 4, 60), 0)
+            self.assertEqual(hit('test', 'key', 4, 60), 0)
+            self.assertGreater(hit('test', 'key', 4, 60), 0)
+
+
+STATIC_SOURCE = tempfile.mkdtemp()
+STATIC_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(STATICFILES_DIRS=[STATIC_SOURCE], STATIC_ROOT=STATIC_ROOT)
+class CompressedStaticTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with open(os.path.join(STATIC_SOURCE, 'site.css'), 'w') as css:
+            css.write('body { color: red; }\n' * 100)
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(STATIC_SOURCE, ignore_errors=True)
+        shutil.rmtree(STATIC_ROOT, ignore_errors=True)
+
+    def test_hashed_files_are_precompressed(self):
+        hashed = staticfiles_storage.stored_name('site.css')
+        self.assertNotEqual(hashed, 'site.css')
+        for suffix in ('.gz', '.br'):
+            self.assertTrue(
+                os.path.exists(staticfiles_storage.path(hashed) + suffix))
+
+    def test_middleware_serves_brotli_immutable(self):
+        url = '/static/' + staticfiles_storage.stored_name('site.css')
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertIn('immutable', response['Cache-Control'])
+        body = b''.join(response.streaming_content)
+        self.assertEqual(brotli.decompress(body).decode(),
+                         'body { color: red; }\n' * 100)
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertNotIn('Content-Encoding', response)
+
+    def test_not_modified_keeps_cache_headers(self):
+        url = '/static/' + staticfiles_storage.stored_name('site.css')
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='br')
+        etag = response['ETag']
+        for headers in ({'HTTP_IF_NONE_MATCH': etag},
+                        {'HTTP_IF_MODIFIED_SINCE': response['Last-Modified']}):
+            cached = self.client.get(url, HTTP_ACCEPT_ENCODING='br',
+                                     **headers)
+            self.assertEqual(cached.status_code, 304)
+            self.assertEqual(cached['ETag'], etag)
+            self.assertIn('immutable', cached['Cache-Control'])
+            self.assertEqual(cached['Vary'], 'Accept-Encoding')
+        # Без br отдаётся другая копия — старый ETag к ней не подходит
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_new_collectstatic_is_picked_up(self):
+        url = '/static/' + staticfiles_storage.stored_name('site.css')
+        self.assertEqual(self.client.get(url).status_code, 200)
+        with open(os.path.join(STATIC_SOURCE, 'late.js'), 'w') as script:
+            script.write('console.log("late");\n' * 100)
+        call_command('collectstatic', interactive=False, verbosity=0)
+        url = '/static/' + staticfiles_storage.stored_name('late.js')
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='br')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertIn('immutable', response['Cache-Control'])
+
+
+class CompressionTests(TestCase):
+    body = b'<p>' + b'Lorem ipsum dolor sit amet. ' * 100 + b'</p>'
+
+    def run_middleware(self, response, encoding='gzip, br', csrf=False):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING=encoding)
+        if csrf:
+            request.META['CSRF_COOKIE_USED'] = True
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_brotli_preferred_and_small_skipped(self):
+        response = self.run_middleware(HttpResponse(self.body))
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.content), self.body)
+        self.assertIn('Accept-Encoding', response['Vary'])
+        small = self.run_middleware(HttpResponse(b'<p>ok</p>'))
+        self.assertFalse(small.has_header('Content-Encoding'))
+
+    def test_streaming_gzip(self):
+        response = self.run_middleware(
+            StreamingHttpResponse(iter([self.body, self.body])), 'gzip')
+        data = b''.join(response.streaming_content)
+        self.assertEqual(gzip.decompress(data), self.body * 2)
+
+    def test_csrf_pages_are_not_compressed(self):
+        for response in (HttpResponse(self.body),
+                         HttpResponse(self.body,
+                                      content_type='application/json')):
+            response = self.run_middleware(response, 'gzip', csrf=True)
+            self.assertFalse(response.has_header('Content-Encoding'))
+            self.assertEqual(response.content, self.body)
+
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class MediaServingTests(TestCase):
+    data = bytes(range(256)) * 4
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        os.makedirs(os.path.join(MEDIA_ROOT, 'posts'), exist_ok=True)
+        with open(os.path.join(MEDIA_ROOT, 'posts', 'file.png'), 'wb') as f:
+            f.write(cls.data)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    url = '/media/posts/file.png'
+
+    def test_full_file_and_etag(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertEqual(response['Content-Length'], str(len(self.data)))
+        self.assertEqual(b''.join(response.streaming_content), self.data)
+        response = self.client.get(self.url,
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_byte_ranges(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, HTTPStatus.PARTIAL_CONTENT)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/1024')
+        self.assertEqual(b''.join(response.streaming_content),
+                         self.data[10:20])
+        response = self.client.get(self.url, HTTP_RANGE='bytes=2000-')
+        self.assertEqual(response.status_code,
+                         HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9',
+                                   HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(parse_range('bytes=-24', 1024), (1000, 1023))
+        self.assertIsNone(parse_range('bytes=0-1,5-6', 1024))
+
+    def test_outside_media_root(self):
+        response = self.client.get('/media/%2E%2E/settings.py')
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_accel_redirect(self):
+        with mock.patch('core.media.MEDIA_SENDFILE', 'x-accel-redirect'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'],
+                         '/protected-media/posts/file.png')
+        self.assertEqual(response.content, b'')
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(TestCase):
+    def make_pool(self, **options):
+        return pool.ConnectionPool(**dict(pool.POOL_DEFAULTS, **options))
+
+    def test_bounded_with_wait_metrics(self):
+        """Over size, a checkout waits for a release or times out."""
+        connections_pool = self.make_pool(size=1, timeout=0.05)
+        first = connections_pool.acquire(FakeConnection, None)
+        with self.assertRaises(OperationalError):
+            connections_pool.acquire(FakeConnection, None)
+        threading.Timer(0.1, connections_pool.release, (first,)).start()
+        connections_pool.timeout = 5
+        self.assertIs(connections_pool.acquire(FakeConnection, None), first)
+        stats = connections_pool.stats()
+        self.assertEqual(stats['created'], 1)
+        self.assertEqual(stats['checkouts'], 2)
+        self.assertEqual(stats['timeouts'], 1)
+        self.assertGreaterEqual(stats['wait_max'], 0.05)
+
+    def test_health_check_and_max_lifetime(self):
+        connections_pool = self.make_pool(size=1, check_after=0)
+        dead = connections_pool.acquire(FakeConnection, None)
+        connections_pool.release(dead)
+
+        def check(connection):
+            raise OperationalError('gone')
+
+        fresh = connections_pool.acquire(FakeConnection, check)
+        self.assertIsNot(fresh, dead)
+        self.assertTrue(dead.closed)
+        self.assertEqual(connections_pool.stats()['failed_checks'], 1)
+        connections_pool.max_lifetime = 0
+        time.sleep(0.01)
+        connections_pool.release(fresh)
+        self.assertTrue(fresh.closed)
+        self.assertEqual(connections_pool.stats()['open'], 0)
+
+    def test_backend_returns_connections_to_pool(self):
+        """close() parks the raw connection; the next open reuses it as is.
+
+        PRAGMAs run only for new connections, so a changed value survives.
+        """
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        settings_dict = dict(connection.settings_dict,
+                             NAME=os.path.join(directory, 'pool.sqlite3'),
+                             OPTIONS={'pool': {'size': 2}})
+        self.addCleanup(pool._pools.pop, ('pooled', settings_dict['NAME']))
+        first = DatabaseWrapper(settings_dict, alias='pooled')
+        first.ensure_connection()
+        raw = first.connection
+        raw.execute('PRAGMA cache_size = 123')
+        first.close()
+        second = DatabaseWrapper(settings_dict, alias='pooled')
+        with second.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA cache_size')
+            self.assertEqual(cursor.fetchone()[0], 123)
+        self.assertIs(second.connection, raw)
+        second.close()
+        self.assertEqual(pool.stats()['pooled']['idle'], 1)
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(reverse('db_pool_stats'))
+        self.assertEqual(response.json()['pooled']['created'], 1)
+        first.pool.close_idle()
+        self.assertEqual(first.pool.stats()['open'], 0)
+
+
+class SQLiteBackendTests(TestCase):
+    def test_pragmas_applied(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 20000)
+
+    def test_maintenance_command(self):
+        out = StringIO()
+        call_command('sqlite_maintenance', stdout=out)
+        self.assertIn('WAL', out.getvalue())
+
+    def test_only_immediate_blocks_take_the_write_lock(self):
+        """A reading atomic() leaves the database to other writers."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        databases = {'locking': dict(
+            connection.settings_dict,
+            NAME=os.path.join(directory, 'locking.sqlite3'),
+            OPTIONS={'pragmas': {'busy_timeout': 0}})}
+        with mock.patch.dict(connections.databases, databases):
+            self.addCleanup(delattr, connections._connections, 'locking')
+            self.addCleanup(connections['locking'].close)
+            with connections['locking'].cursor() as cursor:
+                cursor.execute('CREATE TABLE counter (value integer)')
+            other = DatabaseWrapper(databases['locking'], alias='other')
+            self.addCleanup(other.close)
+
+            def write():
+                with other.cursor() as cursor:
+                    cursor.execute('INSERT INTO counter VALUES (1)')
+            with transaction.atomic(using='locking'):
+                with connections['locking'].cursor() as cursor:
+                    cursor.execute('SELECT count(*) FROM counter')
+                write()
+            with immediate(using='locking'):
+                with self.assertRaisesMessage(OperationalError, 'locked'):
+                    write()
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaRouterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.router = PrimaryReplicaRouter()
+        self.request = RequestFactory().get('/')
+
+    def read_db(self, request):
+        @replica_reads
+        def view(request):
+            return self.router.db_for_read(Post)
+        with mock.patch('core.replicas.replica_is_healthy',
+                        return_value=True):
+            return view(request)
+
+    def test_reads_go_to_replica_unless_pinned(self):
+        self.assertEqual(self.read_db(self.request), 'replica1')
+        self.request.COOKIES[PIN_COOKIE] = '1'
+        self.assertEqual(self.read_db(self.request), 'default')
+
+    def test_replica_choice_ends_with_the_view(self):
+        self.assertEqual(self.read_db(self.request), 'replica1')
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_write_pins_client(self):
+        def view(request):
+            self.router.db_for_write(Post)
+            return HttpResponse()
+        response = ReplicaMiddleware(view)(self.request)
+        self.assertIn(PIN_COOKIE, response.cookies)
+        response = ReplicaMiddleware(lambda request: HttpResponse())(
+            self.request)
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_side_effect_writes_do_not_pin(self):
+        def view(request):
+            with side_effect_writes():
+                self.router.db_for_write(Post)
+            self.router.db_for_write(django_apps.get_model('sessions',
+                                                           'Session'))
+            return HttpResponse()
+        response = ReplicaMiddleware(view)(self.request)
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_login_does_not_pin(self):
+        user = User.objects.create_user(username='pinless', password='pw')
+        response = self.client.post(reverse('users:login'), {
+            'username': 'pinless', 'password': 'pw'})
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        user.refresh_from_db()
+        self.assertIsNotNone(user.last_login)
+
+    def test_sharded_write_pins_client(self):
+        def view(request):
+            with mock.patch('posts.sharding.is_sharded', return_value=True):
+                alias = ShardRouter().db_for_write(
+                    Post, instance=Post(author_id=1))
+            self.assertIsNotNone(alias)
+            return HttpResponse()
+        response = ReplicaMiddleware(view)(self.request)
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+    def test_unhealthy_replica_falls_back(self):
+        with mock.patch.dict(connections.databases,
+                             replica1={'NAME': '/nonexistent/dir/db',
+                                       'ENGINE': 'core.db.sqlite3'}):
+            self.assertIsNone(choose_replica())
+        self.assertTrue(cache.get('replica:down:replica1'))
+
+
+class BackfillTests(TestCase):
+    def setUp(self):
+        MarkPosts.fail_after = None
+        user = User.objects.create_user(username='author')
+        self.posts = [Post.objects.create(author=user, text=f'Пост {number}')
+                      for number in range(5)]
+
+    def texts(self):
+        return list(Post.objects.order_by('pk').values_list('text',
+                                                            flat=True))
+
+    def test_resumes_after_failure(self):
+        """A failed batch is rolled back; the next run continues from it."""
+        MarkPosts.fail_after = 1
+        with self.assertRaises(RuntimeError):
+            run(MarkPosts())
+        self.assertEqual(self.texts(), ['~Пост 0', '~Пост 1', 'Пост 2',
+                                        'Пост 3', 'Пост 4'])
+        progress = BackfillProgress.objects.get(name='test_mark_posts')
+        self.assertEqual(progress.last_pk, str(self.posts[1].pk))
+        MarkPosts.fail_after = None
+        reports = []
+        status = run(MarkPosts(), report=reports.append)
+        self.assertEqual(status.processed, 5)
+        self.assertEqual([report.processed for report in reports], [4, 5])
+        self.assertEqual(reports[0].total, 5)
+        self.assertTrue(all(text.startswith('~') for text in self.texts()))
+        self.assertIsNotNone(
+            BackfillProgress.objects.get(name='test_mark_posts').finished)
+
+    def test_throttle(self):
+        with mock.patch('core.backfill.time.sleep') as sleep:
+            run(MarkPosts(), rate=10)
+        self.assertEqual(sleep.call_count, 3)
+        self.assertAlmostEqual(sleep.call_args_list[0][0][0], 0.2, 1)
+
+    def test_command_and_migration_operation(self):
+        out = StringIO()
+        call_command('backfill', 'test_mark_posts', stdout=out)
+        self.assertIn('Готово: 5', out.getvalue())
+        self.assertIn('осталось', out.getvalue())
+        call_command('backfill', stdout=out)
+        self.assertIn('post_image_placeholders', out.getvalue())
+        operation = RunBackfill('test_mark_posts')
+        editor = SimpleNamespace(connection=connection)
+        operation.backwards(None, editor)
+        self.assertFalse(BackfillProgress.objects.filter(
+            name='test_mark_posts').exists())
+        Post.objects.update(text='снова')
+        operation.forwards(django_apps, editor)
+        self.assertEqual(set(self.texts()), {'~снова'})
+
+
+class PreloadTests(TestCase):
+    def test_warm_up(self):
+        """Apps, templates and urls are loaded; warm urls are requested."""
+        with override_settings(PRELOAD_URLS=['/about/author/']), \
+                mock.patch('core.preload.get') as get:
+            stats = preload.warm_up(application=mock.sentinel.app)
+        get.assert_called_once_with(mock.sentinel.app, '/about/author/')
+        self.assertIn('posts.views', preload.import_modules())
+        self.assertNotIn('posts.tests', preload.import_modules())
+        self.assertIn('posts/index.html', preload.compile_templates())
+        self.assertGreater(stats['templates'], 0)
+        self.assertGreater(stats['urls'], 10)
+
+    def test_get_reports_first_byte(self):
+        status, first_byte = preload.get(WSGIHandler(), '/about/author/')
+        self.assertEqual(status, 200)
+        self.assertIsInstance(first_byte, float)
+
+    def test_freeze(self):
+        """Everything is moved to the permanent generation, gc re-enabled."""
+        self.addCleanup(gc.unfreeze)
+        gc.disable()
+        with mock.patch('core.preload.connections') as connections:
+            preload.freeze()
+        connections.close_all.assert_called_once_with()
+        self.assertGreater(gc.get_freeze_count(), 0)
+        self.assertTrue(gc.isenabled())
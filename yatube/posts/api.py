@@ -0,0 +1,138 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+
+from core.context_processors.paginator import NUMB_POSTS, keyset_paginator
+from core.replicas import replica_reads
+from . import sharding
+from .models import Group
+from .views import (index_post_list, group_post_list, profile_post_list,
+                    follow_post_list)
+
+User = get_user_model()
+
+API_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+}
+# В шардах нет пользователей и групп: вместо JOIN берутся id, а имена
+# подставляет with_names отдельными запросами к default
+SHARDED_FIELDS = {'author': 'author_id', 'group': 'group_id'}
+# Поля, по которым идёт курсор, выбираются всегда
+CURSOR_FIELDS = ('-pub_date', '-id')
+MAX_LIMIT = 100
+
+
+def selected_fields(request):
+    """Поля из ?fields=..., неизвестные имена отбрасываются."""
+    requested = request.GET.get('fields')
+    if not requested:
+        return list(API_FIELDS)
+    fields = [name for name in requested.split(',') if name in API_FIELDS]
+    return fields or list(API_FIELDS)
+
+
+def page_limit(request):
+    try:
+        limit = int(request.GET.get('limit', NUMB_POSTS))
+    except ValueError:
+        return NUMB_POSTS
+    return min(max(limit, 1), MAX_LIMIT)
+
+
+def rows(queryset, fields):
+    """values()-строки вместо экземпляров модели."""
+    expressions = {name: API_FIELDS[name] for name in fields}
+    if sharding.is_sharded():
+        expressions.update({name: SHARDED_FIELDS[name] for name in fields
+                            if name in SHARDED_FIELDS})
+    extra = [f.lstrip('-') for f in CURSOR_FIELDS if f.lstrip('-') not in
+             expressions.values()]
+    queryset = queryset.prefetch_related(None)
+    return queryset.values(*expressions.values(), *extra)
+
+
+def with_names(rows):
+    """Дописывает в строки из шардов имя автора и slug группы."""
+    if not sharding.is_sharded():
+        return rows
+    authors = dict(User.objects.filter(
+        pk__in={row['author_id'] for row in rows if 'author_id' in row}
+    ).values_list('id', 'username'))
+    groups = dict(Group.objects.filter(
+        pk__in={row['group_id'] for row in rows if 'group_id' in row}
+    ).values_list('id', 'slug'))
+    for row in rows:
+        if 'author_id' in row:
+            row['author__username'] = authors.get(row['author_id'])
+        if 'group_id' in row:
+            row['group__slug'] = groups.get(row['group_id'])
+    return rows
+
+
+def serialize(row, fields):
+    item = {name: row[API_FIELDS[name]] for name in fields}
+    if item.get('image'):
+        item['image'] = default_storage.url(item['image'])
+    elif 'image' in item:
+        item['image'] = None
+    return item
+
+
+def stream_page(page, fields):
+    yield '{"results":['
+    for number, row in enumerate(with_names(list(page))):
+        if number:
+            yield ','
+        yield json.dumps(serialize(row, fields), cls=DjangoJSONEncoder)
+    yield '],"next":' + json.dumps(page.next_cursor) + '}'
+
+
+def feed_response(request, queryset):
+    fields = selected_fields(request)
+    page = keyset_paginator(rows(queryset, fields),
+                            request.GET.get('cursor'),
+                            per_page=page_limit(request),
+                            ordering=CURSOR_FIELDS)
+    return StreamingHttpResponse(stream_page(page, fields),
+                                 content_type='application/json')
+
+
+@replica_reads
+def index(request):
+    return feed_response(request, index_post_list())
+
+
+@replica_reads
+def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return feed_response(request, group_post_list(group))
+
+
+@replica_reads
+def profile(request, username):
+    author = get_object_or_404(User, username=username)
+    return feed_response(request, profile_post_list(author))
+
+
+@replica_reads
+def follow_index(request):
+    if not request.user.is_authenticated:
+        return JsonResponse({'detail': 'Требуется авторизация.'}, status=401)
+    return feed_response(request, follow_post_list(request.user))
+
+
+@replica_reads
+def post_detail(request, post_id):
+    fields = selected_fields(request)
+    row = get_object_or_404(rows(sharding.post_queryset(post_id), fields),
+                            id=post_id)
+    return JsonResponse(serialize(with_names([row])[0], fields))
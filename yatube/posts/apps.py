@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        from . import (follow_graph, fragments,  # noqa: F401
+                       placeholders, previews, sharding, trending)
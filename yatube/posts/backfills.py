@@ -0,0 +1,68 @@
+"""Заполнения данных постов, см. core.backfill."""
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core.backfill import Backfill
+
+from .placeholders import placeholder
+from .previews import make_preview
+
+
+class ImagePlaceholders(Backfill):
+    """LQIP для постов, загруженных до появления image_placeholder."""
+    name = 'post_image_placeholders'
+    model = 'posts.Post'
+    batch_size = 100
+    # Каждая строка — чтение и сжатие картинки
+    rate = 200
+
+    def queryset(self, queryset):
+        return queryset.exclude(image='').filter(image_placeholder='')
+
+    def process(self, queryset):
+        posts = list(queryset.only('id', 'image'))
+        for post in posts:
+            post.image_placeholder = placeholder(post.image)
+        queryset.bulk_update(posts, ['image_placeholder'])
+
+
+class PostPreviews(Backfill):
+    """Превью текста для постов, сохранённых до появления Post.preview."""
+    name = 'post_previews'
+    model = 'posts.Post'
+
+    def queryset(self, queryset):
+        return queryset.filter(preview='').exclude(text='')
+
+    def process(self, queryset):
+        posts = list(queryset.only('id', 'text'))
+        for post in posts:
+            post.preview, post.preview_truncated = make_preview(post.text)
+        queryset.bulk_update(posts, ['preview', 'preview_truncated'])
+
+
+class PostShardDirectory(Backfill):
+    """Записи справочника PostShard для постов, сохранённых без него.
+
+    Посты, созданные до включения шардов, лежат там, где их проходят
+    (using), и занимают свои id: справочник выдаёт новые после них.
+    """
+    name = 'post_shard_directory'
+    model = 'posts.Post'
+    rate = None
+
+    def process(self, queryset):
+        post_shard = self.apps.get_model('posts', 'PostShard')
+        post_shard.objects.using(DEFAULT_DB_ALIAS).bulk_create(
+            [post_shard(id=post_id, shard=self.using)
+             for post_id in queryset.values_list('id', flat=True)],
+            ignore_conflicts=True)
+
+    def finish(self):
+        # SQLite с AUTOINCREMENT сдвигает счётчик сам, другим базам — так
+        connection = connections[DEFAULT_DB_ALIAS]
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [self.apps.get_model('posts', 'PostShard')])
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
@@ -0,0 +1,166 @@
+"""Граф подписок с кэшированными списками смежности.
+
+Для каждого пользователя в кэше лежат два отсортированных массива id:
+на кого он подписан и кто подписан на него. Подписка и отписка меняют
+эти массивы точечно, без сброса и полной перезагрузки.
+
+Подписка меняет рекомендации самого пользователя и его подписчиков:
+свою строку запрос помечает устаревшей сразу, строки подписчиков —
+фоновая задача mark_followers_stale.
+"""
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.tasks import task
+from . import trending
+from .models import Follow, FollowSuggestion
+
+FOLLOW_GRAPH_TIMEOUT = getattr(settings, 'FOLLOW_GRAPH_TIMEOUT', 60 * 60)
+# Сколько секунд массивы живут в кэше
+LOCK_TIMEOUT = 5
+STALE_BATCH_SIZE = 500
+FOLLOWING = 'following'
+FOLLOWERS = 'followers'
+_COLUMNS = {
+    # направление: (колонка-ключ, колонка-значение)
+    FOLLOWING: ('user_id', 'author_id'),
+    FOLLOWERS: ('author_id', 'user_id'),
+}
+
+
+def _key(direction, user_id):
+    return f'follow_graph:{direction}:{user_id}'
+
+
+def _load(direction, user_id):
+    key_column, value_column = _COLUMNS[direction]
+    ids = (Follow.objects.filter(**{key_column: user_id})
+           .order_by(value_column)
+           .values_list(value_column, flat=True))
+    return array('q', ids)
+
+
+def _get(direction, user_id):
+    raw = cache.get(_key(direction, user_id))
+    if raw is not None:
+        return array('q', raw)
+    ids = _load(direction, user_id)
+    cache.set(_key(direction, user_id), ids.tobytes(), FOLLOW_GRAPH_TIMEOUT)
+    return ids
+
+
+def _contains(ids, value):
+    position = bisect_left(ids, value)
+    return position < len(ids) and ids[position] == value
+
+
+def _update(direction, user_id, value, add):
+    """Точечно правит массив, если он уже есть в кэше.
+
+    Чтение и запись идут под коротким замком cache.add. Кто замок не
+    получил, сбрасывает массив (его перечитают из базы) и ставит пометку
+    dirty: по ней держатель замка сбросит массив и после своей записи.
+    """
+    key = _key(direction, user_id)
+    if not cache.add(f'{key}:lock', True, LOCK_TIMEOUT):
+        cache.set(f'{key}:dirty', True, LOCK_TIMEOUT)
+        cache.delete(key)
+        return
+    try:
+        raw = cache.get(key)
+        if raw is None:
+            return
+        ids = array('q', raw)
+        position = bisect_left(ids, value)
+        present = position < len(ids) and ids[position] == value
+        if add and not present:
+            ids.insert(position, value)
+        elif not add and present:
+            del ids[position]
+        else:
+            return
+        cache.set(key, ids.tobytes(), FOLLOW_GRAPH_TIMEOUT)
+        if cache.get(f'{key}:dirty'):
+            cache.delete_many([key, f'{key}:dirty'])
+    finally:
+        cache.delete(f'{key}:lock')
+
+
+def _mark_stale(user_ids):
+    """Рекомендации user_ids нужно пересчитать."""
+    # Строки ещё может не быть, например после первой подписки
+    FollowSuggestion.objects.bulk_create(
+        [FollowSuggestion(user_id=user_id, stale=True)
+         for user_id in user_ids],
+        ignore_conflicts=True,
+    )
+    FollowSuggestion.objects.filter(user_id__in=user_ids).update(stale=True)
+
+
+@task(priority=1)
+def mark_followers_stale(user_id):
+    """Помечает рекомендации подписчиков user_id пачками."""
+    ids = followers(user_id)
+    for start in range(0, len(ids), STALE_BATCH_SIZE):
+        _mark_stale(ids[start:start + STALE_BATCH_SIZE].tolist())
+
+
+def _apply(user_id, author_id, add):
+    _update(FOLLOWING, user_id, author_id, add)
+    _update(FOLLOWERS, author_id, user_id, add)
+    _mark_stale([user_id])
+    # Подписчиков у автора может быть много: не в запросе
+    mark_followers_stale.delay(user_id)
+    if add:
+        trending.record_follow(author_id)
+
+
+def following(user_id):
+    """Отсортированные id авторов, на которых подписан пользователь."""
+    return _get(FOLLOWING, user_id)
+
+
+def followers(author_id):
+    """Отсортированные id подписчиков автора."""
+    return _get(FOLLOWERS, author_id)
+
+
+def is_following(user_id, author_id):
+    return _contains(following(user_id), author_id)
+
+
+def following_among(user_id, author_ids):
+    """Подмножество author_ids, на которых подписан пользователь."""
+    ids = following(user_id)
+    return {author_id for author_id in author_ids
+            if _contains(ids, author_id)}
+
+
+def follow(user_id, author_id):
+    """Идемпотентная подписка; кэш и тренды правит post_save новой строки.
+
+    Повторный клик или гонка двух запросов строку не создают, поэтому
+    второй раз ни массивы, ни тренды не трогаются.
+    """
+    Follow.objects.get_or_create(user_id=user_id, author_id=author_id)
+
+
+def unfollow(user_id, author_id):
+    """Идемпотентная отписка одним DELETE, кэш правит post_delete."""
+    Follow.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        _apply(instance.user_id, instance.author_id, add=True)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    _apply(instance.user_id, instance.author_id, add=False)
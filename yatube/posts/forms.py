@@ -1,8 +1,43 @@
 from django import forms
-from .models import Post, Comment
+from django.core.exceptions import ValidationError
+from .models import Post, Comment, ImageUpload
+from .uploads import as_file
 
 
 class PostForm(forms.ModelForm):
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.user = user
+        self.upload = None
+
+    def clean(self):
+        cleaned_data = super().clean()
+        # id картинки, загруженной кусками через posts:upload_start
+        upload_id = self.data.get('upload')
+        if upload_id and 'image' not in self.files:
+            self.attach_upload(upload_id, cleaned_data)
+        return cleaned_data
+
+    def attach_upload(self, upload_id, cleaned_data):
+        try:
+            self.upload = ImageUpload.objects.filter(
+                pk=upload_id, user=self.user, complete=True).first()
+        except ValidationError:
+            self.upload = None
+        if self.upload is None:
+            self.add_error('image', 'Загрузка картинки не завершена')
+            return
+        image = as_file(self.upload)
+        try:
+            cleaned_data['image'] = self.fields['image'].clean(image)
+        except ValidationError as error:
+            self.upload = None
+            self.add_error('image', error)
+        finally:
+            # Форма может не пройти проверку; для сохранения файл откроется
+            # заново, см. UploadedPart.open
+            image.close()
+
     class Meta:
         model = Post
         fields = ['text', 'group', 'image']
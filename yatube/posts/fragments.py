@@ -0,0 +1,79 @@
+"""Персональные фрагменты страниц постов, см. core.fragments."""
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from django.template.loader import render_to_string
+
+from core.fragments import fragment, invalidate_pages
+from . import follow_graph, sharding, suggestions
+from .forms import CommentForm
+from .models import Comment, Group, Post
+
+User = get_user_model()
+
+
+@fragment('switcher', tab=str)
+def switcher(request, tab=''):
+    return render_to_string('includes/switcher.html', {'tab': tab}, request)
+
+
+@fragment('post_tools', post=int)
+def post_tools(request, post):
+    """Кнопка автора и форма комментария."""
+    post = (sharding.post_queryset(post).filter(pk=post)
+            .only('id', 'author_id').first())
+    if post is None:
+        return ''
+    context = {
+        'post': post,
+        'form': CommentForm(request.POST or None),
+    }
+    return render_to_string('includes/post_tools.html', context, request)
+
+
+@fragment('profile_tools', author=int, username=str)
+def profile_tools(request, author, username):
+    """Кнопка подписки и рекомендации авторов для страницы профиля."""
+    user = request.user
+    context = {
+        'author_id': author,
+        'username': username,
+        'following': (user.is_authenticated
+                      and follow_graph.is_following(user.id, author)),
+        'suggestions': (user.is_authenticated
+                        and suggestions.suggested_authors(user)),
+    }
+    return render_to_string('includes/profile_tools.html', context, request)
+
+
+@receiver(post_init, sender=Post)
+def remember_group(sender, instance, **kwargs):
+    # После смены группы устаревает и лента прежней
+    instance._saved_group_id = instance.__dict__.get('group_id')
+
+
+@receiver((post_save, post_delete), sender=Post)
+def post_changed(sender, instance, **kwargs):
+    """Пост виден на своей странице, в общих лентах, у автора и в группе."""
+    scopes = ['index', 'trending', f'post:{instance.pk}']
+    username = User.objects.filter(
+        pk=instance.__dict__.get('author_id')).values_list(
+            'username', flat=True).first()
+    if username is not None:
+        scopes.append(f'author:{username}')
+    group_ids = {instance.__dict__.get('group_id'), instance._saved_group_id}
+    scopes += [f'group:{slug}' for slug in Group.objects.filter(
+        pk__in=group_ids - {None}).values_list('slug', flat=True)]
+    invalidate_pages(*scopes)
+    instance._saved_group_id = instance.__dict__.get('group_id')
+
+
+@receiver((post_save, post_delete), sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    invalidate_pages(f'post:{instance.__dict__.get("post_id")}')
+
+
+@receiver((post_save, post_delete), sender=Group)
+def group_changed(sender, **kwargs):
+    """Название и адрес группы выводятся в постах любых лент."""
+    invalidate_pages()
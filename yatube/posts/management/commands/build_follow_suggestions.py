@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from posts import suggestions
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает рекомендации «на кого подписаться».'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--stale', action='store_true',
+            help='Только пользователи, чьи подписки изменились.',
+        )
+        parser.add_argument(
+            '--top', type=int, default=suggestions.SUGGESTIONS_STORED,
+            help='Сколько кандидатов хранить на пользователя.',
+        )
+
+    def handle(self, *args, **options):
+        count = suggestions.refresh(stale_only=options['stale'],
+                                    top=options['top'])
+        self.stdout.write(f'Рекомендации обновлены: {count}')
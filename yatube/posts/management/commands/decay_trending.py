@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from posts import trending
+
+
+class Command(BaseCommand):
+    help = 'Применяет затухание к очкам трендов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--elapsed', type=int, default=None,
+            help='Сколько секунд затухать; по умолчанию — сколько прошло '
+                 'с прошлого затухания.',
+        )
+
+    def handle(self, *args, **options):
+        factor = trending.decay(options['elapsed'])
+        self.stdout.write(f'Очки умножены на {factor:.4f}')
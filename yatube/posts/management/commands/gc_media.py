@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from posts import media_gc
+
+
+class Command(BaseCommand):
+    help = 'Удаляет картинки без постов и миниатюры без исходников.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что было бы удалено.',
+        )
+        parser.add_argument(
+            '--min-age', type=int, default=media_gc.GC_MIN_AGE,
+            help='Не трогать файлы моложе стольких секунд.',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=media_gc.GC_WORKERS,
+            help='Потоков для обхода и удаления.',
+        )
+
+    def handle(self, *args, **options):
+        report = media_gc.collect(dry_run=options['dry_run'],
+                                  min_age=options['min_age'],
+                                  workers=options['workers'])
+        verb = 'Будет удалено' if options['dry_run'] else 'Удалено'
+        for kind, title in (('images', 'картинок'),
+                            ('thumbnails', 'миниатюр'),
+                            ('uploads', 'брошенных загрузок')):
+            count, size = report[kind]
+            self.stdout.write(f'{verb} {title}: {count} ({size} байт)')
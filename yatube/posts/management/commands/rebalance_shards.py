@@ -0,0 +1,79 @@
+from django.apps import apps
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core import backfill
+from core.fragments import invalidate_pages
+from posts import sharding
+from posts.backfills import PostShardDirectory
+from posts.models import Comment, Post, PostShard
+
+
+class Command(BaseCommand):
+    help = ('Переносит посты с комментариями в шард их автора: после '
+            'включения шардов или смены их числа (сначала manage.py '
+            'migrate --database=<шард> для каждого нового шарда).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только показать, что куда переедет.')
+
+    def handle(self, *args, **options):
+        for alias in sharding.shards():
+            # Посты, созданные без шардов, ещё не в справочнике
+            backfill.run(PostShardDirectory(apps, alias), restart=True)
+        moved = 0
+        for alias in sharding.shards():
+            authors = (Post.objects.using(alias).order_by()
+                       .values_list('author_id', flat=True).distinct())
+            for author_id in list(authors):
+                target = sharding.shard_for_author(author_id)
+                if target == alias:
+                    continue
+                post_ids = list(Post.objects.using(alias).filter(
+                    author_id=author_id).values_list('id', flat=True))
+                self.stdout.write(f'{alias} -> {target}: автор {author_id}, '
+                                  f'постов {len(post_ids)}')
+                if not options['dry_run']:
+                    self.move(post_ids, alias, target)
+                moved += len(post_ids)
+        if moved and not options['dry_run']:
+            invalidate_pages()
+        verb = 'Будет перенесено' if options['dry_run'] else 'Перенесено'
+        self.stdout.write(f'{verb} постов: {moved}')
+
+    def move(self, post_ids, source, target):
+        """Копия в target, справочник, затем удаление из source.
+
+        Прерванный перенос безопасно повторить: посты, которые справочник
+        уже числит за target, только удаляются из source.
+        """
+        pending = list(PostShard.objects.filter(pk__in=post_ids).exclude(
+            shard=target).values_list('id', flat=True))
+        if pending:
+            posts = list(Post.objects.using(source).filter(pk__in=pending))
+            comments = list(Comment.objects.using(source).filter(
+                post_id__in=pending))
+            for comment in comments:
+                # id комментариев свои в каждом шарде
+                comment.pk = None
+            with transaction.atomic(using=target):
+                # Остатки прерванного переноса
+                Comment.objects.using(target).filter(
+                    post_id__in=pending)._raw_delete(target)
+                Post.objects.using(target).filter(
+                    pk__in=pending)._raw_delete(target)
+                # raw, как loaddata: даты не заменяются текущими, а
+                # обработчики сохранения не выдают id и не считают тренды
+                for row in posts + comments:
+                    row.save_base(using=target, raw=True, force_insert=True)
+            PostShard.objects.filter(pk__in=pending).update(shard=target)
+            cache.delete_many([f'post_shard:{post_id}'
+                               for post_id in pending])
+        # Без сигналов удаления: они сняли бы id из справочника и тренды
+        with transaction.atomic(using=source):
+            Comment.objects.using(source).filter(
+                post_id__in=post_ids)._raw_delete(source)
+            Post.objects.using(source).filter(
+                pk__in=post_ids)._raw_delete(source)
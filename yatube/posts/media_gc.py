@@ -0,0 +1,132 @@
+"""Сборка мусора в MEDIA_ROOT: картинки без постов и их миниатюры.
+
+Каталоги обходятся os.scandir в пуле потоков; найденные имена пачками
+сверяются с Post, так что в памяти не бывает всех картинок сразу.
+Удаление идёт пачками: для каждой картинки-сироты sorl удаляет ключи и
+файлы её миниатюр, затем удаляется сам файл. После этого KV-хранилище
+sorl чистится его же cleanup(), а из каталога миниатюр удаляются файлы,
+которых хранилище не знает. Всё — через открытый API kvstore.
+Свежие файлы не трогаются: они могут принадлежать загрузке в процессе.
+Заодно удаляются брошенные загрузки кусками старше UPLOAD_TTL.
+"""
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+
+from . import sharding, uploads
+from .models import Post
+
+GC_WORKERS = 8
+GC_CHUNK_SIZE = 500
+# Сколько имён сверять с базой одним запросом: IN в SQLite до 999
+GC_BATCH_SIZE = 500
+# Сколько файлов удалять за раз
+GC_MIN_AGE = 60 * 60
+# Файлы моложе часа считаются ещё загружаемыми
+
+
+def _scan_dir(path):
+    files, directories = [], []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    directories.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    info = entry.stat(follow_symlinks=False)
+                    files.append((entry.path, info.st_mtime, info.st_size))
+    except FileNotFoundError:
+        pass
+    return files, directories
+
+
+def scan(directory, workers=GC_WORKERS):
+    """Все файлы под directory: (имя от MEDIA_ROOT, mtime, размер)."""
+    root = settings.MEDIA_ROOT
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {pool.submit(_scan_dir, os.path.join(root, directory))}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                files, directories = future.result()
+                pending.update(pool.submit(_scan_dir, path)
+                               for path in directories)
+                for path, mtime, size in files:
+                    name = os.path.relpath(path, root).replace(os.sep, '/')
+                    yield name, mtime, size
+
+
+def _batches(items, size):
+    items = iter(items)
+    batch = list(islice(items, size))
+    while batch:
+        yield batch
+        batch = list(islice(items, size))
+
+
+def live_images(names):
+    """Какие из names — картинки постов в каком-либо шарде."""
+    live = set()
+    for queryset in sharding.per_shard(sharding.all_posts()):
+        live.update(queryset.filter(image__in=names)
+                    .values_list('image', flat=True).iterator())
+    return live
+
+
+def orphan_images(files, chunk_size=GC_CHUNK_SIZE):
+    for batch in _batches(files, chunk_size):
+        live = live_images([name for name, _ in batch])
+        yield from ((name, size) for name, size in batch if name not in live)
+
+
+def is_referenced_thumbnail(name):
+    return default.kvstore.get(ImageFile(name, default.storage)) is not None
+
+
+def _unlink(name):
+    try:
+        os.remove(os.path.join(settings.MEDIA_ROOT, name))
+    except FileNotFoundError:
+        pass
+
+
+def _delete(orphans, pool, batch_size, with_thumbnails):
+    for batch in _batches(orphans, batch_size):
+        if with_thumbnails:
+            for name in batch:
+                default.kvstore.delete(ImageFile(name, default_storage))
+        list(pool.map(_unlink, batch))
+
+
+def collect(dry_run=False, min_age=GC_MIN_AGE, workers=GC_WORKERS,
+            chunk_size=GC_CHUNK_SIZE, batch_size=GC_BATCH_SIZE):
+    """Удаляет сирот; возвращает их число и объём по видам."""
+    cutoff = time.time() - min_age
+    upload_to = Post._meta.get_field('image').upload_to
+    images = list(orphan_images(
+        ((name, size) for name, mtime, size in scan(upload_to, workers)
+         if mtime < cutoff), chunk_size))
+    report = {'images': (len(images), sum(size for _, size in images)),
+              'uploads': uploads.discard_stale(dry_run=dry_run)}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        if not dry_run:
+            _delete([name for name, _ in images], pool, batch_size, True)
+            default.kvstore.cleanup()
+        thumbnails = [
+            (name, size) for name, mtime, size
+            in scan(thumbnail_settings.THUMBNAIL_PREFIX, workers)
+            if mtime < cutoff and not is_referenced_thumbnail(name)
+        ]
+        report['thumbnails'] = (len(thumbnails),
+                                sum(size for _, size in thumbnails))
+        if not dry_run:
+            _delete([name for name, _ in thumbnails], pool, batch_size,
+                    False)
+    return report
@@ -0,0 +1,17 @@
+from django.db import migrations
+
+from core.backfill import RunBackfill
+
+
+class Migration(migrations.Migration):
+    # Заполнение идёт пачками в своих транзакциях, см. core.backfill
+    atomic = False
+
+    dependencies = [
+        ('core', '0003_backfillprogress'),
+        ('posts', '0014_post_shards'),
+    ]
+
+    operations = [
+        RunBackfill('post_image_placeholders'),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 2.2.16 on 2026-10-19 11:30
+
+from django.db import migrations, models
+
+from core.backfill import RunBackfill
+
+
+class Migration(migrations.Migration):
+    # Превью заполняются пачками в своих транзакциях, см. core.backfill
+    atomic = False
+
+    dependencies = [
+        ('posts', '0015_backfill_image_placeholders'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='preview',
+            field=models.CharField(blank=True, editable=False, max_length=300, verbose_name='Превью текста'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='preview_truncated',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        RunBackfill('post_previews'),
+    ]
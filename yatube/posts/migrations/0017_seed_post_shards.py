@@ -0,0 +1,16 @@
+from django.db import migrations
+
+from core.backfill import RunBackfill
+
+
+class Migration(migrations.Migration):
+    # Справочник заполняется пачками в своих транзакциях, см. core.backfill
+    atomic = False
+
+    dependencies = [
+        ('posts', '0016_post_preview'),
+    ]
+
+    operations = [
+        RunBackfill('post_shard_directory'),
+    ]
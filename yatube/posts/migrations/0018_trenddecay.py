@@ -0,0 +1,20 @@
+# Generated by Django 2.2.16 on 2026-10-19 12:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_seed_post_shards'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendDecay',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('decayed', models.DateTimeField()),
+            ],
+        ),
+    ]
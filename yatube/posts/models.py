@@ -1,8 +1,25 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth import get_user_model
 User = get_user_model()
 
 
+class RoutedQuerySet(models.QuerySet):
+    """create() без using() выбирает базу роутером по самому объекту.
+
+    Обычный create() спрашивает роутер без экземпляра, и шард автора
+    поста (posts.sharding) остался бы неизвестен.
+    """
+
+    def create(self, **kwargs):
+        if self._db is not None:
+            return super().create(**kwargs)
+        obj = self.model(**kwargs)
+        obj.save(force_insert=True)
+        return obj
+
+
 class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
@@ -14,19 +31,27 @@ class Group(models.Model):
 
 class Post(models.Model):
     text = models.TextField()
+    # Заполняются из text при сохранении, см. posts.previews
+    preview = models.CharField('Превью текста', max_length=300, blank=True,
+                               editable=False)
+    preview_truncated = models.BooleanField(default=False, editable=False)
     pub_date = models.DateTimeField(auto_now_add=True,
                                     verbose_name='Дата публикации',
                                     db_index=True)
+    # Посты могут лежать в другом шарде, чем пользователи и группы,
+    # поэтому внешние ключи на них без ограничений в базе
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
-        related_name='posts'
+        related_name='posts',
+        db_constraint=False
     )
     group = models.ForeignKey(
         Group,
         blank=True, null=True,
         on_delete=models.SET_NULL,
-        related_name='posts'
+        related_name='posts',
+        db_constraint=False
 
     )
     image = models.ImageField(
@@ -34,6 +59,13 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    image_placeholder = models.TextField(
+        'Превью картинки',
+        blank=True,
+        editable=False,
+    )
+
+    objects = RoutedQuerySet.as_manager()
 
     def __str__(self):
         return self.text[:15]
@@ -51,6 +83,7 @@ class Comment(models.Model):
         related_name='comments',
         verbose_name='Автор',
         null=True,
+        db_constraint=False,
     )
     text = models.TextField('Текст',
                             help_text='Новый комментарий'
@@ -60,8 +93,14 @@ class Comment(models.Model):
         auto_now_add=True
     )
 
+    objects = RoutedQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created']
+        indexes = [
+            models.Index(fields=['post', '-created', '-id'],
+                         name='comment_post_created_idx'),
+        ]
 
     def __str__(self):
         return f"Запись: '{self.post}', автор: '{self.author}'"
@@ -79,3 +118,75 @@ class Follow(models.Model):
         verbose_name='Автор',
         related_name='following'
     )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'author'],
+                                    name='unique_follow'),
+        ]
+
+
+class FollowSuggestion(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='follow_suggestion'
+    )
+    # id рекомендованных авторов через запятую, лучшие первыми
+    authors = models.TextField(blank=True)
+    stale = models.BooleanField(default=False, db_index=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    def author_ids(self):
+        return [int(author_id) for author_id in self.authors.split(',')
+                if author_id]
+
+
+class PostTrend(models.Model):
+    # Строку удаляет trending.post_deleted: пост может быть в другом шарде
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        related_name='trend',
+        db_constraint=False
+    )
+    score = models.FloatField(default=0, db_index=True)
+
+
+class GroupTrend(models.Model):
+    group = models.OneToOneField(
+        Group,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trend'
+    )
+    score = models.FloatField(default=0, db_index=True)
+
+
+class TrendDecay(models.Model):
+    """Единственная строка: когда очки трендов последний раз затухали."""
+    decayed = models.DateTimeField()
+
+
+class ImageUpload(models.Model):
+    """Картинка, загружаемая кусками до отправки формы поста."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4,
+                          editable=False)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='image_uploads'
+    )
+    filename = models.CharField(max_length=255)
+    size = models.PositiveIntegerField()
+    sha256 = models.CharField(max_length=64)
+    received = models.PositiveIntegerField(default=0)
+    complete = models.BooleanField(default=False)
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+
+
+class PostShard(models.Model):
+    """Справочник шардов: выдаёт глобальный id поста и хранит его шард."""
+    shard = models.CharField(max_length=50)
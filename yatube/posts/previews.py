@@ -0,0 +1,39 @@
+"""Короткие превью текста постов для лент.
+
+Превью считается при сохранении и хранится в Post.preview, а ленты
+выбирают посты с отложенным text: полный текст, который может занимать
+десятки килобайт, читает и рендерит только страница поста.
+
+bulk_create и queryset.update(text=...) сигналов не шлют: там превью
+заполняется make_preview вручную. Пост без превью лента показывает по
+полному тексту.
+"""
+from django.db.models.signals import pre_save
+from django.dispatch import receiver
+
+from .models import Post
+
+PREVIEW_LENGTH = Post._meta.get_field('preview').max_length
+ELLIPSIS = '…'
+
+
+def make_preview(text):
+    """(превью, обрезан ли текст); режет по границе слова, если она есть."""
+    if len(text) <= PREVIEW_LENGTH:
+        return text, False
+    cut = text[:PREVIEW_LENGTH - len(ELLIPSIS) + 1]
+    space = cut.rfind(' ')
+    if space > PREVIEW_LENGTH // 2:
+        cut = cut[:space]
+    else:
+        cut = cut[:-1]
+    return cut.rstrip() + ELLIPSIS, True
+
+
+@receiver(pre_save, sender=Post)
+def set_preview(sender, instance, raw=False, update_fields=None, **kwargs):
+    # И для raw-сохранений loaddata: превью выводится из того же text
+    if update_fields is not None and 'text' not in update_fields:
+        return
+    instance.preview, instance.preview_truncated = make_preview(
+        instance.text)
@@ -0,0 +1,90 @@
+"""Ранжированная лента подписок.
+
+Кандидаты — последние RANKING_WINDOW постов авторов из подписок. Каждый
+получает очки за близость к автору (сколько раз пользователь его
+комментировал), свежесть и вовлечённость (очки трендов). Всё окно
+считается одним векторным проходом NumPy, а порядок id кэшируется
+на пользователя.
+"""
+import zlib
+
+import numpy as np
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from . import follow_graph, sharding
+from .models import PostTrend
+
+RANKING_WINDOW = getattr(settings, 'RANKING_WINDOW', 200)
+# Сколько последних постов подписок ранжировать
+RANKING_CACHE_TIMEOUT = getattr(settings, 'RANKING_CACHE_TIMEOUT', 60)
+RANKING_WEIGHTS = getattr(settings, 'RANKING_WEIGHTS', {
+    'affinity': 1.0,
+    'recency': 2.0,
+    'engagement': 0.5,
+})
+RECENCY_HOURS = 24
+# За сколько часов свежесть убывает в e раз
+
+
+def _cache_key(user_id, author_ids):
+    # Подписки входят в ключ: после (от)подписки старый порядок не нужен
+    return f'ranked_feed:{user_id}:{zlib.crc32(author_ids.tobytes())}'
+
+
+def score(affinity, age_hours, engagement, weights=RANKING_WEIGHTS):
+    """Очки для массивов признаков окна кандидатов."""
+    return (weights['affinity'] * np.log1p(affinity)
+            + weights['recency'] * np.exp(-age_hours / RECENCY_HOURS)
+            + weights['engagement'] * np.log1p(engagement))
+
+
+def _rank(user_id, author_ids):
+    rows = [
+        (row['id'], row['author_id'], row['pub_date'])
+        for row in sharding.all_posts()
+        .filter(author_id__in=list(author_ids))
+        .order_by('-pub_date', '-id')
+        .values('id', 'author_id', 'pub_date')[:RANKING_WINDOW]
+    ]
+    if not rows:
+        return []
+    post_ids, post_authors, pub_dates = zip(*rows)
+    scores = dict(PostTrend.objects.filter(pk__in=post_ids)
+                  .values_list('post_id', 'score'))
+    trend = [scores.get(post_id) for post_id in post_ids]
+    post_ids = np.array(post_ids, dtype=np.int64)
+    post_authors = np.array(post_authors, dtype=np.int64)
+    now = timezone.now()
+    age_hours = np.array(
+        [(now - pub_date).total_seconds() / 3600 for pub_date in pub_dates])
+    engagement = np.array([value or 0 for value in trend], dtype=float)
+    comments = sharding.comment_counts(
+        sharding.all_comments().filter(author_id=user_id,
+                                       post__author_id__in=list(author_ids)),
+        'post__author_id')
+    affinity = np.array(
+        [comments.get(author_id, 0) for author_id in author_ids], dtype=float)
+    # author_ids отсортирован: индекс автора ищется бинарным поиском
+    affinity = affinity[np.searchsorted(author_ids, post_authors)]
+    order = np.argsort(-score(affinity, age_hours, engagement),
+                       kind='stable')
+    return post_ids[order].tolist()
+
+
+def ranked_post_ids(user):
+    """Порядок id постов ранжированной ленты, из кэша или пересчитанный."""
+    author_ids = np.asarray(follow_graph.following(user.id), dtype=np.int64)
+    key = _cache_key(user.id, author_ids)
+    post_ids = cache.get(key)
+    if post_ids is None:
+        post_ids = _rank(user.id, author_ids) if len(author_ids) else []
+        cache.set(key, post_ids, RANKING_CACHE_TIMEOUT)
+    return post_ids
+
+
+def posts_in_order(post_ids):
+    posts = sharding.posts_by_ids(post_ids)
+    return [posts[post_id] for post_id in post_ids if post_id in posts]
@@ -0,0 +1,294 @@
+"""Шардирование постов и комментариев по автору.
+
+Посты автора лежат в базе POST_SHARDS[crc32(author_id) % N], комментарии —
+рядом со своим постом. Глобальный id поста выдаёт таблица-справочник
+PostShard в default: по нему же вьюхи находят шард поста за один запрос
+(дальше — из кэша). Ленты по всем авторам собирает ShardedQuerySet:
+фильтры применяются к каждому шарду, срез берётся с каждого и сливается
+по сортировке. Пользователи, группы и остальные таблицы остаются в
+default, поэтому связи с ними подгружаются prefetch_related, а не JOIN.
+
+С одним шардом (по умолчанию) всё возвращается обычными queryset к
+default, и роутер ни во что не вмешивается. Посты, созданные так,
+попадают в справочник миграцией 0017 и manage.py rebalance_shards; он же
+переносит посты в шард автора после включения шардов.
+"""
+import heapq
+import zlib
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Count
+from django.db.models.signals import post_delete, pre_save
+from django.dispatch import receiver
+
+from core import replicas
+
+from .models import Comment, Group, Post, PostShard
+
+User = get_user_model()
+
+SHARDED_MODELS = ('post', 'comment')
+
+
+def shards():
+    return getattr(settings, 'POST_SHARDS', [DEFAULT_DB_ALIAS])
+
+
+def is_sharded():
+    return len(shards()) > 1
+
+
+def shard_for_author(author_id):
+    aliases = shards()
+    return aliases[zlib.crc32(str(author_id).encode()) % len(aliases)]
+
+
+def shard_for_post(post_id):
+    if not is_sharded():
+        return DEFAULT_DB_ALIAS
+    key = f'post_shard:{post_id}'
+    shard = cache.get(key)
+    if shard is None:
+        shard = (PostShard.objects.filter(pk=post_id)
+                 .values_list('shard', flat=True).first())
+        if shard is None:
+            # Поста нет: запрос к любому шарду вернёт пустоту
+            return DEFAULT_DB_ALIAS
+        cache.set(key, shard, None)
+    return shard
+
+
+def with_relations(queryset, *fields):
+    """JOIN в пределах одной базы, prefetch — когда связи в другой."""
+    if is_sharded():
+        return queryset.prefetch_related(*fields)
+    return queryset.select_related(*fields)
+
+
+def post_queryset(post_id):
+    """Посты шарда, где лежит post_id."""
+    if not is_sharded():
+        return Post.objects.all()
+    return Post.objects.using(shard_for_post(post_id))
+
+
+def author_posts(author_id):
+    if not is_sharded():
+        return Post.objects.filter(author_id=author_id)
+    return Post.objects.using(shard_for_author(author_id)).filter(
+        author_id=author_id)
+
+
+def all_posts():
+    if not is_sharded():
+        return Post.objects.all()
+    return ShardedQuerySet(Post.objects.using(alias) for alias in shards())
+
+
+def all_comments():
+    if not is_sharded():
+        return Comment.objects.all()
+    return ShardedQuerySet(Comment.objects.using(alias)
+                           for alias in shards())
+
+
+def posts_by_ids(post_ids):
+    """in_bulk по всем шардам для лент: id -> пост со связями, без text."""
+    post_ids = list(post_ids)
+    if not is_sharded():
+        return with_relations(Post.objects, 'author', 'group').defer(
+            'text').in_bulk(post_ids)
+    by_shard = {}
+    for post_id in post_ids:
+        by_shard.setdefault(shard_for_post(post_id), []).append(post_id)
+    posts = {}
+    for alias, ids in by_shard.items():
+        posts.update(with_relations(Post.objects.using(alias), 'author',
+                                    'group').defer('text').in_bulk(ids))
+    return posts
+
+
+def per_shard(queryset):
+    """Составляющие ShardedQuerySet или сам queryset одной базы."""
+    return getattr(queryset, 'querysets', [queryset])
+
+
+def comment_counts(queryset, field):
+    """{значение field: число комментариев}, суммированное по шардам."""
+    counts = {}
+    for shard_queryset in per_shard(queryset):
+        for value, count in (shard_queryset.values_list(field)
+                             .annotate(count=Count('id')).order_by()):
+            counts[value] = counts.get(value, 0) + count
+    return counts
+
+
+class _Descending:
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+def _value(row, name):
+    return row[name] if isinstance(row, dict) else getattr(row, name)
+
+
+class ShardedQuerySet:
+    """Один и тот же запрос ко всем шардам со слиянием по order_by.
+
+    В values() должны входить поля сортировки: по ним идёт слияние.
+    """
+
+    CHAINABLE = ('filter', 'exclude', 'order_by', 'select_related',
+                 'prefetch_related', 'values', 'only', 'defer')
+
+    def __init__(self, querysets):
+        self.querysets = list(querysets)
+
+    def __getattr__(self, name):
+        if name not in self.CHAINABLE:
+            raise AttributeError(name)
+
+        def chained(*args, **kwargs):
+            return ShardedQuerySet(getattr(queryset, name)(*args, **kwargs)
+                                   for queryset in self.querysets)
+        return chained
+
+    @property
+    def ordered(self):
+        return self.querysets[0].ordered
+
+    def _merge_key(self):
+        ordering = self.querysets[0].query.order_by
+        if not ordering:
+            raise TypeError('Слияние шардов требует order_by')
+
+        def key(row):
+            return tuple(
+                _Descending(_value(row, field[1:])) if field.startswith('-')
+                else _value(row, field)
+                for field in ordering)
+        return key
+
+    def _merged(self, querysets):
+        return heapq.merge(*querysets, key=self._merge_key())
+
+    def __iter__(self):
+        return self._merged(self.querysets)
+
+    def iterator(self):
+        return iter(self)
+
+    def __getitem__(self, item):
+        if isinstance(item, int):
+            return self[item:item + 1][0]
+        start, stop = item.start or 0, item.stop
+        if stop is None:
+            return list(islice(self, start, None))
+        # С каждого шарда хватит первых stop строк
+        return list(islice(
+            self._merged(queryset[:stop] for queryset in self.querysets),
+            start, stop))
+
+    def count(self):
+        return sum(queryset.count() for queryset in self.querysets)
+
+    def __len__(self):
+        return self.count()
+
+    def exists(self):
+        return any(queryset.exists() for queryset in self.querysets)
+
+    def first(self):
+        rows = self[0:1]
+        return rows[0] if rows else None
+
+
+class ShardRouter:
+    """Пост и комментарий — в шард автора поста; остальное не трогает."""
+
+    def _shard(self, model, instance):
+        if (not is_sharded() or instance is None
+                or model._meta.app_label != 'posts'
+                or model._meta.model_name not in SHARDED_MODELS):
+            return None
+        # Шард выводится из ключей, а не из _state.db: его уже мог
+        # выставить в default, например, comment.author = user. Ключи
+        # читаются из __dict__: отложенное поле роутер бы и загружал
+        author_id = instance.__dict__.get('author_id')
+        post_id = instance.__dict__.get('post_id')
+        if isinstance(instance, Post) and author_id is not None:
+            return shard_for_author(author_id)
+        if isinstance(instance, Comment) and post_id is not None:
+            return shard_for_post(post_id)
+        if isinstance(instance, User) and model is Post:
+            return shard_for_author(instance.pk)
+        if isinstance(instance, (Post, Comment)):
+            return instance._state.db
+        return None
+
+    def db_for_read(self, model, **hints):
+        return self._shard(model, hints.get('instance'))
+
+    def db_for_write(self, model, **hints):
+        alias = self._shard(model, hints.get('instance'))
+        if alias is not None:
+            # До PrimaryReplicaRouter эта запись уже не дойдёт
+            replicas.note_write(model)
+        return alias
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == DEFAULT_DB_ALIAS or db not in shards():
+            return None
+        return app_label == 'posts' and model_name in SHARDED_MODELS
+
+
+@receiver(pre_save, sender=Post)
+def allocate_post_id(sender, instance, raw=False, **kwargs):
+    """Новый пост получает глобальный id из справочника шардов."""
+    if is_sharded() and instance.pk is None and not raw:
+        instance.pk = PostShard.objects.create(
+            shard=shard_for_author(instance.author_id)).pk
+
+
+@receiver(post_delete, sender=User)
+def delete_author_content(sender, instance, **kwargs):
+    """Каскад из default не видит другие шарды: догоняем вручную."""
+    if not is_sharded():
+        return
+    shard = shard_for_author(instance.pk)
+    if shard != DEFAULT_DB_ALIAS:
+        Post.objects.using(shard).filter(author_id=instance.pk).delete()
+    for alias in shards():
+        if alias != DEFAULT_DB_ALIAS:
+            Comment.objects.using(alias).filter(
+                author_id=instance.pk).update(author=None)
+
+
+@receiver(post_delete, sender=Group)
+def detach_group(sender, instance, **kwargs):
+    """SET_NULL для постов группы в остальных шардах."""
+    if not is_sharded():
+        return
+    for alias in shards():
+        if alias != DEFAULT_DB_ALIAS:
+            Post.objects.using(alias).filter(group_id=instance.pk).update(
+                group=None)
+
+
+@receiver(post_delete, sender=Post)
+def release_post_id(sender, instance, **kwargs):
+    if is_sharded():
+        PostShard.objects.filter(pk=instance.pk).delete()
+        cache.delete(f'post_shard:{instance.pk}')
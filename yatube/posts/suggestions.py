@@ -0,0 +1,120 @@
+"""Рекомендации «на кого подписаться» по друзьям друзей.
+
+Граф подписок целиком грузится в разреженную матрицу A (A[u, v] = 1,
+если u подписан на v). Строка A[u] @ A считает, сколькими путями длины
+два u приходит к каждому автору; лучшие кандидаты сохраняются в
+FollowSuggestion и читаются во вьюхах одним запросом по первичному ключу.
+"""
+import numpy as np
+from scipy import sparse
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from . import follow_graph
+from .models import Follow, FollowSuggestion
+
+User = get_user_model()
+
+SUGGESTIONS_SHOWN = 5
+# Сколько рекомендаций показывать на странице
+SUGGESTIONS_STORED = 20
+# Сколько кандидатов хранить, с запасом на уже оформленные подписки
+CHUNK_SIZE = 2000
+# Сколько строк матрицы перемножать за раз
+
+
+def follow_matrix():
+    """Разреженная матрица подписок и отсортированный массив user id."""
+    pairs = np.fromiter(
+        (value for pair in Follow.objects.values_list('user_id', 'author_id')
+         for value in pair),
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    ids = np.unique(pairs)
+    rows = np.searchsorted(ids, pairs[:, 0])
+    cols = np.searchsorted(ids, pairs[:, 1])
+    matrix = sparse.csr_matrix(
+        (np.ones(len(pairs), dtype=np.int32), (rows, cols)),
+        shape=(len(ids), len(ids)),
+    )
+    return ids, matrix
+
+
+def top_candidates(matrix, rows, top=SUGGESTIONS_STORED):
+    """Лучшие кандидаты для строк rows: пары (номер в rows, колонка).
+
+    Кандидаты упорядочены по числу общих связей, затем по числу
+    подписчиков; уже оформленные подписки и сам пользователь отброшены.
+    """
+    follows = matrix[rows]
+    scores = (follows @ matrix).tocsr()
+    scores = (scores - scores.multiply(follows)).tocoo()
+    mask = (scores.data > 0) & (scores.col != rows[scores.row])
+    row, col, score = scores.row[mask], scores.col[mask], scores.data[mask]
+    popularity = np.asarray(matrix.sum(axis=0)).ravel()[col]
+    order = np.lexsort((-popularity, -score, row))
+    row, col = row[order], col[order]
+    rank = np.arange(len(row)) - np.searchsorted(row, row)
+    keep = rank < top
+    return row[keep], col[keep]
+
+
+def save_suggestions(user_ids, row, col, ids):
+    """Перезаписывает рекомендации для user_ids одним пакетом."""
+    authors = {user_id: '' for user_id in user_ids}
+    bounds = np.flatnonzero(np.diff(row)) + 1
+    for rows_part, cols_part in zip(np.split(row, bounds),
+                                    np.split(col, bounds)):
+        if len(rows_part):
+            user_id = int(user_ids[rows_part[0]])
+            authors[user_id] = ','.join(str(i) for i in ids[cols_part])
+    with transaction.atomic():
+        FollowSuggestion.objects.filter(user_id__in=list(authors)).delete()
+        FollowSuggestion.objects.bulk_create(
+            (FollowSuggestion(user_id=user_id, authors=value)
+             for user_id, value in authors.items()),
+            batch_size=500,
+        )
+
+
+def refresh(stale_only=False, top=SUGGESTIONS_STORED,
+            chunk_size=CHUNK_SIZE):
+    """Пересчитывает рекомендации для всех или только устаревших.
+
+    Возвращает число пользователей, для которых записан результат.
+    """
+    ids, matrix = follow_matrix()
+    if stale_only:
+        user_ids = np.fromiter(
+            FollowSuggestion.objects.filter(stale=True)
+            .values_list('user_id', flat=True),
+            dtype=np.int64,
+        )
+    else:
+        out_degree = np.diff(matrix.indptr)
+        user_ids = ids[out_degree > 0]
+    positions = np.searchsorted(ids, user_ids)
+    in_graph = positions < len(ids)
+    in_graph[in_graph] = ids[positions[in_graph]] == user_ids[in_graph]
+    for start in range(0, len(user_ids), chunk_size):
+        chunk = slice(start, start + chunk_size)
+        chunk_ids = user_ids[chunk]
+        chunk_rows = np.flatnonzero(in_graph[chunk])
+        row, col = top_candidates(matrix, positions[chunk][chunk_rows], top)
+        save_suggestions(chunk_ids, chunk_rows[row], col, ids)
+    return len(user_ids)
+
+
+def suggested_authors(user, count=SUGGESTIONS_SHOWN):
+    """Готовые рекомендации пользователю без уже оформленных подписок."""
+    suggestion = FollowSuggestion.objects.filter(pk=user.pk).first()
+    if suggestion is None:
+        return []
+    author_ids = suggestion.author_ids()
+    followed = follow_graph.following_among(user.id, author_ids)
+    author_ids = [author_id for author_id in author_ids
+                  if author_id not in followed][:count]
+    authors = User.objects.in_bulk(author_ids)
+    return [authors[author_id] for author_id in author_ids
+            if author_id in authors]
@@ -0,0 +1,16 @@
+from sorl.thumbnail import get_thumbnail
+
+from core.tasks import task
+from . import sharding
+
+THUMBNAIL_GEOMETRY = '960x339'
+# Должно совпадать с тегом thumbnail в шаблонах постов
+
+
+@task(priority=5)
+def warm_thumbnail(post_id):
+    """Готовит миниатюру картинки поста заранее, а не на первом показе."""
+    post = sharding.post_queryset(post_id).filter(pk=post_id).first()
+    if post is not None and post.image:
+        get_thumbnail(post.image, THUMBNAIL_GEOMETRY, crop='center',
+                      upscale=True)
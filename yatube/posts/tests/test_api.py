@@ -0,0 +1,71 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+from http import HTTPStatus
+
+from ..models import Post, Group, Follow
+
+User = get_user_model()
+
+
+def streamed_json(response):
+    return json.loads(b''.join(response.streaming_content))
+
+
+class PostApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            description='Тестовое описание группы',
+            slug='test-slug',
+        )
+        Post.objects.bulk_create(
+            Post(author=cls.user, group=cls.group, text=f'Пост {i}')
+            for i in range(15)
+        )
+        Follow.objects.create(user=cls.reader, author=cls.user)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def test_feeds_are_paginated_by_cursor(self):
+        """Feeds return a page of rows and continue after the cursor."""
+        urls = (
+            reverse('posts:api_index'),
+            reverse('posts:api_group_list', kwargs={'slug': 'test-slug'}),
+            reverse('posts:api_profile', kwargs={'username': 'TestUser'}),
+            reverse('posts:api_follow_index'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                first = streamed_json(self.authorized_client.get(url))
+                self.assertEqual(len(first['results']), 10)
+                second = streamed_json(self.authorized_client.get(
+                    url, {'cursor': first['next']}))
+                self.assertEqual(len(second['results']), 5)
+                self.assertIsNone(second['next'])
+
+    def test_field_selection(self):
+        """Only the requested fields are serialized."""
+        data = streamed_json(self.client.get(
+            reverse('posts:api_index'), {'fields': 'id,author'}))
+        self.assertEqual(set(data['results'][0]), {'id', 'author'})
+        self.assertEqual(data['results'][0]['author'], 'TestUser')
+
+    def test_post_detail(self):
+        post = Post.objects.first()
+        response = self.client.get(
+            reverse('posts:api_post_detail', kwargs={'post_id': post.id}))
+        self.assertEqual(response.json()['text'], post.text)
+        self.assertIsNone(response.json()['image'])
+
+    def test_follow_requires_auth(self):
+        response = self.client.get(reverse('posts:api_follow_index'))
+        self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
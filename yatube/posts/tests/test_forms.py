@@ -1,10 +1,12 @@
 import tempfile
 import shutil
+from unittest import mock
 from django.contrib.auth import get_user_model
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from ..forms import PostForm, CommentForm
 from ..models import Post, Group, Comment
+from ..placeholders import placeholder
 from http import HTTPStatus
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.conf import settings
@@ -80,6 +82,43 @@ class PostFormTest(TestCase):
                 image='posts/small.gif',
             ).exists()
         )
+        post = Post.objects.get(image='posts/small.gif')
+        self.assertTrue(
+            post.image_placeholder.startswith('data:image/jpeg;base64,'))
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.id}))
+        self.assertContains(response, post.image_placeholder)
+        self.assertContains(response, 'width="960" height="339"')
+
+    def test_placeholder_only_for_changed_image(self):
+        """Saving a post re-reads the image only after it was replaced."""
+        small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x02\x00'
+            b'\x01\x00\x80\x00\x00\x00\x00\x00'
+            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+            b'\x0A\x00\x3B'
+        )
+        post = Post.objects.create(
+            author=self.user, text='С картинкой',
+            image=SimpleUploadedFile('lqip.gif', small_gif, 'image/gif'))
+        self.assertTrue(post.image_placeholder)
+        stored = post.image.name
+        Post.objects.filter(pk=post.pk).update(image_placeholder='')
+        post = Post.objects.get(pk=post.pk)
+        with mock.patch('posts.placeholders.placeholder',
+                        return_value='') as mocked:
+            post.text = 'Другой текст'
+            post.save()
+            mocked.assert_not_called()
+            post.image = 'posts/other.gif'
+            post.save()
+            mocked.assert_called_once()
+        image = Post.objects.get(pk=post.pk).image
+        image.name = stored
+        self.assertTrue(placeholder(image))
+        self.assertTrue(image.closed)
 
     def test_edit_post(self):
         """Valid form edits a Post entry."""
@@ -0,0 +1,80 @@
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from sorl.thumbnail import get_thumbnail
+
+from ..models import Post
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+User = get_user_model()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class MediaGarbageCollectorTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user(username='TestUser')
+        self.post = Post.objects.create(
+            author=user, text='С картинкой',
+            image=SimpleUploadedFile('live.gif', SMALL_GIF, 'image/gif'))
+        self.live_thumbnail = get_thumbnail(self.post.image, '10x10').name
+        self.orphan = self.write('posts/orphan.gif', old=True)
+        self.fresh = self.write('posts/fresh.gif', old=False)
+        self.stray = self.write('cache/00/stray.jpg', old=True)
+        self.age(self.post.image.path, self.live_thumbnail)
+
+    def write(self, name, old):
+        path = os.path.join(TEMP_MEDIA_ROOT, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(SMALL_GIF)
+        if old:
+            self.age(path)
+        return path
+
+    def age(self, *paths):
+        past = time.time() - 2 * 60 * 60
+        for path in paths:
+            os.utime(os.path.join(TEMP_MEDIA_ROOT, path), (past, past))
+
+    def test_dry_run_keeps_files(self):
+        """Dry run reports orphans without deleting them."""
+        out = StringIO()
+        call_command('gc_media', dry_run=True, stdout=out)
+        self.assertIn('Будет удалено картинок: 1', out.getvalue())
+        self.assertIn('Будет удалено миниатюр: 1', out.getvalue())
+        self.assertTrue(os.path.exists(self.orphan))
+        self.assertTrue(os.path.exists(self.stray))
+
+    def test_orphans_are_deleted(self):
+        """Only old unreferenced images and thumbnails are removed."""
+        call_command('gc_media', stdout=StringIO())
+        self.assertFalse(os.path.exists(self.orphan))
+        self.assertFalse(os.path.exists(self.stray))
+        self.assertTrue(os.path.exists(self.fresh))
+        self.assertTrue(os.path.exists(self.post.image.path))
+        self.assertTrue(os.path.exists(
+            os.path.join(TEMP_MEDIA_ROOT, self.live_thumbnail)))
@@ -1,6 +1,7 @@
 from django.contrib.auth import get_user_model
 from django.test import TestCase
 from ..models import Post, Group
+from ..previews import PREVIEW_LENGTH
 
 User = get_user_model()
 
@@ -28,3 +29,14 @@ class PostModelTest(TestCase):
         expected_group_name = group.title
         self.assertEqual(expected_post_name, str(post))
         self.assertEqual(expected_group_name, str(group))
+
+    def test_preview(self):
+        """A short text is its own preview; a long one is cut at a word."""
+        post = PostModelTest.post
+        self.assertEqual(post.preview, post.text)
+        self.assertFalse(post.preview_truncated)
+        post.text = 'слово ' * 1000
+        post.save()
+        self.assertTrue(post.preview_truncated)
+        self.assertLessEqual(len(post.preview), PREVIEW_LENGTH)
+        self.assertTrue(post.preview.endswith('слово…'))
@@ -0,0 +1,56 @@
+from datetime import timedelta
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import ranking
+from ..models import Comment, Follow, Post
+
+User = get_user_model()
+
+
+class RankedFeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='reader')
+        self.friend = User.objects.create_user(username='friend')
+        self.stranger = User.objects.create_user(username='stranger')
+        for author in (self.friend, self.stranger):
+            Follow.objects.create(user=self.user, author=author)
+        self.friend_post = Post.objects.create(author=self.friend,
+                                               text='Пост друга')
+        Post.objects.filter(pk=self.friend_post.pk).update(
+            pub_date=timezone.now() - timedelta(hours=2))
+        self.fresh_post = Post.objects.create(author=self.stranger,
+                                              text='Свежий пост')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_score_is_vectorized(self):
+        scores = ranking.score(np.array([0.0, 5.0]), np.array([0.0, 0.0]),
+                               np.array([0.0, 0.0]))
+        self.assertEqual(scores.shape, (2,))
+        self.assertGreater(scores[1], scores[0])
+
+    def test_affinity_outranks_recency(self):
+        """An author the user comments on a lot comes first."""
+        other = Post.objects.create(author=self.friend, text='Ещё пост')
+        Comment.objects.bulk_create(
+            Comment(post=other, author=self.user, text='Отлично')
+            for _ in range(30))
+        response = self.client.get(reverse('posts:follow_ranked'))
+        page = list(response.context['page_obj'])
+        self.assertEqual(page[0].author, self.friend)
+        self.assertEqual(len(page), 3)
+
+    def test_ranked_order_is_cached_per_following_set(self):
+        ids = ranking.ranked_post_ids(self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(ranking.ranked_post_ids(self.user), ids)
+        Follow.objects.filter(author=self.stranger).delete()
+        self.assertEqual(ranking.ranked_post_ids(self.user),
+                         [self.friend_post.id])
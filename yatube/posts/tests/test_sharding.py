@@ -0,0 +1,207 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import sharding
+from ..models import Comment, Post, PostShard
+
+User = get_user_model()
+
+SHARDS = ['default', 'shard1', 'shard2']
+
+
+class ShardedQuerySetTests(TestCase):
+    """Scatter-gather over per-shard querysets (here: one per author)."""
+
+    def setUp(self):
+        cache.clear()
+        self.authors = [User.objects.create_user(username=f'author{number}')
+                        for number in range(3)]
+        now = timezone.now()
+        for number in range(9):
+            post = Post.objects.create(
+                text=f'Пост {number}',
+                author=self.authors[number % 3],
+            )
+            Post.objects.filter(pk=post.pk).update(
+                pub_date=now - timedelta(minutes=number))
+        self.merged = sharding.ShardedQuerySet(
+            Post.objects.filter(author=author) for author in self.authors)
+
+    def test_merge_follows_order_by(self):
+        """Rows from every part come back in global order_by order."""
+        texts = [post.text for post in self.merged.order_by('-pub_date')]
+        self.assertEqual(texts, [f'Пост {number}' for number in range(9)])
+
+    def test_slice_and_count(self):
+        """Slicing takes the page across parts; count sums them."""
+        posts = self.merged.filter(text__startswith='Пост').order_by(
+            '-pub_date')
+        self.assertEqual([post.text for post in posts[2:5]],
+                         ['Пост 2', 'Пост 3', 'Пост 4'])
+        self.assertEqual(posts[0].text, 'Пост 0')
+        self.assertEqual(posts.count(), 9)
+        self.assertTrue(posts.exists())
+
+    def test_values_merge(self):
+        """values() rows are merged by their ordering columns too."""
+        rows = self.merged.order_by('pub_date').values('text', 'pub_date')
+        self.assertEqual(rows.first()['text'], 'Пост 8')
+
+    def test_unordered_merge_fails(self):
+        with self.assertRaises(TypeError):
+            list(self.merged.order_by())
+
+    def test_comment_counts_are_summed(self):
+        post = Post.objects.first()
+        Comment.objects.create(post=post, author=self.authors[0], text='1')
+        Comment.objects.create(post=post, author=self.authors[1], text='2')
+        counts = sharding.comment_counts(sharding.ShardedQuerySet(
+            Comment.objects.filter(author=author) for author in self.authors
+        ), 'post_id')
+        self.assertEqual(counts, {post.pk: 2})
+
+
+@override_settings(POST_SHARDS=SHARDS)
+class ShardRoutingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_author_hash_is_stable(self):
+        """An author always maps to the same shard; all shards are used."""
+        shards = {author_id: sharding.shard_for_author(author_id)
+                  for author_id in range(1, 100)}
+        self.assertEqual(shards, {author_id: sharding.shard_for_author(
+            author_id) for author_id in range(1, 100)})
+        self.assertEqual(set(shards.values()), set(SHARDS))
+
+    def test_post_directory_lookup_is_cached(self):
+        post_id = PostShard.objects.create(shard='shard2').pk
+        self.assertEqual(sharding.shard_for_post(post_id), 'shard2')
+        PostShard.objects.filter(pk=post_id).delete()
+        self.assertEqual(sharding.shard_for_post(post_id), 'shard2')
+        self.assertEqual(sharding.shard_for_post(post_id + 1), 'default')
+
+    def test_router(self):
+        router = sharding.ShardRouter()
+        author = User(pk=7)
+        post = Post(author_id=7)
+        self.assertEqual(router.db_for_write(Post, instance=post),
+                         sharding.shard_for_author(7))
+        self.assertEqual(router.db_for_read(Post, instance=author),
+                         sharding.shard_for_author(7))
+        self.assertIsNone(router.db_for_read(User, instance=author))
+        self.assertTrue(router.allow_migrate('shard1', 'posts', 'post'))
+        self.assertFalse(router.allow_migrate('shard1', 'posts', 'group'))
+        self.assertIsNone(router.allow_migrate('default', 'posts', 'group'))
+
+    @override_settings(POST_SHARDS=['default'])
+    def test_single_shard_uses_plain_querysets(self):
+        self.assertIsNone(sharding.ShardRouter().db_for_write(
+            Post, instance=Post(author_id=7)))
+        self.assertNotIsInstance(sharding.all_posts(),
+                                 sharding.ShardedQuerySet)
+
+
+@override_settings(POST_SHARDS=SHARDS)
+class ShardDatabaseTests(TestCase):
+    """End to end over two real SQLite shard files besides default."""
+    databases = set(SHARDS)
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        for alias in SHARDS[1:]:
+            connections.databases[alias] = dict(
+                connections.databases[DEFAULT_DB_ALIAS],
+                NAME=os.path.join(cls.directory, f'{alias}.sqlite3'),
+                TEST={})
+        with override_settings(POST_SHARDS=SHARDS):
+            for alias in SHARDS[1:]:
+                call_command('migrate', database=alias, verbosity=0)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        for alias in SHARDS[1:]:
+            connection = connections[alias]
+            connection.close()
+            if connection.pool is not None:
+                connection.pool.close_idle()
+            del connections[alias]
+            del connections.databases[alias]
+        shutil.rmtree(cls.directory, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def author_on(self, alias):
+        """A new user whose posts hash to the given shard."""
+        number = User.objects.count()
+        while True:
+            user = User.objects.create_user(username=f'user{number}')
+            if sharding.shard_for_author(user.pk) == alias:
+                return user
+            number += 1
+
+    def test_create_profile_detail_and_feed(self):
+        reader = Client()
+        reader.force_login(User.objects.create_user(username='reader'))
+        for alias in SHARDS:
+            author = self.author_on(alias)
+            client = Client()
+            client.force_login(author)
+            client.post(reverse('posts:create_post'),
+                        {'text': f'Пост в {alias}'})
+            post = Post.objects.using(alias).get(author=author)
+            for other in set(SHARDS) - {alias}:
+                self.assertFalse(
+                    Post.objects.using(other).filter(pk=post.pk).exists())
+            self.assertEqual(PostShard.objects.get(pk=post.pk).shard, alias)
+            reader.post(reverse('posts:add_comment', args=(post.pk,)),
+                        {'text': f'Комментарий в {alias}'})
+            self.assertTrue(Comment.objects.using(alias).filter(
+                post_id=post.pk).exists())
+            profile = reader.get(reverse('posts:profile',
+                                         args=(author.username,)))
+            self.assertContains(profile, f'Пост в {alias}')
+            detail = reader.get(reverse('posts:post_detail',
+                                        args=(post.pk,)))
+            self.assertContains(detail, f'Пост в {alias}')
+            self.assertContains(detail, f'Комментарий в {alias}')
+        content = reader.get(reverse('posts:index')).content.decode()
+        positions = [content.index(f'Пост в {alias}') for alias in SHARDS]
+        # Лента по всем шардам — от новых к старым
+        self.assertEqual(positions, sorted(positions, reverse=True))
+
+    def test_rebalance_moves_posts_created_before_sharding(self):
+        author = self.author_on('shard1')
+        with override_settings(POST_SHARDS=['default']):
+            old = Post.objects.create(author=author, text='Старый пост')
+            Comment.objects.create(post=old, author=author,
+                                   text='Старый комментарий')
+        self.assertFalse(PostShard.objects.filter(pk=old.pk).exists())
+        call_command('rebalance_shards', stdout=StringIO())
+        moved = Post.objects.using('shard1').get(pk=old.pk)
+        self.assertEqual(moved.pub_date, old.pub_date)
+        self.assertFalse(Post.objects.filter(pk=old.pk).exists())
+        self.assertEqual(
+            Comment.objects.using('shard1').get(post_id=old.pk).text,
+            'Старый комментарий')
+        self.assertEqual(PostShard.objects.get(pk=old.pk).shard, 'shard1')
+        response = self.client.get(reverse('posts:profile',
+                                           args=(author.username,)))
+        self.assertContains(response, 'Старый пост')
+        new = Post.objects.create(author=author, text='Новый пост')
+        self.assertGreater(new.pk, old.pk)
@@ -0,0 +1,81 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core.models import Task
+from core.tasks import claim, execute
+from .. import follow_graph, suggestions
+from ..models import Follow, FollowSuggestion
+
+User = get_user_model()
+
+
+class FollowSuggestionsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        names = ('user', 'a', 'b', 'c', 'd')
+        self.users = {name: User.objects.create_user(username=name)
+                      for name in names}
+        for user, author in (('user', 'a'), ('user', 'b'), ('a', 'c'),
+                             ('a', 'd'), ('b', 'c')):
+            Follow.objects.create(user=self.users[user],
+                                  author=self.users[author])
+
+    def test_friends_of_friends_ranking(self):
+        """Candidates are ranked by the number of common links."""
+        call_command('build_follow_suggestions', stdout=StringIO())
+        suggested = suggestions.suggested_authors(self.users['user'])
+        self.assertEqual([u.username for u in suggested], ['c', 'd'])
+        self.assertEqual(
+            FollowSuggestion.objects.get(pk=self.users['b'].pk).author_ids(),
+            [])
+
+    def test_incremental_refresh(self):
+        """Only users whose follows changed are recomputed."""
+        suggestions.refresh()
+        follow_graph.follow(self.users['user'].id, self.users['c'].id)
+        stale = FollowSuggestion.objects.filter(stale=True)
+        self.assertEqual(list(stale.values_list('user', flat=True)),
+                         [self.users['user'].id])
+        self.assertEqual(suggestions.refresh(stale_only=True), 1)
+        row = FollowSuggestion.objects.get(pk=self.users['user'].pk)
+        self.assertEqual(row.author_ids(), [self.users['d'].id])
+        self.assertFalse(row.stale)
+
+    def test_followers_are_marked_stale_in_background(self):
+        """The request marks only the follower; a task marks their fans."""
+        suggestions.refresh()
+        Task.objects.all().delete()
+        follow_graph.follow(self.users['a'].id, self.users['b'].id)
+        stale = FollowSuggestion.objects.filter(stale=True)
+        self.assertEqual(list(stale.values_list('user', flat=True)),
+                         [self.users['a'].id])
+        task_row = Task.objects.get(
+            name=follow_graph.mark_followers_stale.name)
+        self.assertEqual(claim(10), [task_row.id])
+        self.assertEqual(execute(task_row.id), Task.DONE)
+        self.assertEqual(
+            sorted(stale.values_list('user', flat=True)),
+            [self.users['user'].id, self.users['a'].id])
+
+    def test_first_follow_is_refreshed_incrementally(self):
+        """A user without a suggestion row gets one on the first follow."""
+        suggestions.refresh()
+        newcomer = User.objects.create_user(username='newcomer')
+        follow_graph.follow(newcomer.id, self.users['a'].id)
+        self.assertTrue(FollowSuggestion.objects.get(pk=newcomer.pk).stale)
+        suggestions.refresh(stale_only=True)
+        self.assertEqual(
+            FollowSuggestion.objects.get(pk=newcomer.pk).author_ids(),
+            [self.users['c'].id, self.users['d'].id])
+
+    def test_follow_page_shows_suggestions(self):
+        suggestions.refresh()
+        client = Client()
+        client.force_login(self.users['user'])
+        response = client.get(reverse('posts:follow_index'))
+        self.assertEqual(len(response.context['suggestions']), 2)
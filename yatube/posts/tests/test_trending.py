@@ -0,0 +1,96 @@
+import threading
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import follow_graph, trending
+from ..models import (Comment, Group, GroupTrend, Post, PostTrend,
+                      TrendDecay)
+
+User = get_user_model()
+
+
+class TrendingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='TestUser')
+        self.reader = User.objects.create_user(username='Reader')
+        self.group = Group.objects.create(title='Тестовая группа',
+                                          slug='test-slug')
+        self.quiet = Post.objects.create(author=self.reader, text='Тихий')
+        self.post = Post.objects.create(author=self.user, text='Громкий',
+                                        group=self.group)
+
+    def test_events_update_scores(self):
+        """Comments and follows raise the post and its group."""
+        Comment.objects.create(post=self.post, author=self.reader,
+                               text='Комментарий')
+        follow_graph.follow(self.reader.id, self.user.id)
+        follow_graph.follow(self.reader.id, self.user.id)
+        weights = trending.TRENDING_WEIGHTS
+        expected = weights['post'] + weights['comment'] + weights['follow']
+        self.assertAlmostEqual(
+            PostTrend.objects.get(pk=self.post.pk).score, expected)
+        self.assertAlmostEqual(
+            GroupTrend.objects.get(pk=self.group.pk).score, expected)
+
+    def test_top_and_decay(self):
+        """Top is ordered by score and decay halves scores per half-life."""
+        Comment.objects.create(post=self.post, author=self.reader,
+                               text='Комментарий')
+        response = self.client.get(reverse('posts:trending'))
+        self.assertEqual(list(response.context['page_obj']),
+                         [self.post, self.quiet])
+        self.assertEqual(response.context['groups'], [self.group])
+        before = PostTrend.objects.get(pk=self.post.pk).score
+        call_command('decay_trending',
+                     elapsed=trending.TRENDING_HALF_LIFE, stdout=StringIO())
+        self.assertAlmostEqual(PostTrend.objects.get(pk=self.post.pk).score,
+                               before / 2)
+
+    def test_decay_measures_time_since_last_run(self):
+        """Without --elapsed the decay covers the time since the last one."""
+        before = PostTrend.objects.get(pk=self.post.pk).score
+        call_command('decay_trending', stdout=StringIO())
+        self.assertAlmostEqual(PostTrend.objects.get(pk=self.post.pk).score,
+                               before)
+        TrendDecay.objects.update(decayed=timezone.now() - timedelta(
+            seconds=trending.TRENDING_HALF_LIFE))
+        call_command('decay_trending', stdout=StringIO())
+        self.assertAlmostEqual(PostTrend.objects.get(pk=self.post.pk).score,
+                               before / 2, places=3)
+
+    def test_idle_views_are_flushed_by_timer(self):
+        """A buffered view is written even if no other view follows."""
+        trending.flush_views()
+        with mock.patch.object(trending, 'flush_views') as flush:
+            trending.record_view(self.post)
+            timer = trending._views_timer
+            self.assertEqual(timer.interval, trending.VIEW_FLUSH_INTERVAL)
+            timer.cancel()
+            # As the timer would: in its own thread with its own connection
+            thread = threading.Thread(target=timer.function)
+            thread.start()
+            thread.join()
+        flush.assert_called_once_with()
+        trending._views.clear()
+        trending._views_timer = None
+
+    def test_views_are_flushed_in_batches(self):
+        """Views are buffered in memory and written in one batch."""
+        trending.flush_views()
+        before = PostTrend.objects.get(pk=self.post.pk).score
+        for _ in range(3):
+            self.client.get(
+                reverse('posts:post_detail', kwargs={'post_id': self.post.id}))
+        trending.flush_views()
+        self.assertAlmostEqual(
+            PostTrend.objects.get(pk=self.post.pk).score,
+            before + trending.TRENDING_WEIGHTS['view'] * 3)
@@ -0,0 +1,129 @@
+import fcntl
+import hashlib
+import os
+import shutil
+import tempfile
+from http import HTTPStatus
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..forms import PostForm
+from ..models import ImageUpload, Post
+from ..uploads import upload_path
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+TEMP_UPLOAD_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+User = get_user_model()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT,
+                   UPLOAD_TEMP_DIR=TEMP_UPLOAD_DIR)
+class ChunkedUploadTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        shutil.rmtree(TEMP_UPLOAD_DIR, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='TestUser')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def start(self, data=SMALL_GIF):
+        response = self.client.post(reverse('posts:upload_start'), {
+            'filename': 'chunked.gif',
+            'size': len(data),
+            'sha256': hashlib.sha256(data).hexdigest(),
+        })
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        return reverse('posts:upload_chunk', args=(response.json()['id'],))
+
+    def put(self, url, data, start):
+        end = start + len(data) - 1
+        return self.client.put(
+            url, data, content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{end}/{len(SMALL_GIF)}')
+
+    def test_resume_and_attach_to_post(self):
+        """Chunks resume from the stored offset and the file reaches a post."""
+        url = self.start()
+        self.assertEqual(self.put(url, SMALL_GIF[:10], 0).json()['offset'],
+                         10)
+        response = self.put(url, SMALL_GIF[:10], 0)
+        self.assertEqual(response.status_code, HTTPStatus.CONFLICT)
+        self.assertEqual(self.client.get(url).json()['offset'], 10)
+        self.assertTrue(self.put(url, SMALL_GIF[10:], 10).json()['complete'])
+        upload = ImageUpload.objects.get()
+        self.client.post(reverse('posts:create_post'),
+                         {'text': 'Кусками', 'upload': upload.id})
+        post = Post.objects.get(text='Кусками')
+        self.assertEqual(post.image.name, 'posts/chunked.gif')
+        with post.image.open('rb') as image:
+            self.assertEqual(image.read(), SMALL_GIF)
+        self.assertFalse(ImageUpload.objects.exists())
+        self.assertFalse(os.path.exists(upload_path(upload)))
+
+    def test_parts_are_not_served(self):
+        """Unfinished bytes live outside MEDIA_ROOT."""
+        url = self.start()
+        self.put(url, SMALL_GIF[:10], 0)
+        path = upload_path(ImageUpload.objects.get())
+        self.assertTrue(path.startswith(TEMP_UPLOAD_DIR))
+        self.assertFalse(os.listdir(TEMP_MEDIA_ROOT))
+
+    def test_chunk_being_written_is_locked(self):
+        """A chunk for a part another request is writing gets a 409."""
+        url = self.start()
+        upload = ImageUpload.objects.get()
+        with open(upload_path(upload), 'r+b') as part:
+            fcntl.flock(part, fcntl.LOCK_EX)
+            response = self.put(url, SMALL_GIF[:10], 0)
+        self.assertEqual(response.status_code, HTTPStatus.CONFLICT)
+        self.assertEqual(response.json()['offset'], 0)
+        self.assertEqual(os.path.getsize(upload_path(upload)), 0)
+        self.assertEqual(self.put(url, SMALL_GIF[:10], 0).json()['offset'],
+                         10)
+
+    def test_invalid_form_closes_the_part(self):
+        """A rejected post form leaves no open handle on the part file."""
+        url = self.start()
+        self.put(url, SMALL_GIF, 0)
+        form = PostForm({'text': '', 'upload': ImageUpload.objects.get().id},
+                        user=self.user)
+        self.assertFalse(form.is_valid())
+        self.assertIn('text', form.errors)
+        self.assertTrue(form.cleaned_data['image'].closed)
+
+    def test_checksum_mismatch(self):
+        """A file whose checksum does not match is discarded."""
+        url = self.start()
+        broken = b'X' + SMALL_GIF[1:]
+        response = self.put(url, broken, 0)
+        self.assertEqual(response.status_code,
+                         HTTPStatus.UNPROCESSABLE_ENTITY)
+        self.assertFalse(ImageUpload.objects.exists())
+
+    def test_incomplete_upload_rejected_by_form(self):
+        """The post form refuses an upload that is not finished."""
+        url = self.start()
+        self.put(url, SMALL_GIF[:10], 0)
+        response = self.client.post(
+            reverse('posts:create_post'),
+            {'text': 'Рано', 'upload': ImageUpload.objects.get().id})
+        self.assertTrue(response.context['form'].errors['image'])
+        self.assertFalse(Post.objects.filter(text='Рано').exists())
@@ -8,7 +8,9 @@ from django import forms
 from django.conf import settings
 from django.core.cache import cache
 
-from ..models import Post, Group, Comment, Follow
+from core.context_processors.paginator import NUMB_COMMENTS, encode_cursor
+from .. import follow_graph, trending
+from ..models import Post, Group, Comment, Follow, PostTrend
 
 TEST_OF_POST: int = 13
 FIRST_OF_POSTS: int = 10
@@ -51,6 +53,7 @@ class PostPagesTests(TestCase):
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
@@ -180,27 +183,20 @@ class PostPagesTests(TestCase):
         self.assertEqual(comment_1, new_comment)
 
     def test_index_cache(self):
-        """Test cache."""
+        """The index body is cached until a post changes."""
         new_post = Post.objects.create(
             text='Комментарий проверки кэша',
             author=self.user,
             group=self.group
         )
-        current_content = self.authorized_client.get(
-            reverse('posts:index')
-        ).content
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertTemplateUsed(response, 'posts/index.html')
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertTemplateNotUsed(response, 'posts/index.html')
+        self.assertContains(response, new_post.text)
         new_post.delete()
-        after_delete_post_content = self.authorized_client.get(
-            reverse('posts:index')
-        ).content
-        self.assertEqual(current_content, after_delete_post_content)
-        cache.clear()
-        after_clear_cache_content = self.authorized_client.get(
-            reverse('posts:index')
-        ).content
-        self.assertNotEqual(
-            current_content, after_clear_cache_content
-        )
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertNotContains(response, new_post.text)
 
 
 class PaginatorViewsTest(TestCase):
@@ -223,6 +219,7 @@ class PaginatorViewsTest(TestCase):
         Post.objects.bulk_create(cls.posts)
 
     def setUp(self):
+        cache.clear()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
 
@@ -258,6 +255,7 @@ class PaginatorViewsTest(TestCase):
 
 class FollowTests(TestCase):
     def setUp(self):
+        cache.clear()
         self.client_auth_follower = Client()
         self.client_auth_following = Client()
         self.user_follower = User.objects.create_user(username='follower',)
@@ -305,3 +303,299 @@ class FollowTests(TestCase):
         response = self.client_auth_follower.get('/follow/')
         post_text_0 = response.context["page_obj"][0].text
         self.assertEqual(post_text_0, self.post.text)
+
+
+class CommentsPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.user, text=f'Комментарий {i}')
+            for i in range(NUMB_COMMENTS + 5)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_first_page_is_bounded(self):
+        """Post_detail shows only the first portion of comments."""
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}))
+        comments = response.context['comments']
+        self.assertEqual(len(comments), NUMB_COMMENTS)
+        self.assertTrue(comments.has_next)
+
+    def test_next_page_by_cursor(self):
+        """The fragment endpoint continues after the cursor."""
+        first = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        ).context['comments']
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': self.post.id}),
+            {'cursor': first.next_cursor})
+        self.assertTemplateUsed(response, 'includes/comments.html')
+        second = response.context['comments']
+        self.assertEqual(len(second), 5)
+        self.assertFalse(second.has_next)
+        ids = {c.id for c in first} | {c.id for c in second}
+        self.assertEqual(len(ids), NUMB_COMMENTS + 5)
+
+    def test_json_format(self):
+        """The fragment endpoint returns JSON on request."""
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': self.post.id}),
+            {'format': 'json', 'cursor': 'broken'})
+        data = response.json()
+        self.assertEqual(len(data['results']), NUMB_COMMENTS)
+        self.assertIsNotNone(data['next'])
+
+    def test_out_of_range_cursor_starts_over(self):
+        """A cursor the database cannot hold is treated as broken."""
+        for values in (['2020-01-01T00:00:00', 10 ** 30],
+                       ['2020-01-01T00:00:00', [1]]):
+            with self.subTest(values=values):
+                response = self.client.get(
+                    reverse('posts:post_comments',
+                            kwargs={'post_id': self.post.id}),
+                    {'format': 'json', 'cursor': encode_cursor(values)})
+                self.assertEqual(len(response.json()['results']),
+                                 NUMB_COMMENTS)
+
+
+class FollowGraphTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='follower')
+        self.authors = [User.objects.create_user(username=f'author{i}')
+                        for i in range(3)]
+
+    def test_membership_for_many_authors(self):
+        """Membership for many authors is answered from one cached set."""
+        follow_graph.follow(self.user.id, self.authors[0].id)
+        follow_graph.follow(self.user.id, self.authors[2].id)
+        ids = [author.id for author in self.authors]
+        cache.clear()
+        with self.assertNumQueries(1):
+            followed = follow_graph.following_among(self.user.id, ids)
+            follow_graph.is_following(self.user.id, ids[0])
+        self.assertEqual(followed, {ids[0], ids[2]})
+
+    def test_follow_is_idempotent_and_incremental(self):
+        """Repeated follow keeps one row and cached sets stay current."""
+        author = self.authors[0]
+        self.assertEqual(list(follow_graph.followers(author.id)), [])
+        follow_graph.follow(self.user.id, author.id)
+        follow_graph.follow(self.user.id, author.id)
+        self.assertEqual(Follow.objects.count(), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(list(follow_graph.followers(author.id)),
+                             [self.user.id])
+        follow_graph.unfollow(self.user.id, author.id)
+        follow_graph.unfollow(self.user.id, author.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(list(follow_graph.followers(author.id)), [])
+
+    def test_follow_decides_by_row_not_cache(self):
+        """A stale cached set neither skips nor repeats a follow."""
+        author = self.authors[0]
+        follow_graph.follow(self.user.id, author.id)
+        Follow.objects.all().delete()
+        # The cache now claims a follow that the table no longer has
+        cache.set(follow_graph._key(follow_graph.FOLLOWING, self.user.id),
+                  follow_graph.array('q', [author.id]).tobytes())
+        follow_graph.follow(self.user.id, author.id)
+        self.assertTrue(Follow.objects.filter(user=self.user,
+                                              author=author).exists())
+
+    def test_contended_update_drops_cached_set(self):
+        """If another writer holds the lock, the set is reloaded later."""
+        author = self.authors[0]
+        key = follow_graph._key(follow_graph.FOLLOWERS, author.id)
+        follow_graph.followers(author.id)
+        cache.add(f'{key}:lock', True)
+        follow_graph.follow(self.user.id, author.id)
+        self.assertIsNone(cache.get(key))
+        cache.delete(f'{key}:lock')
+        self.assertEqual(list(follow_graph.followers(author.id)),
+                         [self.user.id])
+
+
+@override_settings(FEED_STREAMING=True)
+class FeedStreamingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='streamer')
+        self.group = Group.objects.create(title='Поток', slug='stream')
+        for i in range(3):
+            # create() rather than bulk_create(): previews are set on save
+            Post.objects.create(author=self.user, group=self.group,
+                                text=f'Пост {i}')
+        self.client = Client()
+
+    def test_feeds_stream(self):
+        """Feeds are streamed with every post on the page."""
+        for url in (reverse('posts:index'),
+                    reverse('posts:group_list', args=(self.group.slug,)),
+                    reverse('posts:profile', args=(self.user.username,))):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertTrue(response.streaming)
+                body = b''.join(response.streaming_content).decode()
+                for i in range(3):
+                    self.assertIn(f'Пост {i}', body)
+                self.assertEqual(body.count('<hr>'), 2)
+                self.assertIn('</html>', body)
+
+    def test_shell_is_first_chunk(self):
+        """The page head is sent before any post is rendered."""
+        response = self.client.get(reverse('posts:index'))
+        first = next(iter(response.streaming_content)).decode()
+        self.assertIn('<head>', first)
+        self.assertNotIn('Пост', first)
+
+    def test_posts_read_in_one_query(self):
+        """Posts come with authors and groups from a single query."""
+        response = self.client.get(reverse('posts:index'))
+        with self.assertNumQueries(1):
+            b''.join(list(response.streaming_content)[1:])
+
+
+class FeedPreviewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='writer')
+        self.long_post = Post.objects.create(author=self.user,
+                                             text='длинный ' * 2000)
+        self.client = Client()
+
+    def test_feed_shows_preview_without_full_text(self):
+        """Feeds defer the full text and link to the post instead."""
+        response = self.client.get(reverse('posts:profile',
+                                           args=(self.user.username,)))
+        post = response.context['page_obj'][0]
+        self.assertIn('text', post.get_deferred_fields())
+        self.assertContains(response, self.long_post.preview)
+        self.assertNotContains(response, self.long_post.text)
+        self.assertContains(response, 'читать дальше')
+        response = self.client.get(reverse('posts:post_detail',
+                                           args=(self.long_post.pk,)))
+        self.assertContains(response, self.long_post.text)
+
+    def test_post_without_preview_shows_text(self):
+        """Posts saved without signals fall back to their text."""
+        Post.objects.bulk_create([Post(author=self.user,
+                                       text='Импортированный пост')])
+        response = self.client.get(reverse('posts:profile',
+                                           args=(self.user.username,)))
+        self.assertContains(response, 'Импортированный пост')
+
+
+class SharedPageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.post = Post.objects.create(author=self.author, text='Общий пост')
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_body_is_shared_fragments_are_personal(self):
+        """Logged-in users get the anonymous page body plus own fragments."""
+        url = reverse('posts:post_detail', args=(self.post.pk,))
+        anonymous = self.client.get(url)
+        self.assertTemplateUsed(anonymous, 'posts/post_detail.html')
+        self.assertNotContains(anonymous, 'csrfmiddlewaretoken')
+        author = self.author_client.get(url)
+        self.assertTemplateNotUsed(author, 'posts/post_detail.html')
+        self.assertContains(author, 'Пользователь: author')
+        self.assertContains(author, 'редактировать запись')
+        self.assertContains(author, 'csrfmiddlewaretoken')
+        reader = self.reader_client.get(url)
+        self.assertContains(reader, 'Пользователь: reader')
+        self.assertNotContains(reader, 'редактировать запись')
+        self.assertNotContains(reader, '<esi:include')
+
+    def test_writes_invalidate_bodies(self):
+        self.reader_client.get(reverse('posts:index'))
+        Post.objects.create(author=self.author, text='Свежий пост')
+        response = self.reader_client.get(reverse('posts:profile',
+                                                  args=('author',)))
+        self.assertContains(response, 'Свежий пост')
+        self.assertContains(response, 'Подписаться')
+
+    def test_writes_invalidate_only_their_pages(self):
+        """A comment drops its post page, not the feeds or other posts."""
+        other = Post.objects.create(author=self.reader, text='Другой пост')
+        pages = {
+            reverse('posts:index'): 'posts/index.html',
+            reverse('posts:profile', args=('reader',)): 'posts/profile.html',
+            reverse('posts:post_detail', args=(other.pk,)):
+                'posts/post_detail.html',
+        }
+        for url in pages:
+            self.client.get(url)
+        post_url = reverse('posts:post_detail', args=(self.post.pk,))
+        self.client.get(post_url)
+        Comment.objects.create(post=self.post, author=self.reader,
+                               text='Свежий комментарий')
+        for url, template in pages.items():
+            with self.subTest(url=url):
+                self.assertTemplateNotUsed(self.client.get(url), template)
+        self.assertContains(self.client.get(post_url), 'Свежий комментарий')
+
+    def test_fragment_params_are_checked(self):
+        """Unknown, missing or malformed params get 400, not a 500."""
+        bad = (
+            ('header', {'foo': '1'}),
+            ('post_tools', {}),
+            ('post_tools', {'post': 'abc'}),
+            ('profile_tools', {'author': 'abc', 'username': 'author'}),
+        )
+        for name, params in bad:
+            with self.subTest(name=name, params=params):
+                response = self.reader_client.get(
+                    reverse('fragment', args=(name,)), params)
+                self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse('fragment', args=('missing',)))
+        self.assertEqual(response.status_code, 404)
+        response = self.reader_client.get(
+            reverse('fragment', args=('profile_tools',)),
+            {'author': self.author.pk, 'username': 'author'})
+        self.assertContains(response, 'Подписаться')
+
+    def test_views_are_counted_by_page_not_fragment(self):
+        """Cached page hits count; fetching the fragment alone does not."""
+        # Views buffered by earlier tests point at rolled back posts
+        trending._views.clear()
+        url = reverse('posts:post_detail', args=(self.post.pk,))
+        self.client.get(url)
+        trending.flush_views()
+        before = PostTrend.objects.get(pk=self.post.pk).score
+        for _ in range(3):
+            self.client.get(reverse('fragment', args=('post_tools',)),
+                            {'post': self.post.pk})
+        trending.flush_views()
+        self.assertEqual(PostTrend.objects.get(pk=self.post.pk).score,
+                         before)
+        self.client.get(url)
+        trending.flush_views()
+        self.assertAlmostEqual(
+            PostTrend.objects.get(pk=self.post.pk).score,
+            before + trending.TRENDING_WEIGHTS['view'])
+
+    @override_settings(FRAGMENTS_ESI=True)
+    def test_edge_assembles_fragments(self):
+        """With an ESI proxy in front, includes are left for it to fetch."""
+        response = self.reader_client.get(
+            reverse('posts:index'),
+            HTTP_SURROGATE_CAPABILITY='edge="ESI/1.0"')
+        self.assertContains(response, '<esi:include src="/fragments/header/')
+        self.assertEqual(response['Surrogate-Control'], 'content="ESI/1.0"')
+        response = self.reader_client.get(
+            reverse('fragment', args=('header',)), {'view': 'posts:index'})
+        self.assertContains(response, 'Пользователь: reader')
+        self.assertIn('private', response['Cache-Control'])
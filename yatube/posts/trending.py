@@ -0,0 +1,204 @@
+"""Тренды: очки постов и групп с экспоненциальным затуханием.
+
+Каждое событие прибавляет вес к очкам одним UPDATE, а команда
+decay_trending периодически умножает все очки на коэффициент
+затухания. Топ читается одним запросом по индексу на score.
+
+Просмотры копятся в памяти процесса и пишутся пачкой: по числу, по
+таймеру, если новых просмотров нет, и при выходе процесса.
+"""
+import atexit
+import os
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.db import immediate
+from core.replicas import side_effect_writes
+
+from . import sharding
+from .models import Comment, Group, GroupTrend, Post, PostTrend, TrendDecay
+
+TRENDING_WEIGHTS = getattr(settings, 'TRENDING_WEIGHTS', {
+    'view': 0.1,
+    'comment': 3.0,
+    'follow': 2.0,
+    'post': 1.0,
+})
+TRENDING_HALF_LIFE = getattr(settings, 'TRENDING_HALF_LIFE', 6 * 60 * 60)
+# Через сколько секунд очки события уменьшаются вдвое
+TRENDING_MIN_SCORE = 0.01
+# Меньшие очки после затухания обнуляются
+VIEW_FLUSH_SIZE = 50
+VIEW_FLUSH_INTERVAL = 30
+# Просмотры копятся в процессе и пишутся пачкой по числу или времени
+TRENDING_GROUPS = 5
+
+_views = Counter()
+_views_lock = threading.Lock()
+_views_flushed = time.monotonic()
+_views_timer = None
+_views_database = None
+
+
+def _bump(model, pk, weight):
+    rows = model.objects.filter(pk=pk)
+    # Очки трендов не повод читать с основной базы
+    with side_effect_writes():
+        if not rows.update(score=F('score') + weight):
+            model.objects.bulk_create([model(pk=pk)], ignore_conflicts=True)
+            rows.update(score=F('score') + weight)
+
+
+def record(post_id, group_id, event, times=1):
+    weight = TRENDING_WEIGHTS[event] * times
+    _bump(PostTrend, post_id, weight)
+    if group_id is not None:
+        _bump(GroupTrend, group_id, weight)
+
+
+def record_view(post):
+    """Копит просмотр в памяти процесса, чтобы не писать на каждый GET."""
+    global _views_database
+    with _views_lock:
+        _views[(post.id, post.group_id)] += 1
+        _views_database = connections['default'].settings_dict['NAME']
+        due = (sum(_views.values()) >= VIEW_FLUSH_SIZE
+               or time.monotonic() - _views_flushed >= VIEW_FLUSH_INTERVAL)
+        if not due:
+            _schedule_flush()
+    if due:
+        flush_views()
+
+
+def _schedule_flush():
+    """Таймер на случай, если новых просмотров не будет; под _views_lock."""
+    global _views_timer
+    if _views_timer is None:
+        _views_timer = threading.Timer(VIEW_FLUSH_INTERVAL,
+                                       _flush_in_background)
+        _views_timer.daemon = True
+        _views_timer.start()
+
+
+def _flush_in_background():
+    try:
+        flush_views()
+    except DatabaseError:
+        # Просмотры остались в буфере, их запишет следующий сброс
+        pass
+    finally:
+        # Соединения этого потока
+        connections.close_all()
+
+
+def flush_views():
+    """Пишет накопленные просмотры одной транзакцией."""
+    global _views_flushed, _views_timer
+    with _views_lock:
+        pending = dict(_views)
+        _views.clear()
+        _views_flushed = time.monotonic()
+        if _views_timer is not None:
+            _views_timer.cancel()
+            _views_timer = None
+    try:
+        with transaction.atomic():
+            for (post_id, group_id), count in pending.items():
+                record(post_id, group_id, 'view', count)
+    except DatabaseError:
+        with _views_lock:
+            _views.update(pending)
+        raise
+
+
+@atexit.register
+def _flush_at_exit():
+    # После тестов настройки снова указывают на рабочую базу, а
+    # просмотры копились в тестовой
+    database = connections['default'].settings_dict['NAME']
+    if _views and database == _views_database:
+        try:
+            flush_views()
+        except Exception:
+            # Базы к выходу может уже не быть, а процесс всё равно завершается
+            pass
+
+
+def _forget_views():
+    # Просмотры и таймер мастера воркеру не достаются
+    global _views_timer
+    _views.clear()
+    _views_timer = None
+
+
+os.register_at_fork(after_in_child=_forget_views)
+
+
+def record_follow(author_id):
+    """Новый подписчик поднимает последний пост автора."""
+    post = (sharding.author_posts(author_id)
+            .order_by('-pub_date').values('id', 'group_id').first())
+    if post is not None:
+        record(post['id'], post['group_id'], 'follow')
+
+
+def decay(elapsed=None):
+    """Затухание за elapsed секунд одним UPDATE на таблицу.
+
+    По умолчанию elapsed — время с прошлого затухания из TrendDecay;
+    самый первый запуск только ставит отметку.
+    """
+    with immediate():
+        now = timezone.now()
+        mark, _ = TrendDecay.objects.select_for_update().get_or_create(
+            pk=1, defaults={'decayed': now})
+        if elapsed is None:
+            elapsed = max((now - mark.decayed).total_seconds(), 0)
+        TrendDecay.objects.filter(pk=1).update(decayed=now)
+        factor = 0.5 ** (elapsed / TRENDING_HALF_LIFE)
+        for model in (PostTrend, GroupTrend):
+            model.objects.filter(score__gt=0).update(score=F('score') * factor)
+            model.objects.filter(
+                score__gt=0, score__lt=TRENDING_MIN_SCORE).update(score=0)
+    return factor
+
+
+def trending_post_ids():
+    """id постов по убыванию очков; сами посты могут лежать в шардах."""
+    return (PostTrend.objects.filter(score__gt=0)
+            .order_by('-score', '-post_id')
+            .values_list('post_id', flat=True))
+
+
+def trending_groups(count=TRENDING_GROUPS):
+    return list(Group.objects.filter(trend__score__gt=0)
+                .order_by('-trend__score')[:count])
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        record(instance.id, instance.group_id, 'post')
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        group_id = (sharding.post_queryset(instance.post_id)
+                    .filter(pk=instance.post_id)
+                    .values_list('group_id', flat=True).first())
+        record(instance.post_id, group_id, 'comment')
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    """Очки поста лежат в default, каскад из шарда до них не дойдёт."""
+    PostTrend.objects.filter(pk=instance.pk).delete()
@@ -0,0 +1,191 @@
+"""Докачиваемая загрузка картинок кусками.
+
+Клиент объявляет файл (имя, размер, sha256) и получает id загрузки, затем
+шлёт куски PUT-запросами с Content-Range. Каждый кусок дописывается во
+временный файл блоками по UPLOAD_BLOCK_SIZE, так что ни запрос, ни память
+не зависят от размера картинки. Временные файлы лежат в UPLOAD_TEMP_DIR,
+а не в MEDIA_ROOT: непроверенные байты не должны отдаваться как медиа.
+Пока кусок пишется, файл заперт flock: параллельный кусок получает 409.
+После обрыва клиент узнаёт смещение GET-запросом и продолжает с него.
+Когда файл собран, сверяется контрольная сумма, а id загрузки передаётся
+в PostForm вместо самого файла.
+"""
+import fcntl
+import hashlib
+import os
+import re
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.core.files import File
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.views.decorators.http import require_POST
+
+from .models import ImageUpload
+
+UPLOAD_MAX_SIZE = getattr(settings, 'UPLOAD_MAX_SIZE', 20 * 1024 * 1024)
+UPLOAD_CHUNK_MAX_SIZE = 4 * 1024 * 1024
+UPLOAD_BLOCK_SIZE = 64 * 1024
+UPLOAD_TTL = 24 * 60 * 60
+# Незавершённые загрузки старше суток удаляет manage.py gc_media
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+class UploadedPart(File):
+    """Собранный файл; хранилище на диске переносит его без копирования."""
+
+    def temporary_file_path(self):
+        return self.file.name
+
+    def open(self, mode='rb'):
+        # Форма закрывает файл сразу после проверки, а перед сохранением
+        # его ещё читают: открывается заново по пути, а не по имени
+        if self.closed:
+            self.file = open(self.file.name, mode)
+        else:
+            self.seek(0)
+        return self
+
+
+def upload_dir():
+    return getattr(settings, 'UPLOAD_TEMP_DIR', None) or os.path.join(
+        tempfile.gettempdir(), 'yatube-uploads')
+
+
+def upload_path(upload):
+    return os.path.join(upload_dir(), f'{upload.id}.part')
+
+
+def as_file(upload):
+    return UploadedPart(open(upload_path(upload), 'rb'),
+                        name=upload.filename)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(UPLOAD_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def append_chunk(file, offset, stream, length):
+    """Пишет length байт из stream с offset; возвращает сколько записано."""
+    written = 0
+    file.seek(offset)
+    # Хвост от прерванного куска перезаписывается
+    file.truncate()
+    while written < length:
+        block = stream.read(min(UPLOAD_BLOCK_SIZE, length - written))
+        if not block:
+            break
+        file.write(block)
+        written += len(block)
+    return written
+
+
+def discard(upload):
+    try:
+        os.remove(upload_path(upload))
+    except FileNotFoundError:
+        pass
+    upload.delete()
+
+
+def discard_stale(max_age=UPLOAD_TTL, dry_run=False):
+    """Удаляет незавершённые загрузки; возвращает их число и объём."""
+    border = timezone.now() - timedelta(seconds=max_age)
+    stale = list(ImageUpload.objects.filter(created__lt=border))
+    if not dry_run:
+        for upload in stale:
+            discard(upload)
+    return len(stale), sum(upload.received for upload in stale)
+
+
+def state(upload, status=200):
+    return JsonResponse({
+        'id': str(upload.id),
+        'offset': upload.received,
+        'size': upload.size,
+        'complete': upload.complete,
+    }, status=status)
+
+
+def error(message, status=400):
+    return JsonResponse({'error': message}, status=status)
+
+
+def chunk_range(request, upload):
+    """(начало, длина) куска из Content-Range или ответ с ошибкой."""
+    match = CONTENT_RANGE_RE.match(request.META.get('HTTP_CONTENT_RANGE', ''))
+    if not match:
+        return error('Нужен заголовок Content-Range')
+    start, end, total = map(int, match.groups())
+    length = end - start + 1
+    if total != upload.size or end >= total or length <= 0:
+        return error('Диапазон не совпадает с файлом')
+    if length > UPLOAD_CHUNK_MAX_SIZE:
+        return error('Кусок слишком большой', status=413)
+    return start, length
+
+
+@login_required
+@require_POST
+def upload_start(request):
+    filename = os.path.basename(request.POST.get('filename', ''))
+    sha256 = request.POST.get('sha256', '').lower()
+    try:
+        size = int(request.POST.get('size', ''))
+    except ValueError:
+        return error('Не указан размер файла')
+    if not filename or size <= 0 or not SHA256_RE.match(sha256):
+        return error('Нужны имя, размер и sha256 файла')
+    if size > UPLOAD_MAX_SIZE:
+        return error('Файл слишком большой', status=413)
+    upload = ImageUpload.objects.create(user=request.user, filename=filename,
+                                        size=size, sha256=sha256)
+    os.makedirs(os.path.dirname(upload_path(upload)), exist_ok=True)
+    open(upload_path(upload), 'wb').close()
+    return state(upload, status=201)
+
+
+@login_required
+def upload_chunk(request, upload_id):
+    upload = get_object_or_404(ImageUpload, pk=upload_id, user=request.user)
+    if request.method in ('GET', 'HEAD'):
+        return state(upload)
+    if request.method not in ('PUT', 'POST'):
+        return error('Метод не поддерживается', status=405)
+    chunk = chunk_range(request, upload)
+    if isinstance(chunk, JsonResponse):
+        return chunk
+    start, length = chunk
+    with open(upload_path(upload), 'r+b') as part:
+        try:
+            fcntl.flock(part, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            # Другой кусок пишется прямо сейчас
+            return state(upload, status=409)
+        # Смещение перечитывается под замком: кусок до нас мог его сдвинуть
+        upload.refresh_from_db()
+        if upload.complete or start != upload.received:
+            # Клиент продолжит с offset из ответа
+            return state(upload, status=409)
+        written = append_chunk(part, start, request, length)
+        if written != length:
+            return error('Кусок оборвался')
+        ImageUpload.objects.filter(pk=upload.pk).update(
+            received=start + written)
+        upload.received = start + written
+    if upload.received == upload.size:
+        if file_sha256(upload_path(upload)) != upload.sha256:
+            discard(upload)
+            return error('Контрольная сумма не совпала', status=422)
+        upload.complete = True
+        upload.save(update_fields=['complete'])
+    return state(upload)
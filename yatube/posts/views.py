@@ -1,72 +1,166 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.http import JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-from core.context_processors.paginator import paginator
-from .models import Post, Group, Follow
+from core.context_processors.paginator import paginator, keyset_paginator
+from core.fragments import shared_page
+from core.ratelimit import ratelimit
+from core.replicas import replica_reads
+from core.streaming import stream_render
+from . import (follow_graph, ranking, sharding, suggestions, trending,
+               uploads)
+from .models import Follow, Group
 from .forms import PostForm, CommentForm
+from .tasks import warm_thumbnail
 
 User = get_user_model()
 
 
+def feed_posts(posts):
+    """Посты ленты: со связями и без полного текста, хватает preview."""
+    return sharding.with_relations(posts, 'author', 'group').defer(
+        'text').order_by('-pub_date')
+
+
+def index_post_list():
+    return feed_posts(sharding.all_posts())
+
+
+def group_post_list(group):
+    return feed_posts(sharding.all_posts().filter(group_id=group.id))
+
+
+def profile_post_list(author):
+    return feed_posts(sharding.author_posts(author.id))
+
+
+def follow_post_list(user):
+    # Подписки лежат в default: подзапрос в шард не пройдёт
+    following = list(Follow.objects.filter(user_id=user.id)
+                     .values_list('author_id', flat=True))
+    return feed_posts(sharding.all_posts().filter(author_id__in=following))
+
+
+def render_feed(request, template_name, context, **item_context):
+    """Лента целиком или потоком, если включён FEED_STREAMING."""
+    if not getattr(settings, 'FEED_STREAMING', False):
+        return render(request, template_name, context)
+    return stream_render(request, template_name, context,
+                         context['page_obj'].object_list,
+                         'includes/content_post.html', 'post', item_context)
+
+
+@replica_reads
+@shared_page('index')
 def index(request):
-    post_list = Post.objects.all().order_by('-pub_date')
+    post_list = index_post_list()
     page_obj = paginator(request, post_list)
     context = {
         'page_obj': page_obj,
     }
-    return render(request, 'posts/index.html', context)
+    return render_feed(request, 'posts/index.html', context,
+                       link_group=True, show_author=True)
 
 
+@replica_reads
+@shared_page('trending')
+def trending_index(request):
+    page_obj = paginator(request, trending.trending_post_ids())
+    page_obj.object_list = ranking.posts_in_order(page_obj.object_list)
+    context = {
+        'page_obj': page_obj,
+        'groups': trending.trending_groups(),
+    }
+    return render_feed(request, 'posts/trending.html', context,
+                       link_group=True, show_author=True)
+
+
+@replica_reads
+@shared_page('group:{slug}')
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
+    post_list = group_post_list(group)
     page_obj = paginator(request, post_list)
     context = {
         'group': group,
         'page_obj': page_obj,
     }
-    return render(request, 'posts/group_list.html', context)
+    return render_feed(request, 'posts/group_list.html', context,
+                       link_group=False, show_author=True)
 
 
+@replica_reads
+@shared_page('author:{username}')
 def profile(request, username):
     author = get_object_or_404(User, username=username)
-    post_list = Post.objects.filter(author=author)
+    post_list = profile_post_list(author)
     page_obj = paginator(request, post_list)
-    following = request.user.is_authenticated and Follow.objects.filter(
-        user=request.user, author=author).exists()
+    # Подписка и рекомендации — во фрагменте posts.fragments.profile_tools
     context = {
         'page_obj': page_obj,
         'author': author,
-        'following': following,
     }
-    return render(request, 'posts/profile.html', context)
+    return render_feed(request, 'posts/profile.html', context,
+                       link_group=False, show_author=False)
+
+
+def comments_page(request, post):
+    """Первая или следующая по курсору порция комментариев поста."""
+    comments = sharding.with_relations(post.comments, 'author')
+    return keyset_paginator(comments, request.GET.get('cursor'))
 
 
+@replica_reads
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    """Учёт просмотра здесь, до кэша: тело страницы берётся из кэша."""
+    response = post_detail_page(request, post_id=post_id)
+    if request.method == 'GET' and response.status_code == 200:
+        post = (sharding.post_queryset(post_id).filter(pk=post_id)
+                .only('id', 'group_id').first())
+        if post is not None:
+            trending.record_view(post)
+    return response
+
+
+@shared_page('post:{post_id}')
+def post_detail_page(request, post_id):
+    post = get_object_or_404(sharding.post_queryset(post_id), id=post_id)
     post_count = post.author.posts.count()
     author = post.author
-    comments = post.comments.all()
-    form = CommentForm(request.POST)
+    comments = comments_page(request, post)
+    # Форма комментария и кнопка автора — во фрагменте
+    # posts.fragments.post_tools: тело страницы общее и кэшируется
     context = {
         'post': post,
         'post_count': post_count,
         'author': author,
-        'form': form,
         'comments': comments
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def finish_upload(form):
+    """Убирает загрузку, файл которой уже перенесён в картинку поста."""
+    if form.upload is not None:
+        form.cleaned_data['image'].close()
+        uploads.discard(form.upload)
+
+
 @login_required
+@ratelimit('post_create', '10/m', methods=('POST',))
 def post_create(request):
     if request.method == 'POST':
         form = PostForm(request.POST,
-                        files=request.FILES or None)
+                        files=request.FILES or None,
+                        user=request.user)
         if form.is_valid():
             post = form.save(commit=False)
             post.author = request.user
             post.save()
+            finish_upload(form)
+            if post.image:
+                warm_thumbnail.delay(post.id)
             return redirect('posts:profile', username=post.author.username)
         return render(request, 'posts/create_post.html', {'form': form})
     form = PostForm()
@@ -80,12 +174,13 @@ def post_create(request):
 
 @login_required
 def post_edit(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(sharding.post_queryset(post_id), id=post_id)
     if request.user != post.author:
         return redirect('posts:post_detail', post_id=post.id)
     form = PostForm(request.POST or None,
                     files=request.FILES or None,
-                    instance=post)
+                    instance=post,
+                    user=request.user)
     is_edit = True
     context = {
         'form': form,
@@ -95,13 +190,18 @@ def post_edit(request, post_id):
     if request.method == 'POST':
         if form.is_valid():
             form.save()
+            finish_upload(form)
+            if (('image' in form.changed_data or form.upload)
+                    and post.image):
+                warm_thumbnail.delay(post.id)
             return redirect('posts:post_detail', post_id=post.id)
     return render(request, 'posts/create_post.html', context)
 
 
 @login_required
+@ratelimit('add_comment', '20/m', methods=('POST',))
 def add_comment(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(sharding.post_queryset(post_id), pk=post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
@@ -112,38 +212,69 @@ def add_comment(request, post_id):
     context = {
         'form': form,
         'post': post,
+        'comments': comments_page(request, post),
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@replica_reads
+def post_comments(request, post_id):
+    post = get_object_or_404(sharding.post_queryset(post_id).only('id'),
+                             pk=post_id)
+    comments = comments_page(request, post)
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'results': [
+                {
+                    'id': comment.id,
+                    'author': comment.author and comment.author.username,
+                    'text': comment.text,
+                    'created': comment.created,
+                }
+                for comment in comments
+            ],
+            'next': comments.next_cursor,
+        })
+    context = {
+        'post': post,
+        'comments': comments,
+    }
+    return render(request, 'includes/comments.html', context)
+
+
 @login_required
+@replica_reads
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
+    posts = follow_post_list(request.user)
     page_obj = paginator(request, posts)
     context = {
-        'page_obj': page_obj
+        'page_obj': page_obj,
+        'suggestions': suggestions.suggested_authors(request.user),
     }
-    return render(request, 'posts/follow.html', context)
+    return render_feed(request, 'posts/follow.html', context,
+                       link_group=True, show_author=True)
 
 
 @login_required
+@replica_reads
+def follow_ranked(request):
+    page_obj = paginator(request, ranking.ranked_post_ids(request.user))
+    page_obj.object_list = ranking.posts_in_order(page_obj.object_list)
+    context = {
+        'page_obj': page_obj,
+        'ranked': True,
+        'suggestions': suggestions.suggested_authors(request.user),
+    }
+    return render_feed(request, 'posts/follow.html', context,
+                       link_group=True, show_author=True)
+
+
+@login_required
+@ratelimit('profile_follow', '60/m')
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
-    if author == request.user:
-        return redirect(
-            'posts:profile',
-            username=username
-        )
-    follower = Follow.objects.filter(
-        user=request.user,
-        author=author
-    ).exists()
-    if follower is True:
-        return redirect(
-            'posts:profile',
-            username=username
-        )
-    Follow.objects.create(user=request.user, author=author)
+    if author != request.user:
+        follow_graph.follow(request.user.id, author.id)
     return redirect(
         'posts:profile',
         username=username
@@ -153,12 +284,7 @@ def profile_follow(request, username):
 @login_required
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
-    follower = Follow.objects.filter(
-        user=request.user,
-        author=author,
-    )
-    if follower.exists():
-        follower.delete()
+    follow_graph.unfollow(request.user.id, author.id)
     return redirect(
         'posts:profile',
         author.username
@@ -3,3 +3,13 @@ from django.apps import AppConfig
 
 class UsersConfig(AppConfig):
     name = 'users'
+
+    def ready(self):
+        from django.contrib.auth.models import update_last_login
+        from django.contrib.auth.signals import user_logged_in
+
+        from . import signals  # noqa: F401
+        # Его заменяет signals.update_last_login. Приёмник auth подключается
+        # в её ready, поэтому users стоит в INSTALLED_APPS после auth
+        user_logged_in.disconnect(update_last_login,
+                                  dispatch_uid='update_last_login')
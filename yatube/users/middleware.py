@@ -0,0 +1,24 @@
+from django.contrib.auth import BACKEND_SESSION_KEY
+
+# Бэкенды, записанные в сессии до users.backends.CachedModelBackend
+LEGACY_BACKENDS = {
+    'django.contrib.auth.backends.ModelBackend':
+        'users.backends.CachedModelBackend',
+}
+
+
+class LegacySessionBackendMiddleware:
+    """Переводит старые сессии на текущий бэкенд вместо выхода из них.
+
+    auth.get_user отвергает сессию, чей бэкенд не указан в
+    AUTHENTICATION_BACKENDS. Стоит до AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        backend = request.session.get(BACKEND_SESSION_KEY)
+        if backend in LEGACY_BACKENDS:
+            request.session[BACKEND_SESSION_KEY] = LEGACY_BACKENDS[backend]
+        return self.get_response(request)
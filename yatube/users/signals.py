@@ -0,0 +1,31 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth import models as auth_models
+from django.contrib.auth.signals import user_logged_in, user_logged_out
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.replicas import side_effect_writes
+
+from .backends import invalidate_user
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def drop_cached_user(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
+
+
+@receiver(user_logged_out)
+def drop_cached_user_on_logout(sender, request, user, **kwargs):
+    if user is not None:
+        invalidate_user(user.pk)
+
+
+# Заменяет приёмник django.contrib.auth, его отключает UsersConfig.ready
+@receiver(user_logged_in)
+def update_last_login(sender, user, **kwargs):
+    """last_login не закрепляет вошедшего за основной базой."""
+    with side_effect_writes():
+        auth_models.update_last_login(sender, user, **kwargs)
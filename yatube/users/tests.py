@@ -0,0 +1,65 @@
+from django.contrib.auth import BACKEND_SESSION_KEY, get_user_model
+from django.contrib.auth import models as auth_models
+from django.contrib.auth.signals import user_logged_in
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import signals
+from .backends import user_cache_key
+
+User = get_user_model()
+
+
+class CachedUserBackendTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='TestUser',
+                                             password='old-pass-123')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def auth_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('about:author'))
+        return response, [q for q in queries if 'auth_user' in q['sql']]
+
+    def test_user_is_served_from_cache(self):
+        """The second request does not query auth_user."""
+        self.auth_queries()
+        response, queries = self.auth_queries()
+        self.assertTrue(response.context['user'].is_authenticated)
+        self.assertEqual(queries, [])
+
+    def test_password_change_drops_session(self):
+        """A changed password invalidates the cached user and session."""
+        self.auth_queries()
+        self.user.set_password('new-pass-456')
+        self.user.save()
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+        response, _ = self.auth_queries()
+        self.assertFalse(response.context['user'].is_authenticated)
+
+    def test_logout_clears_cache(self):
+        self.auth_queries()
+        self.client.get(reverse('users:logout'))
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+
+    def test_sessions_with_old_backend_stay_logged_in(self):
+        """Sessions issued with ModelBackend move to the cached backend."""
+        session = self.client.session
+        session[BACKEND_SESSION_KEY] = (
+            'django.contrib.auth.backends.ModelBackend')
+        session.save()
+        response, _ = self.auth_queries()
+        self.assertTrue(response.context['user'].is_authenticated)
+        self.assertEqual(self.client.session[BACKEND_SESSION_KEY],
+                         'users.backends.CachedModelBackend')
+
+    def test_last_login_receiver_is_replaced(self):
+        """Only the users receiver updates last_login on login."""
+        receivers = [ref() for _, ref in user_logged_in.receivers]
+        self.assertNotIn(auth_models.update_last_login, receivers)
+        self.assertIn(signals.update_last_login, receivers)
@@ -0,0 +1,28 @@
+"""
+WSGI-приложение, прогретое до форка воркеров.
+
+Для серверов, которые загружают приложение в мастере и потом форкают
+воркеры:
+
+    gunicorn yatube.preload:application --preload --workers 4
+    uwsgi --module yatube.preload:application --master --processes 4
+
+Сравнение с yatube.wsgi — manage.py benchmark_startup.
+"""
+
+import gc
+import os
+
+from django.core.wsgi import get_wsgi_application
+
+from core.preload import freeze, warm_up
+
+# Проходы сборщика во время загрузки оставляли бы в страницах дыры,
+# которые воркеры заполнят своими объектами и скопируют страницы
+gc.disable()
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+application = get_wsgi_application()
+warm_up(application)
+freeze()
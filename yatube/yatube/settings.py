@@ -45,10 +45,11 @@ CACHES = {
 INSTALLED_APPS = [
     'about.apps.AboutConfig',
     'core.apps.CoreConfig',
-    'users.apps.UsersConfig',
     'posts.apps.PostsConfig',
     'django.contrib.admin',
     'django.contrib.auth',
+    # После auth: UsersConfig.ready отключает её приёмник last_login
+    'users.apps.UsersConfig',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
@@ -59,11 +60,19 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.staticfiles.StaticFilesMiddleware',
+    'core.compression.CompressionMiddleware',
+    'core.replicas.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
+    # Сессии со старым ModelBackend остаются в силе
+    'users.middleware.LegacySessionBackendMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    # После сессий, авторизации и CSRF: фрагменты рендерятся для
+    # текущего пользователя, а выданный в них CSRF-токен попадёт в cookie
+    'core.fragments.FragmentMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -93,17 +102,66 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Передача отдачи медиа прокси: None, 'x-sendfile' или 'x-accel-redirect'.
+# Для nginx MEDIA_ACCEL_PREFIX должен вести на internal location с MEDIA_ROOT
+MEDIA_SENDFILE = None
+
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+
+# Недокачанные куски загрузок (posts.uploads); вне MEDIA_ROOT, не отдаются
+UPLOAD_TEMP_DIR = os.path.join(BASE_DIR, 'upload_parts')
+
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# core.db.sqlite3: WAL и PRAGMA на каждом соединении, BEGIN IMMEDIATE
+# в core.db.immediate(); обслуживание — manage.py sqlite_maintenance по
+# расписанию.
+# Соединения берутся из пула на процесс (core.db.pool) и возвращаются в
+# него в конце запроса, поэтому CONN_MAX_AGE = 0
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'core.db.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 0,
+        'OPTIONS': {
+            'timeout': 20,
+            'pragmas': {'busy_timeout': 20000},
+            'pool': {'size': 10, 'timeout': 10},
+        },
     }
 }
 
+# Реплики для чтения лент: пути к копиям базы через запятую, например
+# YATUBE_DB_REPLICAS=/srv/replica1.sqlite3 (manage.py sync_sqlite_replicas)
+DATABASE_REPLICAS = []
+
+for number, path in enumerate(
+        filter(None, os.getenv('YATUBE_DB_REPLICAS', '').split(',')), 1):
+    DATABASES[f'replica{number}'] = dict(
+        DATABASES['default'], NAME=path, TEST={'MIRROR': 'default'})
+    DATABASE_REPLICAS.append(f'replica{number}')
+
+# Шарды постов и комментариев, первым остаётся default:
+# YATUBE_POST_SHARDS=/srv/shard1.sqlite3,/srv/shard2.sqlite3
+# (после смены числа шардов — manage.py migrate --database=shardN, затем
+# manage.py rebalance_shards: посты переезжают в шард своего автора)
+POST_SHARDS = ['default']
+
+for number, path in enumerate(
+        filter(None, os.getenv('YATUBE_POST_SHARDS', '').split(',')), 1):
+    DATABASES[f'shard{number}'] = dict(DATABASES['default'], NAME=path)
+    POST_SHARDS.append(f'shard{number}')
+
+DATABASE_ROUTERS = [
+    'posts.sharding.ShardRouter',
+    'core.replicas.PrimaryReplicaRouter',
+]
+
+# Сколько секунд после записи клиент читает только из основной базы
+REPLICA_PIN_SECONDS = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -145,12 +203,42 @@ STATIC_URL = '/static/'
 
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 
+# collectstatic кладёт сюда файлы с хэшами и их .gz/.br копии
+STATIC_ROOT = os.path.join(BASE_DIR, 'static_collected')
+
+STATICFILES_STORAGE = 'core.staticfiles.CompressedManifestStorage'
+
+AUTHENTICATION_BACKENDS = ['users.backends.CachedModelBackend']
+
+USER_CACHE_TIMEOUT = 300
+
+# Лимиты пишущих вьюх по группам, например {'post_create': '10/m'};
+# None отключает лимит группы
+RATELIMITS = {}
+
+RATELIMIT_TRUST_X_FORWARDED_FOR = False
+
+# Ленты отдаются потоком: шапка сразу, посты по мере чтения из базы.
+# Кэш фрагмента ленты в этом режиме не используется
+FEED_STREAMING = False
+
+# Сколько секунд живут общие тела страниц (core.fragments.shared_page)
+PAGE_CACHE_TIMEOUT = 60
+# True, если перед сайтом кэш с ESI: он сам соберёт фрагменты
+FRAGMENTS_ESI = False
+
+# Адреса, которые yatube.preload запрашивает в мастере перед форком
+PRELOAD_URLS = []
+
 LOGIN_URL = 'users:login'
 
 LOGIN_REDIRECT_URL = 'posts:index'
 
 # LOGOUT_REDIRECT_URL = 'posts:index'
 
-EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+# Письма сначала попадают в outbox, а отправляет их фоновая задача
+EMAIL_BACKEND = 'core.mail.OutboxBackend'
+
+OUTBOX_EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
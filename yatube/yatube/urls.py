@@ -13,15 +13,25 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
-from django.urls import include, path
+from django.urls import include, path, re_path
+
+from core.fragments import fragment_view
+from core.media import serve_media
+from core.views import db_pool_stats, ratelimit_stats
 
 urlpatterns = [
     path('about/', include('about.urls', namespace='about')),
     path('', include('posts.urls', namespace='posts')),
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),
+    path('fragments/<slug:name>/', fragment_view, name='fragment'),
+    path('admin/ratelimit/', ratelimit_stats, name='ratelimit_stats'),
+    path('admin/db-pool/', db_pool_stats, name='db_pool_stats'),
     path('admin/', admin.site.urls),
+    re_path(r'^{}(?P<path>.+)$'.format(settings.MEDIA_URL.lstrip('/')),
+            serve_media, name='media'),
 ]
 
 handler404 = 'core.views.page_not_found'